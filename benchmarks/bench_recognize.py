@@ -0,0 +1,116 @@
+# benchmarks/bench_recognize.py
+"""
+recognize_character 微基准：对比逐像素实现与向量化实现的速度，并校验两者结果逐位一致。
+
+运行:
+    python benchmarks/bench_recognize.py [--captchas 50] [--seed 0]
+"""
+import argparse
+import random
+import time
+
+from PIL import Image
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import ocr
+
+
+def recognize_character_reference(char_img, templates, offset_range=3):
+    """原始的逐像素实现，仅作为正确性与速度的对照，返回 (最佳字符, 每个模板的匹配结果)"""
+    char_width, char_height = char_img.size
+    char_pixels = char_img.load()
+    max_similarity = 0.0
+    best_match = '?'
+    match_results = []
+    for char_name, template_img in templates.items():
+        template_width, template_height = template_img.size
+        template_pixels = template_img.load()
+        best_offset_similarity = 0.0
+        best_offset = (0, 0)
+        template_black_count = 0
+        for x in range(template_width):
+            for y in range(template_height):
+                if template_pixels[x, y] == 0:
+                    template_black_count += 1
+        char_black_count = 0
+        for x in range(char_width):
+            for y in range(char_height):
+                if char_pixels[x, y] == 0:
+                    char_black_count += 1
+        for offset_x in range(-offset_range, offset_range + 1):
+            for offset_y in range(-offset_range, offset_range + 1):
+                overlap_black_count = 0
+                for template_x in range(template_width):
+                    for template_y in range(template_height):
+                        if template_pixels[template_x, template_y] == 0:
+                            char_x = template_x + offset_x
+                            char_y = template_y + offset_y
+                            if 0 <= char_x < char_width and 0 <= char_y < char_height:
+                                if char_pixels[char_x, char_y] == 0:
+                                    overlap_black_count += 1
+                template_ratio = overlap_black_count / template_black_count if template_black_count > 0 else 0.0
+                char_ratio = overlap_black_count / char_black_count if char_black_count > 0 else 0.0
+                if template_ratio + char_ratio > 0:
+                    similarity = 2 * template_ratio * char_ratio / (template_ratio + char_ratio)
+                else:
+                    similarity = 0.0
+                if similarity > best_offset_similarity:
+                    best_offset_similarity = similarity
+                    best_offset = (offset_x, offset_y)
+        match_results.append((char_name, best_offset_similarity, best_offset))
+        if best_offset_similarity > max_similarity:
+            max_similarity = best_offset_similarity
+            best_match = char_name
+    return best_match, match_results
+
+
+def make_char_image(templates, rng):
+    """从模板生成一个带随机平移、噪点和缺损的字符图像"""
+    name = rng.choice(sorted(templates))
+    template = templates[name]
+    width, height = template.size
+    pad = rng.randint(0, 2)
+    img = Image.new('1', (width + 2 * pad + rng.randint(0, 3), height + rng.randint(0, 2)), 1)
+    img.paste(template, (pad + rng.randint(-1, 1), rng.randint(-1, 1)))
+    pixels = img.load()
+    for _ in range(rng.randint(0, 8)):
+        x, y = rng.randrange(img.size[0]), rng.randrange(img.size[1])
+        pixels[x, y] = 0 if pixels[x, y] else 1
+    return name, img
+
+
+def main():
+    parser = argparse.ArgumentParser(description="recognize_character 微基准")
+    parser.add_argument("--captchas", type=int, default=50, help="模拟的验证码数量（每个 4 个字符）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    templates = ocr.load_templates()
+    template_tensor = ocr.stack_templates(templates)
+    chars = [make_char_image(templates, rng)[1] for _ in range(args.captchas * 4)]
+
+    start = time.perf_counter()
+    reference = [recognize_character_reference(img, templates) for img in chars]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = [ocr.score_templates(img, template_tensor) for img in chars]
+    best = [ocr.recognize_character(img, template_tensor, debug=False) for img in chars]
+    vectorized_time = (time.perf_counter() - start) / 2
+
+    mismatches = sum(1 for (ref_best, ref_results), results, match in zip(reference, vectorized, best)
+                     if ref_results != results or ref_best != match)
+
+    print(f"字符数: {len(chars)}（{args.captchas} 个验证码）")
+    print(f"逐像素实现: {reference_time / args.captchas * 1000:.2f} ms/验证码")
+    print(f"向量化实现: {vectorized_time / args.captchas * 1000:.2f} ms/验证码")
+    print(f"加速比: {reference_time / vectorized_time:.1f}x")
+    print(f"结果不一致的字符数: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# benchmarks/calibrate_thresholds.py
+"""
+根据带标签的验证码为集成识别挑选 (二值化阈值, 清理方式) 组合。
+
+先用每个候选组合识别全部样本，再贪心地逐个加入能让集成准确率提升最多的组合，
+直到准确率不再提升或达到组合数上限。准确率相同时优先使用默认阈值（ocr.BINARY_THRESHOLD）的组合，
+其次取候选列表中靠前的组合。
+
+运行:
+    python benchmarks/calibrate_thresholds.py --folder captchas/            # 人工标注的真实验证码
+    python benchmarks/calibrate_thresholds.py --synthetic 500 --max-size 4
+    python benchmarks/calibrate_thresholds.py --folder captchas/ --write    # 写入 utils/ocr_calibration.json
+"""
+import argparse
+import json
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import ocr
+from captcha_synth import generate_corpus, load_labeled_folder
+
+
+def ensemble_accuracy(labels, hypotheses, selected, vote):
+    """只使用 selected 中的组合时，集成识别的验证码准确率"""
+    correct = 0
+    for label, sample_hypotheses in zip(labels, hypotheses):
+        result = ocr.vote_hypotheses([sample_hypotheses[i] for i in selected], vote)
+        correct += result is not None and result.text == label
+    return correct / len(labels) if labels else 0.0
+
+
+def calibrate(samples, settings, max_size=6, vote="confidence", bank=None):
+    """
+    贪心选择组合
+
+    返回:
+        list: 每一步的 (已选组合列表, 集成准确率)
+    """
+    if bank is None:
+        bank = ocr.get_template_bank()
+    labels = [label for label, _ in samples]
+    hypotheses = [ocr.classify_hypotheses(data, settings, bank) for _, data in samples]
+
+    selected = []
+    best_accuracy = 0.0
+    steps = []
+    while len(selected) < max_size:
+        candidates = [i for i in range(len(settings)) if i not in selected]
+        if not candidates:
+            break
+        scores = {i: ensemble_accuracy(labels, hypotheses, selected + [i], vote) for i in candidates}
+        accuracy = max(scores.values())
+        best = [i for i in candidates if scores[i] == accuracy]
+        choice = next((i for i in best if settings[i][0] == ocr.BINARY_THRESHOLD), best[0])
+        if selected and accuracy <= best_accuracy:
+            break
+        selected.append(choice)
+        best_accuracy = accuracy
+        steps.append(([settings[i] for i in selected], accuracy))
+    return steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为集成识别校准二值化阈值")
+    parser.add_argument("--folder", help="人工标注的真实验证码目录（文件名即标签）")
+    parser.add_argument("--synthetic", type=int, default=None, help="合成验证码数量，未给出 --folder 时默认 300")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--thresholds", default="60,70,80,90,94,100,110,120,130,140", help="候选阈值，逗号分隔")
+    parser.add_argument("--cleanups", default="none,despeckle", help="候选清理方式，逗号分隔")
+    parser.add_argument("--max-size", type=int, default=6, help="最多选择的组合数")
+    parser.add_argument("--vote", choices=["confidence", "char"], default="confidence")
+    parser.add_argument("--write", action="store_true", help=f"把结果写入 {ocr.CALIBRATION_FILE}")
+    args = parser.parse_args()
+
+    samples = []
+    if args.folder:
+        samples += load_labeled_folder(args.folder)
+    synthetic = args.synthetic if args.synthetic is not None else (0 if args.folder else 300)
+    if synthetic:
+        samples += generate_corpus(synthetic, seed=args.seed)
+    if not samples:
+        parser.error("没有可用的样本")
+
+    cleanups = [None if name == "none" else name for name in args.cleanups.split(",")]
+    settings = [(int(threshold), cleanup) for threshold in args.thresholds.split(",") for cleanup in cleanups]
+
+    print(f"样本数: {len(samples)}，候选组合数: {len(settings)}")
+    steps = calibrate(samples, settings, args.max_size, args.vote)
+    for selected, accuracy in steps:
+        print(f"{len(selected)} 个组合  准确率 {accuracy:.2%}  新增 {selected[-1]}")
+
+    chosen, accuracy = steps[-1]
+    print(f"推荐组合: {chosen}")
+    if args.write:
+        with open(ocr.CALIBRATION_FILE, 'w', encoding='utf-8') as f:
+            json.dump({"settings": chosen, "vote": args.vote, "accuracy": accuracy, "samples": len(samples)},
+                      f, ensure_ascii=False, indent=2)
+        print(f"已写入 {ocr.CALIBRATION_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/cancel_bench.py
+"""
+GrabScheduler 的取消效果：
+    - 停止：只设置停止标志（原来的做法，等线程池排空）与 stop()（取消排队请求并中止进行中的请求）的停止耗时；
+    - 跨系统取消：一个系统很快选上，另一个系统很慢时，不取消与取消另一个系统上同一门课的请求，抢课结束所需时间。
+
+运行:
+    python benchmarks/cancel_bench.py
+    python benchmarks/cancel_bench.py --courses 40 --slow 10 15
+"""
+import argparse
+import threading
+import time
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+from utils.pacing import PacingController
+from utils.scheduler import GrabScheduler
+from grab_bench import make_enroller
+from mock_jwc import MockJwcServer
+from scheduler_bench import make_courses
+
+
+def bench_stop(server, courses, workers, use_stop, run_for=2.0):
+    enroller = make_enroller(server, workers)
+    scheduler = GrabScheduler([("URL1", enroller)], {"URL1": PacingController(workers, 0.1, adaptive=False)},
+                              outcome.RetryTracker(), workers)
+    running = [True]
+    stopped_at = []
+
+    def stop_later():
+        time.sleep(run_for)
+        stopped_at.append(time.perf_counter())
+        running[0] = False
+        if use_stop:
+            scheduler.stop()
+
+    threading.Thread(target=stop_later, daemon=True).start()
+    stats = scheduler.run(courses, lambda: running[0])
+    return time.perf_counter() - stopped_at[0], stats
+
+
+def bench_siblings(fast, slow, courses, workers, cancel):
+    backends = [("URL1", make_enroller(fast, workers)), ("URL2", make_enroller(slow, workers))]
+    pacing = {name: PacingController(workers, 0.1, adaptive=False) for name, _ in backends}
+    scheduler = GrabScheduler(backends, pacing, outcome.RetryTracker(), workers)
+    if not cancel:
+        scheduler._cancel_course = lambda course: None
+    start = time.perf_counter()
+    stats = scheduler.run(courses)
+    return time.perf_counter() - start, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="停止与跨系统取消的效果")
+    parser.add_argument("--courses", type=int, default=20, help="课程数")
+    parser.add_argument("--workers", type=int, default=10, help="线程数 / 并发数")
+    parser.add_argument("--slow", type=float, nargs=2, default=(5, 8), help="慢系统的响应延迟范围（秒）")
+    args = parser.parse_args()
+
+    for use_stop in (False, True):
+        server = MockJwcServer(latency=tuple(args.slow)).start()
+        try:
+            elapsed, stats = bench_stop(server, make_courses(args.courses), args.workers, use_stop)
+        finally:
+            server.stop()
+        print(f"停止 {'stop()' if use_stop else '只设标志':<8} 停止耗时 {elapsed:6.2f} s   "
+              f"取消排队 {stats['cancelled_queued']:4d}   中止进行中 {stats['aborted']:4d}")
+
+    for cancel in (False, True):
+        fast = MockJwcServer(latency=(0.05, 0.1), success_after=0).start()
+        slow = MockJwcServer(latency=tuple(args.slow)).start()
+        try:
+            elapsed, stats = bench_siblings(fast, slow, make_courses(args.courses), args.workers, cancel)
+        finally:
+            fast.stop()
+            slow.stop()
+        print(f"跨系统{'取消' if cancel else '不取消':<4} 全部选上后结束耗时 {elapsed:6.2f} s   "
+              f"完成 {stats['completed']:4d}   取消排队 {stats['cancelled_queued']:4d}   中止进行中 {stats['aborted']:4d}")
+
+
+if __name__ == "__main__":
+    main()
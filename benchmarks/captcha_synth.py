@@ -0,0 +1,114 @@
+# benchmarks/captcha_synth.py
+"""
+合成带标签的验证码，用于离线评估 OCR。
+
+字形直接取自 utils/templates，随机决定字符间距（可能相互粘连）、上下偏移、
+字符与背景灰度，并叠加噪点和干扰线，最后按教务验证码的格式编码为 JPEG。
+"""
+import io
+import os
+import random
+
+from PIL import Image, ImageDraw
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import ocr
+
+IMAGE_SIZE = (64, 22)
+LABEL_LENGTH = 4
+
+
+def generate_captcha(rng, bank=None, touch_probability=0.2, noise_density=0.03, line_count=1,
+                     image_format="JPEG", quality=90):
+    """
+    生成一张验证码
+
+    参数:
+        rng: random.Random 实例
+        bank: 提供字形的模板库，默认使用共享模板库
+        touch_probability: 相邻字符粘连（间距为 0 或重叠 1 像素）的概率
+        noise_density: 随机噪点占全部像素的比例
+        line_count: 干扰线条数
+        image_format: 输出格式（JPEG 或 PNG）
+        quality: JPEG 质量
+
+    返回:
+        tuple: (标签字符串, 图片字节流)
+    """
+    if bank is None:
+        bank = ocr.get_template_bank()
+    label = "".join(rng.choice(bank.names) for _ in range(LABEL_LENGTH))
+    glyphs = [bank.templates[char] for char in label]
+
+    width, height = IMAGE_SIZE
+    background = rng.randint(170, 255)
+    img = Image.new('L', IMAGE_SIZE, background)
+    draw = ImageDraw.Draw(img)
+
+    # 背景噪点：既有会被二值化保留的深色点，也有浅色点
+    for _ in range(int(width * height * noise_density)):
+        draw.point((rng.randrange(width), rng.randrange(height)), fill=rng.randint(0, 255))
+
+    # 先算出各字符的间距，整体水平居中
+    gaps = []
+    for _ in range(LABEL_LENGTH - 1):
+        gaps.append(rng.choice([0, -1]) if rng.random() < touch_probability else rng.randint(1, 4))
+    total_width = sum(glyph.size[0] for glyph in glyphs) + sum(gaps)
+    x = max(1, (width - total_width) // 2 + rng.randint(-3, 3))
+
+    for i, glyph in enumerate(glyphs):
+        y = rng.randint(1, max(1, height - glyph.size[1] - 1))
+        ink = Image.new('L', glyph.size, rng.randint(0, 60))
+        # 模板中黑色像素作为蒙版，只绘制字形本身
+        mask = glyph.point(lambda v: 255 if v == 0 else 0, 'L')
+        img.paste(ink, (x, y), mask)
+        x += glyph.size[0] + (gaps[i] if i < len(gaps) else 0)
+
+    for _ in range(line_count):
+        start = (rng.randrange(width), rng.randrange(height))
+        end = (rng.randrange(width), rng.randrange(height))
+        draw.line([start, end], fill=rng.randint(100, 200))
+
+    buffer = io.BytesIO()
+    if image_format.upper() == "JPEG":
+        img.convert('RGB').save(buffer, "JPEG", quality=quality)
+    else:
+        img.save(buffer, image_format)
+    return label, buffer.getvalue()
+
+
+def generate_corpus(count, seed=0, **kwargs):
+    """生成 count 张合成验证码，返回 [(标签, 图片字节流), ...]"""
+    rng = random.Random(seed)
+    bank = ocr.get_template_bank()
+    return [generate_captcha(rng, bank=bank, **kwargs) for _ in range(count)]
+
+
+def load_labeled_folder(folder):
+    """
+    读取人工标注的真实验证码
+
+    文件名即标签，如 ABCD.jpg；同一标签的多张图片可以加后缀区分，如 ABCD_2.jpg
+    """
+    samples = []
+    for filename in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() not in (".jpg", ".jpeg", ".png", ".bmp", ".gif"):
+            continue
+        with open(os.path.join(folder, filename), 'rb') as f:
+            samples.append((stem.split("_")[0].upper(), f.read()))
+    return samples
+
+
+def save_corpus(samples, folder):
+    """把样本按 load_labeled_folder 的命名规则写入目录，便于人工查看"""
+    os.makedirs(folder, exist_ok=True)
+    seen = {}
+    for label, data in samples:
+        seen[label] = seen.get(label, 0) + 1
+        suffix = f"_{seen[label]}" if seen[label] > 1 else ""
+        ext = ".png" if data.startswith(b"\x89PNG") else ".jpg"
+        with open(os.path.join(folder, f"{label}{suffix}{ext}"), 'wb') as f:
+            f.write(data)
@@ -0,0 +1,113 @@
+# benchmarks/grab_bench.py
+"""
+对比线程池抢课与异步引擎：向本地模拟服务器发送同样数量的选课请求，比较耗时、吞吐与延迟。
+
+运行:
+    python benchmarks/grab_bench.py                               # 2000 个请求，延迟 0.2~0.5 秒
+    python benchmarks/grab_bench.py --requests 5000 --threads 100 --in-flight 1000
+    python benchmarks/grab_bench.py --latency 1 3                 # 模拟更慢的服务器
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.jwc import Enroller
+from utils.probe import ProbeCache
+from utils.async_jwc import AsyncEnroller
+from mock_jwc import MockJwcServer
+from ocr_bench import percentile
+
+
+def make_enroller(server, pool_size):
+    """创建指向模拟服务器、已标记为登录的 Enroller"""
+    probe_cache = ProbeCache(path=os.path.join(tempfile.mkdtemp(), "probe.json"))
+    probe_cache.pin(server.base, server.base_url)
+    enroller = Enroller("bench", "bench", base=server.base, probe_cache=probe_cache, pool_size=pool_size)
+    enroller.is_logged_in = True
+    return enroller
+
+
+def summarize(name, latencies, elapsed, failures):
+    count = len(latencies)
+    return {
+        "engine": name,
+        "requests": count,
+        "elapsed_s": elapsed,
+        "throughput": count / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "failures": failures,
+    }
+
+
+def bench_threads(server, total, threads):
+    enroller = make_enroller(server, threads)
+    enroller.prepare_connections(threads, keepalive=False)
+
+    def one(i):
+        start = time.perf_counter()
+        success, message = enroller.select_course(f"T{i}")
+        return time.perf_counter() - start, message.startswith("选课请求失败")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    return summarize(f"线程池 ({threads} 线程)", [r[0] for r in results], elapsed, sum(r[1] for r in results))
+
+
+def bench_async(server, total, in_flight):
+    enroller = make_enroller(server, 1)
+
+    async def run():
+        semaphore = asyncio.Semaphore(in_flight)
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                success, message = await async_enroller.select_course(f"T{i}")
+                return time.perf_counter() - start, not message.startswith("该课程")
+
+        async with AsyncEnroller(enroller, max_connections=in_flight) as async_enroller:
+            start = time.perf_counter()
+            results = await asyncio.gather(*(one(i) for i in range(total)))
+            return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(run())
+    return summarize(f"异步引擎 ({in_flight} 并发)", [r[0] for r in results], elapsed, sum(r[1] for r in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="线程池与异步抢课引擎对比")
+    parser.add_argument("--requests", type=int, default=2000, help="每种引擎发送的选课请求数")
+    parser.add_argument("--threads", type=int, default=50, help="线程池的线程数")
+    parser.add_argument("--in-flight", type=int, default=500, help="异步引擎同时挂起的请求数")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.2, 0.5), help="服务器响应延迟范围（秒）")
+    args = parser.parse_args()
+
+    reports = []
+    for bench, concurrency in ((bench_threads, args.threads), (bench_async, args.in_flight)):
+        # 每种引擎使用新的服务器进程，服务器端的计数互不干扰
+        server = MockJwcServer(latency=tuple(args.latency)).start()
+        try:
+            report = bench(server, args.requests, concurrency)
+            report.update(server.stats())
+        finally:
+            server.stop()
+        reports.append(report)
+
+    print(f"{args.requests} 个选课请求，服务器延迟 {args.latency[0]}~{args.latency[1]} 秒")
+    for report in reports:
+        print(f"{report['engine']:<20} 总耗时 {report['elapsed_s']:7.2f} s   吞吐 {report['throughput']:8.1f} 请求/s   "
+              f"p50 {report['p50_ms']:8.1f} ms   p99 {report['p99_ms']:8.1f} ms   失败 {report['failures']}   "
+              f"服务器连接数 {report['connections']}，最大同时处理 {report['max_concurrent']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/hedge_bench.py
+"""
+对冲选课请求（utils/hedge.HedgePolicy）的效果：两个系统的选课请求大多很快，但有一部分落在几秒的长尾上。
+对比只发主请求（max_ratio=0，同样的调度路径，只是从不对冲）与对冲模式下，每门课从发出主请求到得到明确答复的
+p50 / p99、对冲比例、对冲胜出次数、抽样测得的节省时间，以及两个服务器实际收到的选课请求数。
+
+运行:
+    python benchmarks/hedge_bench.py
+    python benchmarks/hedge_bench.py --tail 0.1 3 8 --seconds 20
+"""
+import argparse
+import time
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+from utils.hedge import HedgePolicy
+from utils.pacing import PacingController
+from utils.scheduler import GrabScheduler
+from grab_bench import make_enroller
+from mock_jwc import MockJwcServer
+from scheduler_bench import make_courses
+
+
+def bench(servers, courses_count, workers, interval, seconds, hedged):
+    backends = [(name, make_enroller(server, workers)) for name, server in servers]
+    pacing = {name: PacingController(workers, interval, adaptive=False) for name, _ in backends}
+    policy = HedgePolicy() if hedged else HedgePolicy(max_ratio=0)
+    scheduler = GrabScheduler(backends, pacing, outcome.RetryTracker(), workers, hedge=policy)
+    end = time.perf_counter() + seconds
+    stats = scheduler.run(make_courses(courses_count), lambda: time.perf_counter() < end)
+    return policy.summary(), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对冲选课请求的效果")
+    parser.add_argument("--courses", type=int, default=20, help="课程数")
+    parser.add_argument("--workers", type=int, default=40, help="线程数")
+    parser.add_argument("--interval", type=float, default=0.2, help="重试间隔（秒）")
+    parser.add_argument("--seconds", type=float, default=15, help="每种方式运行的时间")
+    parser.add_argument("--tail", type=float, nargs=3, default=(0.08, 3, 6), metavar=("RATIO", "MIN", "MAX"),
+                        help="长尾请求的比例与延迟范围（秒）")
+    args = parser.parse_args()
+
+    tail = (args.tail[0], (args.tail[1], args.tail[2]))
+    for hedged in (False, True):
+        servers = [("URL1", MockJwcServer(latency=(0.1, 0.3), tail=tail, seed=1).start()),
+                   ("URL2", MockJwcServer(latency=(0.1, 0.3), tail=tail, seed=2).start())]
+        try:
+            summary, stats = bench(servers, args.courses, args.workers, args.interval, args.seconds, hedged)
+            received = sum(server.stats()["select_requests"] for _, server in servers)
+        finally:
+            for _, server in servers:
+                server.stop()
+        print(f"{'对冲' if hedged else '只发主请求':<6} 得到答复 p50 {summary['answer_p50_ms']:6.0f} ms  "
+              f"p99 {summary['answer_p99_ms']:6.0f} ms   主请求 {summary['races']:5d}  对冲 {summary['fired']:4d} "
+              f"({summary['fire_rate']:5.1%})  胜出 {summary['won']:4d}  每次胜出节省 {summary['saved_per_win_ms']:6.0f} ms"
+              f"（{summary['probes']} 个样本）   "
+              f"服务器收到 {received / args.seconds:5.1f} 次/s  中止 {stats['aborted']:4d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/login_bench.py
+"""
+对比两个系统依次登录与 LoginOrchestrator 并行流水线登录：首个可用会话的耗时与全部登录完成的耗时。
+
+运行:
+    python benchmarks/login_bench.py                     # 延迟 0.2~0.5 秒
+    python benchmarks/login_bench.py --latency 1 3       # 模拟开放选课时过载的服务器
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.jwc import Enroller
+from utils.probe import ProbeCache
+from utils.login import LoginOrchestrator
+from mock_jwc import MockJwcServer
+
+
+def make_enroller(server):
+    """创建指向模拟服务器、未登录的 Enroller（不读取保存的会话）"""
+    probe_cache = ProbeCache(path=os.path.join(tempfile.mkdtemp(), "probe.json"))
+    probe_cache.pin(server.base, server.base_url)
+    return Enroller("bench", "bench", base=server.base, probe_cache=probe_cache)
+
+
+def bench_sequential(servers):
+    start = time.perf_counter()
+    first = None
+    results = []
+    for server in servers:
+        success = make_enroller(server).login(retry_delay=0, use_saved_session=False)
+        results.append(success)
+        if success and first is None:
+            first = time.perf_counter() - start
+    return {"mode": "依次登录", "first_s": first, "all_s": time.perf_counter() - start, "succeeded": sum(results)}
+
+
+def bench_pipelined(servers, lanes):
+    enrollers = [(f"URL{i + 1}", make_enroller(server)) for i, server in enumerate(servers)]
+    for _, enroller in enrollers:
+        # 只比较登录流程本身，不读取保存的会话
+        enroller.restore_session = lambda: False
+    orchestrator = LoginOrchestrator(enrollers, lanes=lanes).start()
+    results = orchestrator.wait_all()
+    report = orchestrator.report()
+    return {"mode": f"并行流水线 ({lanes} 通道)", "first_s": report["time_to_first_session"],
+            "all_s": max(report["elapsed"].values()), "succeeded": sum(results.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="依次登录与并行流水线登录对比")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.2, 0.5), help="服务器响应延迟范围（秒）")
+    parser.add_argument("--lanes", type=int, default=2, help="每个系统的流水线通道数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式重复次数")
+    args = parser.parse_args()
+
+    for bench in (bench_sequential, lambda servers: bench_pipelined(servers, args.lanes)):
+        reports = []
+        for i in range(args.repeat):
+            servers = [MockJwcServer(latency=tuple(args.latency), seed=i * 2 + j, require_login=True).start() for j in range(2)]
+            try:
+                reports.append(bench(servers))
+            finally:
+                for server in servers:
+                    server.stop()
+        firsts = [r["first_s"] for r in reports if r["first_s"] is not None]
+        print(f"{reports[0]['mode']:<20} 首个可用会话 {sum(firsts) / max(len(firsts), 1):6.2f} s   "
+              f"全部完成 {sum(r['all_s'] for r in reports) / len(reports):6.2f} s   "
+              f"成功 {sum(r['succeeded'] for r in reports)}/{2 * len(reports)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# benchmarks/mock_jwc.py
+"""
+本地模拟教务服务器（asyncio 实现，支持 keep-alive 和上千个并发连接），用于离线压测抢课引擎。
+
+只模拟抢课用到的接口：
+    /service/login.html                 登录页（用于协议探测与连接保活）
+    /vatuu/GetRandomNumberToJPEG        验证码（captcha_synth 生成，答案绑定到 JSESSIONID）
+    /vatuu/UserLoginAction              登录
+    /vatuu/UserLoadingAction            登录后的加载页
+    /vatuu/CourseStudentAction          查询课程（选课编号为空时返回分页的全部课程） 与 提交选课（require_login 时未登录会被重定向到登录页）
+每个请求按 latency 指定的范围随机延迟后返回，模拟开放选课时过载的服务器；tail 让一部分选课请求落在长尾延迟上。
+响应带有按 clock_skew 偏移的 Date 头；设置 open_at 时，服务器时间到达 open_at 之前的选课请求返回“选课尚未开始”。
+
+服务器运行在独立的进程中，避免与被测客户端争抢 GIL；/__stats 返回服务器端的计数。
+"""
+import asyncio
+import json
+import multiprocessing
+import random
+import secrets
+import time
+from email.utils import formatdate
+from urllib.parse import urlsplit, parse_qs
+from urllib.request import urlopen
+
+SELECT_FULL = "<?xml version='1.0' encoding='UTF-8'?><root><![CDATA[0]]><![CDATA[该课程人数已满]]></root>"
+STATUS_REASONS = {200: "OK", 302: "Found", 503: "Service Unavailable"}
+CATALOG_SIZE = 1200
+CATALOG_PAGE_SIZE = 50
+SELECT_CONFLICT = "<?xml version='1.0' encoding='UTF-8'?><root><![CDATA[0]]><![CDATA[与已选课程上课时间冲突]]></root>"
+SELECT_OK = "<?xml version='1.0' encoding='UTF-8'?><root><![CDATA[1]]><![CDATA[选课成功]]></root>"
+SELECT_NOT_STARTED = "<?xml version='1.0' encoding='UTF-8'?><root><![CDATA[0]]><![CDATA[选课尚未开始]]></root>"
+
+
+class MockJwcServer:
+    """
+    在子进程的事件循环中运行的模拟服务器
+
+    参数:
+        latency: (最小, 最大) 响应延迟（秒）
+        success_after: 第几次选课请求开始返回成功，None 表示始终返回人数已满
+        seed: 延迟随机数种子
+        require_login: 为 True 时查询和选课需要已登录的 JSESSIONID
+        capacity: 服务器能同时处理的请求数，超过后延迟按 同时处理数/capacity 成倍增加，
+            超过 3 倍时选课请求返回 503；None 表示不限
+        clock_skew: 服务器时钟比本机快的秒数（体现在 Date 头与 open_at 的判断上）
+        open_at: 开放选课的服务器时间（Unix 时间戳），None 表示一直开放；
+            /__stats 中的 early_selects 与 first_select_delays 记录提前到达的请求数和各课程第一个请求到达时距开放的毫秒数
+        tail: (比例, (最小, 最大))，该比例的选课请求改用长尾延迟范围；None 表示没有长尾
+    """
+
+    def __init__(self, latency=(0.2, 0.5), success_after=None, seed=0, require_login=False, capacity=None,
+                 clock_skew=0.0, open_at=None, tail=None):
+        self.latency = latency
+        self.tail = tail
+        self.clock_skew = clock_skew
+        self.open_at = open_at
+        self.success_after = success_after
+        self.seed = seed
+        self.require_login = require_login
+        self.capacity = capacity
+        self.port = None
+        self._process = None
+
+    @property
+    def base(self):
+        return f"127.0.0.1:{self.port}"
+
+    @property
+    def base_url(self):
+        return f"http://{self.base}"
+
+    def start(self):
+        port_queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve, args=(self.latency, self.success_after, self.seed, self.require_login, self.capacity,
+                                                                          self.clock_skew, self.open_at, self.tail, port_queue),
+                                                daemon=True)
+        self._process.start()
+        self.port = port_queue.get(timeout=30)
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def stats(self):
+        """服务器端计数：请求数、选课请求数、登录请求数、连接数与最大同时处理的请求数"""
+        with urlopen(f"{self.base_url}/__stats") as response:
+            return json.loads(response.read())
+
+    def change_catalog_page(self, page):
+        """修改课程列表第 page 页的内容"""
+        urlopen(f"{self.base_url}/__catalog_changed?page={page}").read()
+
+    def expire_sessions(self):
+        """让所有已登录的会话失效，模拟服务器重启或会话超时"""
+        urlopen(f"{self.base_url}/__expire").read()
+
+
+def _serve(latency, success_after, seed, require_login, capacity, clock_skew, open_at, tail, port_queue):
+    asyncio.run(_Handler(latency, success_after, seed, require_login, capacity, clock_skew, open_at, tail).serve(port_queue))
+
+
+class _Handler:
+    def __init__(self, latency, success_after, seed, require_login, capacity=None, clock_skew=0.0, open_at=None,
+                 tail=None):
+        self.latency = latency
+        self.tail = tail
+        self.clock_skew = clock_skew
+        self.open_at = open_at
+        self.capacity = capacity
+        self.success_after = success_after
+        self.require_login = require_login
+        self.rng = random.Random(seed)
+        self.counters = {"requests": 0, "select_requests": 0, "captcha_requests": 0, "login_requests": 0,
+                         "connections": 0, "max_concurrent": 0, "overloaded": 0, "early_selects": 0,
+                         "first_select_delays": {}}
+        self._concurrent = 0
+        # 当前处理的请求到达时的服务器时间
+        self._arrived_at = 0.0
+        # JSESSIONID -> 当前验证码答案；已登录的 JSESSIONID
+        self.captchas = {}
+        self.logged_in = set()
+        self._captcha_rng = random.Random(seed)
+        self._bank = None
+        # 页码 -> 修改次数，/__catalog_changed?page=N 模拟该页的余量变化
+        self.catalog_versions = {}
+
+    async def serve(self, port_queue):
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0, backlog=4096)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    def _captcha(self):
+        # 延迟导入：只有用到验证码时才加载模板库
+        from captcha_synth import generate_captcha
+        if self._bank is None:
+            from utils import ocr
+            self._bank = ocr.get_template_bank()
+        return generate_captcha(self._captcha_rng, bank=self._bank)
+
+    def _respond(self, method, target, body, session_id):
+        """返回 (状态码, 额外响应头, 响应体)"""
+        path = urlsplit(target).path
+        query = parse_qs(urlsplit(target).query)
+        form = parse_qs(body)
+        if path == "/__stats":
+            return 200, {}, json.dumps(self.counters)
+        if path == "/__catalog_changed":
+            page = int(query.get("page", ["1"])[0])
+            self.catalog_versions[page] = self.catalog_versions.get(page, 0) + 1
+            return 200, {}, "ok"
+        if path == "/__expire":
+            self.logged_in.clear()
+            return 200, {}, "ok"
+        if path.endswith("/vatuu/GetRandomNumberToJPEG"):
+            self.counters["captcha_requests"] += 1
+            label, image = self._captcha()
+            self.captchas[session_id] = label
+            return 200, {"Content-Type": "image/jpeg"}, image
+        if path.endswith("/vatuu/UserLoginAction"):
+            self.counters["login_requests"] += 1
+            expected = self.captchas.pop(session_id, None)
+            if expected is not None and form.get("ranstring", [""])[0].upper() == expected:
+                self.logged_in.add(session_id)
+                return 200, {"Content-Type": "application/json"}, json.dumps({"loginStatus": "1", "loginMsg": "登录成功"})
+            return 200, {"Content-Type": "application/json"}, json.dumps({"loginStatus": "0", "loginMsg": "验证码错误"})
+        if path.endswith("/vatuu/CourseStudentAction"):
+            if self.require_login and session_id not in self.logged_in:
+                return 302, {"Location": "/service/login.html"}, ""
+            if query.get("setAction") == ["addStudentCourseApply"]:
+                self.counters["select_requests"] += 1
+                # 真实ID 中含 CONFLICT 的课程总是时间冲突，含 BUSY 的课程总是返回 503
+                teach_id = query.get("teachId", [""])[0]
+                if self.open_at is not None:
+                    # 请求到达（开始处理）时的服务器时间
+                    now = self._arrived_at
+                    if now < self.open_at:
+                        self.counters["early_selects"] += 1
+                        return 200, {}, SELECT_NOT_STARTED
+                    self.counters["first_select_delays"].setdefault(teach_id, (now - self.open_at) * 1000)
+                if "CONFLICT" in teach_id:
+                    return 200, {}, SELECT_CONFLICT
+                if "BUSY" in teach_id:
+                    return 503, {}, "busy"
+                if self.success_after is not None and self.counters["select_requests"] >= self.success_after:
+                    return 200, {}, SELECT_OK
+                return 200, {}, SELECT_FULL
+            teach_id = form.get("key1", [""])[0]
+            if not teach_id:
+                return 200, {}, self._catalog_page(int(form.get("jumpPage", ["1"])[0]))
+            return 200, {}, f'<html><span id="teachIdChoose{teach_id}">REAL{teach_id}</span></html>'
+        return 200, {}, "<html>login</html>"
+
+    def _catalog_page(self, page):
+        """不按编号过滤时的课程列表，共 CATALOG_SIZE 门课，每页 CATALOG_PAGE_SIZE 行"""
+        first = (page - 1) * CATALOG_PAGE_SIZE
+        rows = "".join(
+            f'<tr><td>{i + 1}</td><td>B{i:04d}<span id="teachIdChooseB{i:04d}" style="display:none">REALB{i:04d}</span></td>'
+            f'<td>课程{i % 97}</td><td>教师{i % 53}</td><td>星期{i % 5 + 1} {i % 6 * 2 + 1}-{i % 6 * 2 + 2}节</td>'
+            f'<td>{self.catalog_versions.get(page, 0)}</td></tr>'
+            for i in range(first, min(first + CATALOG_PAGE_SIZE, CATALOG_SIZE)))
+        return (f"<html><table><tr><th>序号</th><th>选课编号</th><th>课程名称</th><th>任课教师</th><th>上课时间</th><th>余量</th></tr>"
+                f"{rows}</table><td>共有记录[{CATALOG_SIZE}]条</td></html>")
+
+    async def _handle(self, reader, writer):
+        self.counters["connections"] += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                length = 0
+                session_id = None
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value.strip())
+                    elif name.strip().lower() == "cookie":
+                        for item in value.split(";"):
+                            key, _, cookie_value = item.strip().partition("=")
+                            if key == "JSESSIONID":
+                                session_id = cookie_value
+                body = (await reader.readexactly(length)).decode("utf-8") if length else ""
+
+                arrived_at = time.time() + self.clock_skew
+                self.counters["requests"] += 1
+                self._concurrent += 1
+                self.counters["max_concurrent"] = max(self.counters["max_concurrent"], self._concurrent)
+                overloaded = False
+                try:
+                    if not target.startswith("/__"):
+                        delay = self.rng.uniform(*self.latency)
+                        if self.tail is not None and "addStudentCourseApply" in target and self.rng.random() < self.tail[0]:
+                            delay = self.rng.uniform(*self.tail[1])
+                        if self.capacity is not None and self._concurrent > self.capacity:
+                            # 过载：处理变慢，严重过载时直接拒绝选课请求
+                            delay *= self._concurrent / self.capacity
+                            overloaded = self._concurrent > 3 * self.capacity
+                        await asyncio.sleep(delay)
+                finally:
+                    self._concurrent -= 1
+                headers = {"Content-Type": "text/html; charset=UTF-8"}
+                if session_id is None:
+                    session_id = secrets.token_hex(16)
+                    headers["Set-Cookie"] = f"JSESSIONID={session_id}; Path=/"
+                if overloaded and "addStudentCourseApply" in target:
+                    self.counters["overloaded"] += 1
+                    status, extra_headers, payload = 503, {}, "busy"
+                else:
+                    self._arrived_at = arrived_at
+                    status, extra_headers, payload = self._respond(method, target, body, session_id)
+                headers.update(extra_headers)
+                headers["Date"] = formatdate(time.time() + self.clock_skew, usegmt=True)
+                if isinstance(payload, str):
+                    payload = payload.encode("utf-8")
+                headers["Content-Length"] = str(0 if method == "HEAD" else len(payload))
+                headers["Connection"] = "keep-alive"
+                head = f"HTTP/1.1 {status} {STATUS_REASONS.get(status, 'OK')}\r\n" + \
+                       "".join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+                writer.write(head.encode("latin-1") + (b"" if method == "HEAD" else payload))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,77 @@
+# benchmarks/multi_account_bench.py
+"""
+多账号无界面抢课（utils/multi_account.MultiAccountRunner）：上百个账号在一个进程里登录（共用 OCR 进程池）并抢课，
+对比各账号共用连接（SharedTransports）与各账号使用自己的连接时，两个服务器在抢课阶段收到的连接数、每秒完成的请求数、
+账号之间的公平性（Jain 指数）与首个响应时间。两个模拟服务器都要求登录，能验证共用连接时各账号的会话互不影响。
+
+运行:
+    python benchmarks/multi_account_bench.py
+    python benchmarks/multi_account_bench.py --accounts 200 --seconds 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import ocr
+from utils.multi_account import Account, MultiAccountRunner
+from utils.probe import ProbeCache
+from mock_jwc import MockJwcServer
+from scheduler_bench import make_courses
+
+
+def bench(accounts_count, courses_count, budget, interval, seconds, shared, max_connections, ocr_pool):
+    servers = [MockJwcServer(require_login=True, latency=(0.1, 0.3), seed=index).start() for index in range(2)]
+    try:
+        probe_cache = ProbeCache(path=os.path.join(tempfile.mkdtemp(), "probe.json"))
+        for server in servers:
+            probe_cache.pin(server.base, server.base_url)
+        accounts = [Account(f"2026{index:06d}", "bench", make_courses(courses_count), budget)
+                    for index in range(accounts_count)]
+        settings = {"backends": [{"name": f"URL{index + 1}", "base": server.base} for index, server in enumerate(servers)],
+                    "interval": interval}
+        runner = MultiAccountRunner(accounts, settings, ocr_pool=ocr_pool, probe_cache=probe_cache,
+                                    max_connections=max_connections, share_connections=shared, adaptive=False,
+                                    log=lambda message: None)
+        runner.login_all()
+        # 只统计抢课阶段新建的连接（登录走各账号的同步连接）
+        before = sum(server.stats()["connections"] for server in servers)
+        end = time.perf_counter() + seconds
+        asyncio.run(runner.grab(lambda: time.perf_counter() < end))
+        connections = sum(server.stats()["connections"] for server in servers) - before
+        return runner.report(), connections
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多账号共用连接与各自连接的对比")
+    parser.add_argument("--accounts", type=int, default=120, help="账号数")
+    parser.add_argument("--courses", type=int, default=3, help="每个账号的课程数")
+    parser.add_argument("--budget", type=int, default=2, help="每个账号在每个系统上同时进行的请求数")
+    parser.add_argument("--interval", type=float, default=0.2, help="重试间隔（秒）")
+    parser.add_argument("--seconds", type=float, default=10, help="每种方式抢课的时间")
+    parser.add_argument("--connections", type=int, default=64, help="共用时到每个系统的连接数")
+    args = parser.parse_args()
+
+    ocr_pool = ocr.get_ocr_pool()
+    try:
+        for shared in (False, True):
+            report, connections = bench(args.accounts, args.courses, args.budget, args.interval, args.seconds,
+                                        shared, args.connections, ocr_pool)
+            summary = report["summary"]
+            print(f"{'共用连接' if shared else '各自连接':<6} 账号 {summary['active']}/{summary['accounts']}  "
+                  f"登录 {report['login_s']:5.2f} s   服务器连接 {connections:5d}   完成 {summary['throughput']:7.1f} 次/s   "
+                  f"公平性 {summary['fairness']:.3f}（最低 {summary['min_share']:.2f}，最高 {summary['max_share']:.2f}）   "
+                  f"首个响应 p50 {summary['first_response_p50_s'] * 1000:5.0f} ms  最晚 {summary['first_response_max_s'] * 1000:5.0f} ms")
+    finally:
+        ocr_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# benchmarks/ocr_bench.py
+"""
+离线 OCR 准确率与延迟基准，不需要网络。
+
+每次登录重试都要重新获取验证码并提交一次登录请求，OCR 准确率直接决定抢课开始时登录要花多久。
+修改 utils/ocr.py 前后各跑一次，对比输出即可判断改动是好是坏。
+
+运行:
+    python benchmarks/ocr_bench.py                      # 500 张合成验证码
+    python benchmarks/ocr_bench.py --count 2000 --touch 0.5
+    python benchmarks/ocr_bench.py --folder captchas/   # 额外评估人工标注的真实验证码
+    python benchmarks/ocr_bench.py --ensemble           # 评估多阈值集成识别
+    python benchmarks/ocr_bench.py --json result.json   # 保存结果便于对比
+"""
+import argparse
+import io
+import json
+import time
+from collections import Counter
+
+from PIL import Image
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import ocr
+from captcha_synth import generate_corpus, load_labeled_folder
+
+# 报告中列出的置信度阈值，用于选择 Enroller.login 的 min_confidence
+CONFIDENCE_THRESHOLDS = (0.5, 0.6, 0.7, 0.8)
+
+
+def percentile(values, q):
+    """最近秩法求百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    """把秒为单位的耗时列表汇总为毫秒的 p50/p99"""
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def evaluate(samples, bank=None, ensemble=False):
+    """
+    评估一组带标签的验证码
+
+    参数:
+        samples: [(标签, 图片字节流), ...]
+        bank: 使用的模板库，默认使用共享模板库
+        ensemble: 为 True 时用 classify_ensemble 识别（准确率与 classify 延迟按集成识别统计）
+
+    返回:
+        dict: 准确率、分割数量分布与各阶段延迟
+    """
+    if bank is None:
+        bank = ocr.get_template_bank()
+    classify_times, segment_times, recognize_times = [], [], []
+    correct_chars = total_chars = correct_captchas = 0
+    segment_counts = Counter()
+    raw_segment_counts = Counter()
+    confusions = Counter()
+    # 分割出 4 个字符时的 (是否正确, 置信度)，用于评估按置信度拒绝的效果
+    confidences = []
+
+    for label, data in samples:
+        start = time.perf_counter()
+        if ensemble:
+            detailed = ocr.classify_ensemble(data, bank=bank)
+        else:
+            detailed = ocr.classify_detailed(data, debug=False, bank=bank)
+        classify_times.append(time.perf_counter() - start)
+        result = detailed.text if detailed else ""
+        if len(result) == len(label):
+            confidences.append((result == label, detailed.confidence))
+
+        # 分阶段计时：二值化与 classify 相同，再单独计量分割和逐字符识别
+        img_bin = ocr.binarize(Image.open(io.BytesIO(data)), ocr.BINARY_THRESHOLD)
+        start = time.perf_counter()
+        char_images = ocr.segment_characters(img_bin, debug=False, expected_count=ocr.CAPTCHA_LENGTH, bank=bank)
+        segment_times.append(time.perf_counter() - start)
+        raw_segment_counts[len(ocr.find_char_boundaries(ocr.image_to_mask(img_bin).sum(axis=0)))] += 1
+        for char_img in char_images:
+            start = time.perf_counter()
+            ocr.recognize_character(char_img, bank, debug=False)
+            recognize_times.append(time.perf_counter() - start)
+
+        segment_counts[len(char_images)] += 1
+        total_chars += len(label)
+        for i, expected in enumerate(label):
+            actual = result[i] if i < len(result) else ""
+            if actual == expected:
+                correct_chars += 1
+            elif len(result) == len(label):
+                confusions[f"{expected}->{actual}"] += 1
+        if result == label:
+            correct_captchas += 1
+
+    count = len(samples)
+    return {
+        "captchas": count,
+        "char_accuracy": correct_chars / total_chars if total_chars else 0.0,
+        "captcha_accuracy": correct_captchas / count if count else 0.0,
+        "raw_segment_counts": dict(sorted(raw_segment_counts.items())),
+        "segment_counts": dict(sorted(segment_counts.items())),
+        "top_confusions": confusions.most_common(10),
+        "confidence_rejection": confidence_rejection(confidences),
+        "latency": {
+            "classify": latency_summary(classify_times),
+            "segment_characters": latency_summary(segment_times),
+            "recognize_character": latency_summary(recognize_times),
+        },
+    }
+
+
+def confidence_rejection(confidences):
+    """每个阈值下被拒绝的正确结果与错误结果所占比例"""
+    correct = [c for ok, c in confidences if ok]
+    wrong = [c for ok, c in confidences if not ok]
+    table = {}
+    for threshold in CONFIDENCE_THRESHOLDS:
+        table[str(threshold)] = {
+            "rejected_correct": sum(c < threshold for c in correct) / len(correct) if correct else 0.0,
+            "rejected_wrong": sum(c < threshold for c in wrong) / len(wrong) if wrong else 0.0,
+        }
+    return table
+
+
+def print_report(name, report):
+    print(f"=== {name} ({report['captchas']} 张) ===")
+    print(f"字符准确率:   {report['char_accuracy']:.2%}")
+    print(f"验证码准确率: {report['captcha_accuracy']:.2%}")
+    print(f"分割数量分布: 修复前 {report['raw_segment_counts']}，修复后 {report['segment_counts']}")
+    if report["top_confusions"]:
+        print("常见误识别:   " + ", ".join(f"{pair}×{n}" for pair, n in report["top_confusions"]))
+    for threshold, rates in report["confidence_rejection"].items():
+        print(f"置信度 < {threshold}: 拒绝正确结果 {rates['rejected_correct']:.1%}，"
+              f"拒绝错误结果 {rates['rejected_wrong']:.1%}")
+    for stage, summary in report["latency"].items():
+        print(f"{stage:<20} p50 {summary['p50_ms']:8.3f} ms   p99 {summary['p99_ms']:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线 OCR 准确率与延迟基准")
+    parser.add_argument("--count", type=int, default=500, help="合成验证码数量，0 表示不使用合成数据")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--touch", type=float, default=0.2, help="相邻字符粘连的概率")
+    parser.add_argument("--noise", type=float, default=0.03, help="噪点密度")
+    parser.add_argument("--lines", type=int, default=1, help="干扰线条数")
+    parser.add_argument("--folder", help="人工标注的真实验证码目录（文件名即标签）")
+    parser.add_argument("--ensemble", action="store_true", help="使用多阈值集成识别")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    bank = ocr.get_template_bank()
+    reports = {}
+    if args.count:
+        samples = generate_corpus(args.count, seed=args.seed, touch_probability=args.touch,
+                                  noise_density=args.noise, line_count=args.lines)
+        reports["synthetic"] = evaluate(samples, bank, args.ensemble)
+        print_report("合成验证码", reports["synthetic"])
+    if args.folder:
+        labeled = load_labeled_folder(args.folder)
+        reports["labeled"] = evaluate(labeled, bank, args.ensemble)
+        print_report(f"标注验证码 {args.folder}", reports["labeled"])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
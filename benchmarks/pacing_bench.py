@@ -0,0 +1,92 @@
+# benchmarks/pacing_bench.py
+"""
+对比固定并发与自适应并发（utils/pacing.PacingController）在会过载的模拟服务器上的表现：
+服务器同时处理的请求超过 capacity 后整体变慢，超过 3 倍时选课请求返回 503。
+
+运行:
+    python benchmarks/pacing_bench.py                              # 上限 300 并发，服务器容量 50
+    python benchmarks/pacing_bench.py --max-in-flight 500 --capacity 80 --seconds 20
+"""
+import argparse
+import asyncio
+import time
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+from utils.async_jwc import AsyncEnroller, AsyncGrabEngine
+from utils.pacing import PacingController
+from grab_bench import make_enroller
+from mock_jwc import MockJwcServer
+from ocr_bench import percentile
+
+
+def bench(server, adaptive, max_in_flight, interval, seconds, courses_count):
+    enroller = make_enroller(server, 1)
+    courses = [{"teach_id": f"T{i}", "real_teach_id": f"T{i}", "need_book": True, "selected": False}
+               for i in range(courses_count)]
+    latencies = []
+    answered = [0]
+    controller = PacingController(max_in_flight, interval, adaptive=adaptive)
+
+    def on_result(round_num, name, course, success, message, result, changed):
+        if result.outcome == outcome.FULL:
+            answered[0] += 1
+
+    async def run():
+        async with AsyncEnroller(enroller, max_connections=max_in_flight) as async_enroller:
+            original = async_enroller.select_course
+
+            async def timed_select(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    latencies.append(time.perf_counter() - start)
+
+            async_enroller.select_course = timed_select
+            engine = AsyncGrabEngine([("URL1", async_enroller)], max_in_flight=max_in_flight,
+                                     retry_tracker=outcome.RetryTracker(base_delay=0.2, max_delay=1.0),
+                                     pacing={"URL1": controller})
+            end = time.perf_counter() + seconds
+            return await engine.run(courses, interval, lambda: time.perf_counter() < end, on_result=on_result)
+
+    start = time.perf_counter()
+    stats = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    snap = controller.snapshot()
+    return {
+        "mode": "自适应" if adaptive else "固定并发",
+        "answered_per_s": answered[0] / elapsed,
+        "completed": stats["completed"],
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "final_limit": snap["limit"],
+        "final_interval": snap["interval"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="固定并发与自适应并发对比")
+    parser.add_argument("--max-in-flight", type=int, default=300, help="并发上限")
+    parser.add_argument("--capacity", type=int, default=50, help="模拟服务器的处理能力（同时处理的请求数）")
+    parser.add_argument("--interval", type=float, default=0.1, help="重试间隔下限（秒）")
+    parser.add_argument("--seconds", type=float, default=15, help="每种方式运行的时间")
+    parser.add_argument("--courses", type=int, default=300, help="课程数")
+    args = parser.parse_args()
+
+    for adaptive in (False, True):
+        server = MockJwcServer(latency=(0.2, 0.5), capacity=args.capacity).start()
+        try:
+            report = bench(server, adaptive, args.max_in_flight, args.interval, args.seconds, args.courses)
+            report.update(server.stats())
+        finally:
+            server.stop()
+        print(f"{report['mode']:<8} 有效响应 {report['answered_per_s']:7.1f} 次/s   503 {report['overloaded']:6d} 次   "
+              f"p50 {report['p50_ms']:7.0f} ms   p99 {report['p99_ms']:7.0f} ms   "
+              f"最终并发 {report['final_limit']}，间隔 {report['final_interval']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/routing_bench.py
+"""
+按健康状况分配请求（utils/backends.BackendRegistry）与平均分配的对比：
+一个快的后端、一个慢的后端和一个已经宕机（拒绝连接）的后端，线程数有限时，快的后端实际得到多少次有效响应。
+
+运行:
+    python benchmarks/routing_bench.py
+    python benchmarks/routing_bench.py --workers 20 --seconds 15
+"""
+import argparse
+import socket
+import time
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+from utils.backends import BackendRegistry
+from utils.pacing import PacingController
+from utils.scheduler import GrabScheduler
+from grab_bench import make_enroller
+from mock_jwc import MockJwcServer
+from scheduler_bench import make_courses
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class DeadServer:
+    """没有进程监听的地址，请求立即被拒绝"""
+
+    def __init__(self):
+        self.port = free_port()
+        self.base = f"127.0.0.1:{self.port}"
+        self.base_url = f"http://{self.base}"
+
+
+def bench(servers, courses_count, workers, interval, seconds, routed):
+    registry = BackendRegistry([{"name": name, "base": server.base} for name, server in servers])
+    for name, server in servers:
+        registry.get(name).enroller = make_enroller(server, workers)
+    backends = registry.logged_in()
+    pacing = {name: PacingController(workers, interval, adaptive=False) for name, _ in backends}
+    counts = {name: {"requests": 0, "answered": 0} for name, _ in backends}
+
+    def on_result(attempt, name, course, success, message, result, changed):
+        counts[name]["requests"] += 1
+        counts[name]["answered"] += result.outcome == outcome.FULL
+
+    scheduler = GrabScheduler(backends, pacing, outcome.RetryTracker(base_delay=interval, max_delay=interval), workers,
+                              router=registry if routed else None)
+    end = time.perf_counter() + seconds
+    scheduler.run(make_courses(courses_count), lambda: time.perf_counter() < end, on_result=on_result)
+    return counts, registry.weights() if routed else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按健康状况分配与平均分配的对比")
+    parser.add_argument("--courses", type=int, default=20, help="课程数")
+    parser.add_argument("--workers", type=int, default=10, help="线程数")
+    parser.add_argument("--interval", type=float, default=0.2, help="重试间隔（秒）")
+    parser.add_argument("--seconds", type=float, default=10, help="每种方式运行的时间")
+    args = parser.parse_args()
+
+    for routed in (False, True):
+        fast = MockJwcServer(latency=(0.05, 0.1)).start()
+        slow = MockJwcServer(latency=(1.5, 2.5)).start()
+        servers = [("fast", fast), ("slow", slow), ("dead", DeadServer())]
+        try:
+            counts, weights = bench(servers, args.courses, args.workers, args.interval, args.seconds, routed)
+        finally:
+            fast.stop()
+            slow.stop()
+        total = sum(item["answered"] for item in counts.values())
+        shares = "   ".join(f"{name}: 请求 {item['requests']:5d} 有效 {item['answered']:5d}" +
+                           (f" 权重 {weights[name]:.2f}" if weights else "")
+                           for name, item in counts.items())
+        print(f"{'按健康分配' if routed else '平均分配':<6} 有效响应 {total / args.seconds:6.1f} 次/s   {shares}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/scheduler_bench.py
+"""
+对比按固定轮次提交（原抢课循环）与 GrabScheduler 按 (课程, 系统) 调度：服务器变慢时线程池队列的长度，
+以及一门课的请求从提交到真正发出的排队时间。
+
+运行:
+    python benchmarks/scheduler_bench.py                     # 30 门课，服务器延迟 1~2 秒，间隔 0.2 秒
+    python benchmarks/scheduler_bench.py --courses 60 --seconds 20
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+from utils.pacing import PacingController
+from utils.scheduler import GrabScheduler
+from grab_bench import make_enroller
+from mock_jwc import MockJwcServer
+from ocr_bench import percentile
+
+
+def make_courses(count):
+    return [{"teach_id": f"T{i}", "real_teach_id": f"T{i}", "remark": "", "need_book": True, "selected": False}
+            for i in range(count)]
+
+
+def bench_rounds(server, courses, workers, interval, seconds):
+    """原抢课循环：每 interval 秒把所有课程提交一遍，不等上一轮返回"""
+    enroller = make_enroller(server, workers)
+    waits = []
+    max_queue = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def one(course, submitted_at):
+        waits.append(time.perf_counter() - submitted_at)
+        enroller.select_course(course["real_teach_id"])
+
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        for course in courses:
+            executor.submit(one, course, time.perf_counter())
+        max_queue = max(max_queue, executor._work_queue.qsize())
+        time.sleep(interval)
+    left = executor._work_queue.qsize()
+    executor.shutdown(wait=False, cancel_futures=True)
+    return {"mode": "按轮次提交", "max_queue": max_queue, "left": left, "sent": len(waits),
+            "p50_wait_ms": percentile(waits, 50) * 1000, "p99_wait_ms": percentile(waits, 99) * 1000}
+
+
+def bench_scheduler(server, courses, workers, interval, seconds):
+    enroller = make_enroller(server, workers)
+    pacing = {"URL1": PacingController(workers, interval, adaptive=False)}
+    scheduler = GrabScheduler([("URL1", enroller)], pacing, outcome.RetryTracker(), workers)
+    waits = []
+    max_queue = [0]
+    # 调度器排队的是“课程”而不是请求：等待名额的课程数 + 线程池中尚未开始的请求数
+    end = time.perf_counter() + seconds
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(0.05):
+            depth = scheduler.queue_depth()
+            max_queue[0] = max(max_queue[0], depth["queued"] + sum(depth["waiting"].values()))
+
+    original_dispatch = scheduler._dispatch
+
+    def dispatch(executor, course, name, enroller, now):
+        course["_ready_at"] = time.perf_counter()
+        original_dispatch(executor, course, name, enroller, now)
+
+    def on_submit(attempt, name, course):
+        waits.append(time.perf_counter() - course["_ready_at"])
+
+    scheduler._dispatch = dispatch
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    scheduler.run(courses, lambda: time.perf_counter() < end, on_submit=on_submit)
+    stop.set()
+    return {"mode": "GrabScheduler", "max_queue": max_queue[0], "left": 0, "sent": len(waits),
+            "p50_wait_ms": percentile(waits, 50) * 1000, "p99_wait_ms": percentile(waits, 99) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按轮次提交与按 (课程, 系统) 调度对比")
+    parser.add_argument("--courses", type=int, default=30, help="课程数")
+    parser.add_argument("--workers", type=int, default=20, help="线程数 / 并发数")
+    parser.add_argument("--interval", type=float, default=0.2, help="重试间隔（秒）")
+    parser.add_argument("--seconds", type=float, default=10, help="运行时间")
+    parser.add_argument("--latency", type=float, nargs=2, default=(1, 2), help="服务器响应延迟范围（秒）")
+    args = parser.parse_args()
+
+    for bench in (bench_rounds, bench_scheduler):
+        server = MockJwcServer(latency=tuple(args.latency)).start()
+        try:
+            report = bench(server, make_courses(args.courses), args.workers, args.interval, args.seconds)
+        finally:
+            server.stop()
+        print(f"{report['mode']:<14} 最大排队 {report['max_queue']:6d}   结束时仍在排队 {report['left']:6d}   "
+              f"发出 {report['sent']:5d} 个请求   排队时间 p50 {report['p50_wait_ms']:8.0f} ms   p99 {report['p99_wait_ms']:8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/teach_id_bench.py
+"""
+对比逐个查询选课编号与 resolve_teach_ids 批量查询（含缓存命中），以及正则提取与 BeautifulSoup 解析查询结果页的耗时。
+
+运行:
+    python benchmarks/teach_id_bench.py                  # 30 个选课编号，延迟 0.2~0.5 秒
+    python benchmarks/teach_id_bench.py --count 100
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import jwc
+from utils.teach_ids import TeachIdCache, resolve_teach_ids
+from grab_bench import make_enroller
+from mock_jwc import MockJwcServer
+
+
+def bench_parse(rows=300, repeat=50):
+    """模拟一页查询结果（rows 行课程），比较两种解析方式"""
+    html = "<html><body><table>" + "".join(
+        f'<tr><td>{i}</td><td><span id="teachIdChooseB{i:04d}">REAL{i:04d}</span></td><td>课程{i}</td>'
+        f'<td>教师{i}</td><td>星期{i % 7 + 1} 1-2节</td></tr>' for i in range(rows)) + "</table></body></html>"
+    teach_id = f"B{rows - 1:04d}"
+    start = time.perf_counter()
+    for _ in range(repeat):
+        BeautifulSoup(html, 'html.parser').find('span', id=f"teachIdChoose{teach_id}").text.strip()
+    soup_ms = (time.perf_counter() - start) / repeat * 1000
+    start = time.perf_counter()
+    for _ in range(repeat):
+        jwc.extract_real_teach_id(html, teach_id)
+    regex_ms = (time.perf_counter() - start) / repeat * 1000
+    return soup_ms, regex_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量解析选课编号")
+    parser.add_argument("--count", type=int, default=30, help="选课编号数量")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.2, 0.5), help="服务器响应延迟范围（秒）")
+    args = parser.parse_args()
+    teach_ids = [f"B{i:04d}" for i in range(args.count)]
+
+    server = MockJwcServer(latency=tuple(args.latency)).start()
+    try:
+        enroller = make_enroller(server, 10)
+        start = time.perf_counter()
+        for teach_id in teach_ids:
+            enroller.search_course_by_teach_id(teach_id)
+        sequential = time.perf_counter() - start
+
+        cache = TeachIdCache(path=os.path.join(tempfile.mkdtemp(), "teach_ids.json"))
+        start = time.perf_counter()
+        results = resolve_teach_ids(enroller, teach_ids, term="bench", cache=cache)
+        bulk = time.perf_counter() - start
+        start = time.perf_counter()
+        resolve_teach_ids(enroller, teach_ids, term="bench", cache=cache)
+        cached = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    soup_ms, regex_ms = bench_parse()
+    print(f"{args.count} 个选课编号，服务器延迟 {args.latency[0]}~{args.latency[1]} 秒")
+    print(f"逐个查询      {sequential:7.2f} s")
+    print(f"批量并发查询  {bulk:7.2f} s   成功 {sum(r[0] for r in results.values())}/{args.count}")
+    print(f"缓存命中      {cached * 1000:7.2f} ms")
+    print(f"解析 300 行结果页: BeautifulSoup {soup_ms:.2f} ms，正则提取 {regex_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/timed_start_bench.py
+"""
+定时开抢的计时精度：模拟服务器的时钟与本机相差 skew 秒，在服务器时间 open_at 开放选课。
+对比按本机时钟在开放时刻开抢，与 TimedStart 同步服务器时钟后开抢，首轮请求实际到达服务器的时间
+（服务器端记录，相对开放时刻）以及提前到达、被拒绝的请求数。
+
+运行:
+    python benchmarks/timed_start_bench.py
+    python benchmarks/timed_start_bench.py --skews -3 0.4 --latency 0.05 0.1
+"""
+import argparse
+import statistics
+import time
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import clock
+from utils import outcome
+from utils.pacing import PacingController
+from utils.scheduler import GrabScheduler
+from grab_bench import make_enroller
+from mock_jwc import MockJwcServer
+from scheduler_bench import make_courses
+
+
+def bench(skew, latency, courses_count, synced, lead=12.0):
+    # 以本机时间表示的开放时刻为 lead 秒之后，服务器时间再加上 skew
+    open_at = time.time() + lead + skew
+    server = MockJwcServer(latency=latency, clock_skew=skew, open_at=open_at).start()
+    try:
+        enroller = make_enroller(server, courses_count)
+        enroller.prepare_connections(courses_count)
+        backends = [("URL1", enroller)]
+        timed = clock.TimedStart(open_at, prepare_lead=lead - 1, resync_at=(lead / 2,), on_event=lambda message: None)
+        if synced:
+            fire_at = timed.run(lambda: None, lambda: backends)
+        else:
+            # 按本机时钟：本机时间到达开放时刻时发出
+            fire_at = {"URL1": time.monotonic() + (open_at - time.time())}
+        courses = make_courses(courses_count)
+        scheduler = GrabScheduler(backends, {"URL1": PacingController(courses_count, 0.5, adaptive=False)},
+                                  outcome.RetryTracker(), courses_count)
+        end = time.perf_counter() + max(0.0, fire_at["URL1"] - time.monotonic()) + 3
+        scheduler.run(courses, lambda: time.perf_counter() < end, start_at=fire_at)
+        stats = server.stats()
+    finally:
+        server.stop()
+    delays = sorted(stats["first_select_delays"].values())
+    estimate = timed.estimates.get("URL1")
+    return {
+        "mode": "同步服务器时钟" if synced else "按本机时钟",
+        "early": stats["early_selects"],
+        "first_ms": delays[0] if delays else float("nan"),
+        "p50_ms": statistics.median(delays) if delays else float("nan"),
+        "last_ms": delays[-1] if delays else float("nan"),
+        "offset": estimate.offset if estimate else 0.0,
+        "error_ms": estimate.error * 1000 if estimate else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="定时开抢的计时精度")
+    parser.add_argument("--skews", type=float, nargs="+", default=(-1.5, 1.5), help="服务器时钟比本机快的秒数")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.02, 0.05), help="服务器响应延迟范围（秒）")
+    parser.add_argument("--courses", type=int, default=20, help="课程数")
+    args = parser.parse_args()
+
+    for skew in args.skews:
+        for synced in (False, True):
+            report = bench(skew, tuple(args.latency), args.courses, synced)
+            print(f"偏差 {skew:+.1f} s  {report['mode']:<8} 提前到达被拒 {report['early']:3d} 个   首轮到达（相对开放）"
+                  f"最早 {report['first_ms']:+8.0f} ms  中位 {report['p50_ms']:+8.0f} ms  最晚 {report['last_ms']:+8.0f} ms   "
+                  f"测得偏差 {report['offset']:+.3f} s (±{report['error_ms']:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,25 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import json
+import asyncio
 import os
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from utils.jwc import Enroller
+from utils import ocr
+from utils import probe
+from utils import outcome
+from utils import teach_ids as teach_id_resolver
+from utils import catalog as course_catalog
+from utils import clock
+from utils.backends import BackendRegistry
+from utils.session_store import get_session_store
+from utils.login import LoginOrchestrator
+from utils.async_jwc import AsyncEnroller, AsyncGrabEngine
+from utils.hedge import HedgePolicy
+from utils.pacing import PacingController
+from utils.scheduler import GrabScheduler
 
 class CourseGrabberGUI:
     def __init__(self, root):
@@ -15,15 +29,41 @@ class CourseGrabberGUI:
         self.root.geometry("1150x750")
         
         self.config_file = "config.json"
-        self.enroller1 = None  # jwc.swjtu.edu.cn
-        self.enroller2 = None  # jiaowu.swjtu.edu.cn/TMS
         self.config = self.load_config()
+        # 教务系统后端（config.json 的 backends，缺省为 jwc.swjtu.edu.cn 与 jiaowu.swjtu.edu.cn/TMS），各自记录健康状态
+        try:
+            self.backends = BackendRegistry.from_config(self.config)
+        except ValueError as e:
+            print(f"config.json 中的 backends 无效（{e}），使用默认的两个教务系统")
+            self.backends = BackendRegistry()
         self.is_grabbing = False
         self.grab_thread = None
+        # 登录、定时开抢前的重新登录与启动时的会话恢复都会更换 backend.enroller，用 enroller_lock 互斥；
+        # 开始登录后，后台恢复出的会话不再使用
+        self.enroller_lock = threading.Lock()
+        self.login_started = False
+        self.login_running = False
+        # 抢课时各系统的并发/间隔控制器，{名称: PacingController}
+        self.pacing = {}
+        # 对冲模式下的 HedgePolicy，不使用对冲时为 None
+        self.hedge = None
+        # 正在运行的 GrabScheduler 或 AsyncGrabEngine
+        self.grab_engine = None
+        # 点击停止抢课的时间（time.perf_counter），用于统计停止耗时
+        self.stop_requested_at = None
+        # 等待中或刚开始的定时开抢（clock.TimedStart），首轮请求发出后用于统计计时精度
+        self.timed_start = None
+        self.timed_wave_size = 0
+        # 验证码识别进程池，两个系统的登录共用
+        self.ocr_pool = ocr.get_ocr_pool()
+        threading.Thread(target=self.ocr_pool.warm_up, daemon=True).start()
+        # 后台预先探测各系统的协议（有未过期的缓存时不发请求），登录时无需再等待探测
+        probe.get_probe_cache().prefetch(self.backends.bases())
         
         self.setup_ui()
         self.update_status()
         self.load_course_list()
+        self.restore_sessions()
         
         self.root.focus_force()
         
@@ -82,7 +122,7 @@ class CourseGrabberGUI:
         
         ttk.Label(row2, text="选课编号:").pack(side=tk.LEFT, padx=(0, 5))
         self.teach_id_var = tk.StringVar()
-        ttk.Entry(row2, textvariable=self.teach_id_var, width=15).pack(side=tk.LEFT, padx=(0, 20))
+        ttk.Entry(row2, textvariable=self.teach_id_var, width=30).pack(side=tk.LEFT, padx=(0, 20))
         
         ttk.Label(row2, text="备注:").pack(side=tk.LEFT, padx=(0, 5))
         self.remark_var = tk.StringVar()
@@ -92,7 +132,8 @@ class CourseGrabberGUI:
         ttk.Checkbutton(row2, text="需要教材", variable=self.need_book_var).pack(side=tk.LEFT, padx=(0, 20))
         
         ttk.Button(row2, text="查询课程", command=self.search_course, width=10).pack(side=tk.LEFT, padx=(0, 5))
-        ttk.Button(row2, text="添加到列表", command=self.add_course, width=12).pack(side=tk.LEFT)
+        ttk.Button(row2, text="添加到列表", command=self.add_course, width=12).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(row2, text="同步课程目录", command=self.sync_catalog, width=12).pack(side=tk.LEFT)
         
         # === 上方区域：选课列表 ===
         top_frame = ttk.LabelFrame(self.root, text="选课列表", padding="5")
@@ -164,7 +205,11 @@ class CourseGrabberGUI:
         
         ttk.Label(row3, text="最大并发数量:").pack(side=tk.LEFT, padx=(0, 5))
         self.max_workers_var = tk.IntVar(value=self.config.get("max_workers", 20))
-        ttk.Spinbox(row3, from_=1, to=100, increment=1, textvariable=self.max_workers_var, width=10).pack(side=tk.LEFT, padx=(0, 30))
+        ttk.Spinbox(row3, from_=1, to=500, increment=1, textvariable=self.max_workers_var, width=10).pack(side=tk.LEFT, padx=(0, 30))
+        
+        # 异步引擎在一个事件循环里挂起全部请求，并发数可以远高于线程池
+        self.async_engine_var = tk.BooleanVar(value=self.config.get("async_engine", False))
+        ttk.Checkbutton(row3, text="异步引擎", variable=self.async_engine_var).pack(side=tk.LEFT, padx=(0, 30))
         
         self.start_btn = ttk.Button(row3, text="开始抢课", command=self.start_grabbing, width=12)
         self.start_btn.pack(side=tk.LEFT, padx=(0, 10))
@@ -172,6 +217,26 @@ class CourseGrabberGUI:
         self.stop_btn = ttk.Button(row3, text="停止抢课", command=self.stop_grabbing, width=12, state='disabled')
         self.stop_btn.pack(side=tk.LEFT)
         
+        # 自适应时，最大并发数量与重试间隔是上限与下限，实际值按各系统的延迟和错误率调整
+        row4 = ttk.Frame(control_frame)
+        row4.pack(fill=tk.X, pady=(5, 0))
+        self.adaptive_var = tk.BooleanVar(value=self.config.get("adaptive_pacing", True))
+        ttk.Checkbutton(row4, text="自适应并发与间隔", variable=self.adaptive_var).pack(side=tk.LEFT, padx=(0, 20))
+        # 对冲请求：每门课先向一个系统提交，超过该系统延迟的 p90 仍未返回时再向另一个系统提交
+        self.hedge_var = tk.BooleanVar(value=self.config.get("hedge_requests", False))
+        ttk.Checkbutton(row4, text="对冲请求", variable=self.hedge_var).pack(side=tk.LEFT, padx=(0, 20))
+        self.pacing_label = ttk.Label(row4, text="", foreground="gray")
+        self.pacing_label.pack(side=tk.LEFT)
+        
+        # 定时开抢：开放前自动登录、确认课程并同步服务器时钟，首轮请求对准开放时刻到达
+        row5 = ttk.Frame(control_frame)
+        row5.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(row5, text="开放时间(北京时间):").pack(side=tk.LEFT, padx=(0, 5))
+        self.start_at_var = tk.StringVar(value=self.config.get("start_at", ""))
+        ttk.Entry(row5, textvariable=self.start_at_var, width=20).pack(side=tk.LEFT, padx=(0, 10))
+        self.timed_btn = ttk.Button(row5, text="定时开抢", command=self.schedule_grabbing, width=12)
+        self.timed_btn.pack(side=tk.LEFT)
+        
     def log(self, message):
         """添加系统日志"""
         self.log_text.config(state='normal')
@@ -188,11 +253,8 @@ class CourseGrabberGUI:
     
     def update_status(self):
         """更新登录状态"""
-        status1 = "✓" if self.enroller1 and self.enroller1.is_logged_in else "✗"
-        status2 = "✓" if self.enroller2 and self.enroller2.is_logged_in else "✗"
-        
-        if (self.enroller1 and self.enroller1.is_logged_in) or (self.enroller2 and self.enroller2.is_logged_in):
-            self.status_label.config(text=f"{status1} URL1 | {status2} URL2", foreground="green")
+        if self.backends.logged_in():
+            self.status_label.config(text=self.backends.status_text(), foreground="green")
         else:
             self.status_label.config(text="✗ 未登录", foreground="red")
     
@@ -212,64 +274,177 @@ class CourseGrabberGUI:
             self.save_config()
         
         self.log(f"正在使用账号 {username} 登录...")
+        self.login_running = True
         self.login_btn.config(state='disabled')
         
         def login_thread():
             try:
-                # 登录 URL1: jwc.swjtu.edu.cn
-                self.log("正在登录 URL1 (jwc.swjtu.edu.cn)...")
-                self.enroller1 = Enroller(username, password, base="jwc.swjtu.edu.cn")
-                success1 = self.enroller1.login()
-                if success1:
-                    self.log("✓ URL1 登录成功")
-                else:
-                    self.log("✗ URL1 登录失败")
+                # 所有系统同时登录，哪个先可用就先在状态栏显示；抢课只使用开始时已登录的系统，
+                # 在其他系统登录完成前开始抢课时，它们要到下次开始抢课才会用上
+                self.log("正在同时登录 " + "、".join(f"{b.name} ({b.base})" for b in self.backends) + "...")
+                with self.enroller_lock:
+                    self.login_started = True
+                    for backend in self.backends:
+                        backend.replace_enroller(self.make_enroller(username, password, backend.base))
                 
-                # 登录 URL2: jiaowu.swjtu.edu.cn/TMS
-                self.log("正在登录 URL2 (jiaowu.swjtu.edu.cn/TMS)...")
-                self.enroller2 = Enroller(username, password, base="jiaowu.swjtu.edu.cn/TMS")
-                success2 = self.enroller2.login()
-                if success2:
-                    self.log("✓ URL2 登录成功")
-                else:
-                    self.log("✗ URL2 登录失败")
+                def on_ready(url_name, enroller, elapsed):
+                    self.log(f"✓ {url_name} 登录成功（{elapsed:.2f} 秒）")
+                    self.root.after(0, self.update_status)
+                
+                def on_failed(url_name, enroller, elapsed):
+                    self.log(f"✗ {url_name} 登录失败（{elapsed:.2f} 秒）")
                 
-                if success1 or success2:
-                    self.root.after(0, lambda: messagebox.showinfo("成功", f"登录完成\nURL1: {'成功' if success1 else '失败'}\nURL2: {'成功' if success2 else '失败'}"))
+                orchestrator = LoginOrchestrator([(b.name, b.enroller) for b in self.backends],
+                                                 on_ready=on_ready, on_failed=on_failed).start()
+                results = orchestrator.wait_all()
+                report = orchestrator.report()
+                if report["time_to_first_session"] is not None:
+                    self.log(f"首个可用会话耗时 {report['time_to_first_session']:.2f} 秒")
+                
+                summary = "\n".join(f"{b.name}: {'成功' if results.get(b.name) else '失败'}" for b in self.backends)
+                if any(results.values()):
+                    self.root.after(0, lambda: messagebox.showinfo("成功", f"登录完成\n{summary}"))
                 else:
-                    self.root.after(0, lambda: messagebox.showerror("失败", "两个URL都登录失败，请检查账号密码"))
+                    self.root.after(0, lambda: messagebox.showerror("失败", "所有URL都登录失败，请检查账号密码"))
             except Exception as e:
                 self.log(f"✗ 登录异常: {e}")
                 self.root.after(0, lambda: messagebox.showerror("错误", f"登录异常: {e}"))
             finally:
                 self.root.after(0, self.update_status)
-                self.root.after(0, lambda: self.login_btn.config(state='normal'))
+                self.login_running = False
+                self.root.after(0, self.refresh_login_button)
         
         threading.Thread(target=login_thread, daemon=True).start()
     
+    def refresh_login_button(self):
+        """
+        登录按钮只在没有登录、抢课或等待定时开抢时可用：
+        抢课引擎在开始时取得各系统的 Enroller，中途重新登录会换掉并关闭引擎正在使用的 Enroller
+        """
+        busy = self.login_running or self.is_grabbing or self.timed_start is not None
+        self.login_btn.config(state='disabled' if busy else 'normal')
+    
+    def make_enroller(self, username, password, base):
+        """创建共用 OCR 进程池与会话存储的 Enroller，会话失效与重新登录事件写入系统日志"""
+        enroller = Enroller(username, password, base=base, ocr_pool=self.ocr_pool, session_store=get_session_store())
+        enroller.on_event = lambda message: self.root.after(0, self.log, message)
+        return enroller
+    
+    def restore_sessions(self):
+        """启动时在后台恢复上次保存的会话（只做一次轻量检查，不走验证码登录）"""
+        username = self.config.get("username", "")
+        password = self.config.get("password", "")
+        if not username or not password:
+            return
+        
+        def restore_thread():
+            for backend in self.backends:
+                if self.login_started:
+                    break
+                enroller = self.make_enroller(username, password, backend.base)
+                try:
+                    if enroller.restore_session():
+                        # 恢复期间用户已经点击登录时，保留登录使用的 Enroller
+                        with self.enroller_lock:
+                            adopted = not self.login_started
+                            if adopted:
+                                backend.replace_enroller(enroller)
+                        if adopted:
+                            self.log(f"✓ {backend.name} 已恢复上次的会话")
+                            continue
+                except Exception as e:
+                    self.log(f"✗ {backend.name} 恢复会话失败: {e}")
+                # 没有恢复成功或没有采用的 Enroller 不再使用，关闭它的连接池
+                enroller.close()
+            self.root.after(0, self.update_status)
+        
+        threading.Thread(target=restore_thread, daemon=True).start()
+    
+    def resolve_teach_ids(self, enroller, teach_ids):
+        """批量解析选课编号（优先使用缓存，其余并发查询），抢课进行中不调整连接池"""
+        return teach_id_resolver.resolve_teach_ids(enroller, teach_ids, term=self.config.get("term"),
+                                                   catalog=course_catalog.get_course_catalog(),
+                                                   grow_pool=not self.is_grabbing)
+    
+    def sync_catalog(self):
+        """抓取全部课程到本地目录（已抓取过时只刷新较旧的页）"""
+        enroller = self.backends.best_enroller()
+        if enroller is None:
+            messagebox.showerror("错误", "请先登录")
+            return
+        
+        def on_progress(done, total):
+            if done % 10 == 0 or done == total:
+                self.log(f"同步课程目录: {done}/{total} 页")
+        
+        def sync_thread():
+            try:
+                crawler = course_catalog.CatalogCrawler(enroller, term=self.config.get("term"), on_progress=on_progress)
+                if crawler.catalog.info(crawler.key):
+                    self.log("正在刷新课程目录...")
+                    stats = crawler.refresh()
+                else:
+                    self.log("正在抓取课程目录...")
+                    stats = crawler.crawl()
+                self.log(f"✓ 课程目录已同步: {stats['courses']} 门课程，请求 {stats['fetched']}/{stats['pages']} 页，"
+                         f"{stats['changed']} 页有变化，耗时 {stats['elapsed']:.2f} 秒")
+            except Exception as e:
+                self.log(f"✗ 同步课程目录失败: {e}")
+        
+        threading.Thread(target=sync_thread, daemon=True).start()
+    
+    def search_catalog(self, keyword):
+        """在本地课程目录中按课程名称、教师或上课时间搜索，不需要登录"""
+        term = self.config.get("term") or teach_id_resolver.current_term()
+        catalog = course_catalog.get_course_catalog()
+        results = []
+        for base in self.backends.bases():
+            results = catalog.search(teach_id_resolver.cache_key(term, base), keyword, limit=20)
+            if results:
+                break
+        if not results:
+            messagebox.showerror("失败", f"本地课程目录中没有与“{keyword}”匹配的课程\n（请先登录并点击“同步课程目录”）")
+            return
+        lines = [f"{c['teach_id']}  {c['name'] or ''}  {c['teacher'] or ''}  {c['time_slot'] or ''}" for c in results]
+        for line in lines:
+            self.log(line)
+        messagebox.showinfo("课程目录", "\n".join(lines))
+    
     def search_course(self):
-        """查询课程"""
-        enroller = self.enroller1 if (self.enroller1 and self.enroller1.is_logged_in) else self.enroller2
-        if not enroller or not enroller.is_logged_in:
+        """查询课程（可输入多个选课编号，用逗号或空格分隔；输入其他关键字时搜索本地课程目录）"""
+        keyword = self.teach_id_var.get().strip()
+        if keyword and not all(teach_id_resolver.TEACH_ID_FORMAT.fullmatch(item)
+                               for item in teach_id_resolver.split_teach_ids(keyword)):
+            self.search_catalog(keyword)
+            return
+        
+        enroller = self.backends.best_enroller()
+        if enroller is None:
             messagebox.showerror("错误", "请先登录")
             return
         
-        teach_id = self.teach_id_var.get().strip()
-        if not teach_id:
+        teach_ids = teach_id_resolver.split_teach_ids(self.teach_id_var.get())
+        if not teach_ids:
             messagebox.showerror("错误", "请输入选课编号")
             return
         
-        self.log(f"正在查询课程 {teach_id}...")
+        self.log(f"正在查询课程 {', '.join(teach_ids)}...")
         
         def search_thread():
             try:
-                success, real_teach_id, error = enroller.search_course_by_teach_id(teach_id)
-                if success:
-                    self.log(f"✓ 查询成功: {teach_id} -> {real_teach_id}")
-                    self.root.after(0, lambda: messagebox.showinfo("成功", f"选课编号: {teach_id}\n真实ID: {real_teach_id}"))
+                results = self.resolve_teach_ids(enroller, teach_ids)
+                lines = []
+                for teach_id, (success, real_teach_id, error) in results.items():
+                    if success:
+                        self.log(f"✓ 查询成功: {teach_id} -> {real_teach_id}")
+                        lines.append(f"选课编号: {teach_id}\n真实ID: {real_teach_id}")
+                    else:
+                        self.log(f"✗ 查询失败: {teach_id}: {error}")
+                        lines.append(f"选课编号: {teach_id}\n{error}")
+                if all(result[0] for result in results.values()):
+                    self.root.after(0, lambda: messagebox.showinfo("成功", "\n\n".join(lines)))
                 else:
-                    self.log(f"✗ 查询失败: {error}")
-                    self.root.after(0, lambda: messagebox.showerror("失败", error))
+                    self.root.after(0, lambda: messagebox.showerror("失败", "\n\n".join(lines)))
             except Exception as e:
                 self.log(f"✗ 查询异常: {e}")
                 self.root.after(0, lambda: messagebox.showerror("错误", f"查询异常: {e}"))
@@ -277,57 +452,77 @@ class CourseGrabberGUI:
         threading.Thread(target=search_thread, daemon=True).start()
     
     def add_course(self):
-        """添加课程到列表"""
-        enroller = self.enroller1 if (self.enroller1 and self.enroller1.is_logged_in) else self.enroller2
-        if not enroller or not enroller.is_logged_in:
+        """添加课程到列表（可输入多个选课编号，用逗号或空格分隔，共用同一备注）"""
+        enroller = self.backends.best_enroller()
+        if enroller is None:
             messagebox.showerror("错误", "请先登录")
             return
         
-        teach_id = self.teach_id_var.get().strip()
+        teach_ids = teach_id_resolver.split_teach_ids(self.teach_id_var.get())
         remark = self.remark_var.get().strip()
         
-        if not teach_id:
+        if not teach_ids:
             messagebox.showerror("错误", "请输入选课编号")
             return
         
-        self.log(f"正在查询并添加课程 {teach_id}...")
+        self.log(f"正在查询并添加课程 {', '.join(teach_ids)}...")
         
         def add_thread():
             try:
-                # 先查询获取真实ID
-                success, real_teach_id, error = enroller.search_course_by_teach_id(teach_id)
-                
-                if not success:
-                    self.log(f"✗ 查询失败: {error}")
-                    self.root.after(0, lambda: messagebox.showerror("失败", f"查询失败: {error}"))
-                    return
+                # 先查询获取真实ID（全部编号并发查询）
+                start = time.perf_counter()
+                results = self.resolve_teach_ids(enroller, teach_ids)
+                if len(teach_ids) > 1:
+                    self.log(f"查询 {len(teach_ids)} 个选课编号耗时 {time.perf_counter() - start:.2f} 秒")
                 
-                # 检查是否已存在
-                for course in self.config["courses"]:
-                    if course["real_teach_id"] == real_teach_id:
+                added, failed, existed = [], [], []
+                known = {course["real_teach_id"] for course in self.config["courses"]}
+                for teach_id, (success, real_teach_id, error) in results.items():
+                    if not success:
+                        self.log(f"✗ 查询失败: {teach_id}: {error}")
+                        failed.append(f"{teach_id}: {error}")
+                        continue
+                    
+                    # 检查是否已存在
+                    if real_teach_id in known:
                         self.log(f"课程 {teach_id} 已在列表中")
-                        self.root.after(0, lambda: messagebox.showwarning("提示", f"课程 {teach_id} 已在列表中"))
-                        return
-                
-                # 添加到列表
-                course = {
-                    "teach_id": teach_id,
-                    "real_teach_id": real_teach_id,
-                    "remark": remark,
-                    "need_book": self.need_book_var.get(),
-                    "selected": False
-                }
-                
-                self.config["courses"].append(course)
-                self.save_config()
+                        existed.append(teach_id)
+                        continue
+                    
+                    # 添加到列表
+                    course = {
+                        "teach_id": teach_id,
+                        "real_teach_id": real_teach_id,
+                        "remark": remark,
+                        "need_book": self.need_book_var.get(),
+                        "selected": False
+                    }
+                    self.config["courses"].append(course)
+                    known.add(real_teach_id)
+                    added.append(f"{teach_id} -> {real_teach_id}")
+                    self.log(f"✓ 已添加课程: {teach_id} -> {real_teach_id} ({remark})")
                 
-                self.log(f"✓ 已添加课程: {teach_id} -> {real_teach_id} ({remark})")
-                self.root.after(0, self.load_course_list)
-                self.root.after(0, lambda: messagebox.showinfo("成功", f"已添加课程:\n{teach_id} -> {real_teach_id}"))
+                if added:
+                    self.save_config()
+                    self.root.after(0, self.load_course_list)
+                    # 清空输入框
+                    self.root.after(0, lambda: self.teach_id_var.set(""))
+                    self.root.after(0, lambda: self.remark_var.set(""))
                 
-                # 清空输入框
-                self.root.after(0, lambda: self.teach_id_var.set(""))
-                self.root.after(0, lambda: self.remark_var.set(""))
+                summary = []
+                if added:
+                    summary.append("已添加课程:\n" + "\n".join(added))
+                if existed:
+                    summary.append("已在列表中: " + ", ".join(existed))
+                if failed:
+                    summary.append("查询失败:\n" + "\n".join(failed))
+                message = "\n\n".join(summary)
+                if failed and not added:
+                    self.root.after(0, lambda: messagebox.showerror("失败", message))
+                elif failed or existed:
+                    self.root.after(0, lambda: messagebox.showwarning("提示", message))
+                else:
+                    self.root.after(0, lambda: messagebox.showinfo("成功", message))
                 
             except Exception as e:
                 self.log(f"✗ 添加课程异常: {e}")
@@ -343,7 +538,7 @@ class CourseGrabberGUI:
         
         # 添加数据
         for course in self.config["courses"]:
-            status = "✓已选上" if course["selected"] else "未选"
+            status = "✓已选上" if course["selected"] else (course["dropped"].split(":")[0] if course.get("dropped") else "未选")
             book = "是" if course["need_book"] else "否"
             
             self.course_tree.insert("", tk.END, values=(
@@ -375,16 +570,133 @@ class CourseGrabberGUI:
     
     def clear_selected_status(self):
         """清除已选状态"""
-        if messagebox.askyesno("确认", "确定要清除所有课程的已选状态吗？"):
+        if messagebox.askyesno("确认", "确定要清除所有课程的已选状态吗？\n（已放弃的课程也会重新尝试）"):
             for course in self.config["courses"]:
                 course["selected"] = False
+                course.pop("dropped", None)
             self.save_config()
             self.load_course_list()
             self.log("✓ 已清除所有课程的已选状态")
     
-    def start_grabbing(self):
-        """开始抢课"""
-        if not ((self.enroller1 and self.enroller1.is_logged_in) or (self.enroller2 and self.enroller2.is_logged_in)):
+    def schedule_grabbing(self):
+        """定时开抢：开放前自动登录、确认课程ID、预建连接并同步服务器时钟，在开放时刻发出首轮请求"""
+        try:
+            open_at = clock.parse_open_time(self.start_at_var.get())
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        if open_at <= time.time():
+            messagebox.showerror("错误", "开放时间已过")
+            return
+        if not self.config["courses"]:
+            messagebox.showerror("错误", "选课列表为空，请先添加课程")
+            return
+        if not self.backends.logged_in() and not (self.username_var.get().strip() and self.password_var.get().strip()):
+            messagebox.showerror("错误", "请先填写学号和密码")
+            return
+        
+        self.config["start_at"] = self.start_at_var.get().strip()
+        self.save_config()
+        self.timed_start = timed = clock.TimedStart(open_at, on_event=self.log)
+        self.stop_requested_at = None
+        self.start_btn.config(state='disabled')
+        self.timed_btn.config(state='disabled')
+        self.stop_btn.config(state='normal')
+        self.refresh_login_button()
+        
+        def launch(fire_at):
+            self.start_grabbing(start_at=fire_at)
+            if not self.is_grabbing:
+                self.timed_start = None
+                self.timed_btn.config(state='normal')
+                self.refresh_login_button()
+        
+        def timed_thread():
+            try:
+                fire_at = timed.run(self.prepare_timed_start, self.backends.logged_in)
+            except Exception as e:
+                self.log(f"✗ 定时开抢准备失败: {e}")
+                fire_at = None
+            if fire_at is None:
+                self.timed_start = None
+                self.log("定时开抢已取消")
+                self.root.after(0, lambda: self.start_btn.config(state='normal'))
+                self.root.after(0, lambda: self.timed_btn.config(state='normal'))
+                self.root.after(0, lambda: self.stop_btn.config(state='disabled'))
+                self.root.after(0, self.refresh_login_button)
+                return
+            self.root.after(0, launch, fire_at)
+        
+        threading.Thread(target=timed_thread, daemon=True).start()
+    
+    def prepare_timed_start(self):
+        """定时开抢前的准备：会话无效的系统重新登录，重新确认课程的真实ID，按并发数预建连接"""
+        username = self.username_var.get().strip()
+        password = self.password_var.get().strip()
+        relogin = []
+        for backend in self.backends:
+            # 检查超时（None）时沿用当前会话，和启动时恢复会话的处理一致
+            if backend.logged_in and backend.enroller.check_session() is not False:
+                continue
+            if username and password:
+                with self.enroller_lock:
+                    self.login_started = True
+                    backend.replace_enroller(self.make_enroller(username, password, backend.base))
+                relogin.append((backend.name, backend.enroller))
+        if relogin:
+            self.log("定时开抢: 正在登录 " + "、".join(name for name, _ in relogin) + "...")
+            results = LoginOrchestrator(relogin).start().wait_all()
+            for url_name, success in results.items():
+                self.log(f"{'✓' if success else '✗'} {url_name} 登录{'成功' if success else '失败'}")
+            self.root.after(0, self.update_status)
+        
+        backends = self.backends.logged_in()
+        if not backends:
+            self.log("✗ 没有已登录的系统")
+            return
+        
+        pending = [c for c in self.config["courses"] if outcome.is_pending(c)]
+        results = self.resolve_teach_ids(self.backends.best_enroller(), [c["teach_id"] for c in pending])
+        changed = False
+        for course in pending:
+            success, real_teach_id, error = results.get(course["teach_id"], (False, None, "未查询"))
+            if not success:
+                self.log(f"✗ 确认 {course['teach_id']} 失败: {error}，沿用 {course['real_teach_id']}")
+            elif real_teach_id != course["real_teach_id"]:
+                self.log(f"课程 {course['teach_id']} 的真实ID已变为 {real_teach_id}")
+                course["real_teach_id"] = real_teach_id
+                changed = True
+        if changed:
+            self.save_config()
+            self.root.after(0, self.load_course_list)
+        self.log(f"定时开抢: 已确认 {len(pending)} 门课程的真实ID")
+        
+        max_workers = self.max_workers_var.get()
+        for url_name, enroller in backends:
+            try:
+                self.log(f"{url_name} 已预建 {enroller.prepare_connections(max_workers)} 个连接")
+            except Exception as e:
+                self.log(f"{url_name} 预建连接失败: {e}")
+    
+    def log_timed_report(self, names=None):
+        """记录定时开抢首轮请求的计时精度：按时钟偏差与单程时间估计的到达时间减去开放时刻"""
+        timed = self.timed_start
+        if timed is None:
+            return
+        for url_name, item in timed.report().items():
+            if names is not None and url_name not in names:
+                continue
+            self.log(f"{url_name} 首轮 {item['count']} 个请求预计到达时间（相对开放时刻）: 最早 {item['first_ms']:+.0f} ms，"
+                     f"中位 {item['p50_ms']:+.0f} ms，最晚 {item['last_ms']:+.0f} ms；"
+                     f"时钟偏差 {item['offset']:+.3f} 秒（±{item['error_ms']:.0f} ms）")
+    
+    def start_grabbing(self, start_at=None):
+        """
+        开始抢课
+        Args:
+            start_at: 定时开抢时各系统首轮请求的发出时刻 {名称: time.monotonic()}，默认立即开始
+        """
+        if not self.backends.logged_in():
             messagebox.showerror("错误", "请先登录")
             return
         
@@ -393,110 +705,221 @@ class CourseGrabberGUI:
             return
         
         self.is_grabbing = True
+        self.stop_requested_at = None
         self.start_btn.config(state='disabled')
+        self.timed_btn.config(state='disabled')
         self.stop_btn.config(state='normal')
+        self.refresh_login_button()
         
         # 保存最大并发数量设置
         max_workers = self.max_workers_var.get()
+        use_async = self.async_engine_var.get()
+        adaptive = self.adaptive_var.get()
+        hedged = self.hedge_var.get()
         self.config["max_workers"] = max_workers
+        self.config["async_engine"] = use_async
+        self.config["adaptive_pacing"] = adaptive
+        self.config["hedge_requests"] = hedged
         self.save_config()
         
         self.log("=== 开始抢课 ===")
-        self.log(f"最大并发数量: {max_workers}")
+        self.log(f"最大并发数量: {max_workers}" + ("（异步引擎）" if use_async else "") +
+                 ("，自适应调整并发数与间隔" if adaptive else "") + ("，对冲请求" if hedged else ""))
         
         def grab_thread():
-            round_num = 1
             interval = self.interval_var.get()
+            # 按结果分类决定重试方式：冲突、不可选的课程放弃，服务器繁忙时该课程在该系统上指数退避
+            retry_tracker = outcome.RetryTracker(base_delay=max(interval, outcome.BACKOFF_BASE))
             
-            def process_course(course, round_num, enroller, url_name):
-                """处理单个课程在特定URL的选课请求"""
-                if not self.is_grabbing:
-                    return None
-                
-                # 执行前检查是否已选上
-                if course.get("selected", False):
-                    return None
-                
-                teach_id = course["teach_id"]
-                real_teach_id = course["real_teach_id"]
-                remark = course["remark"]
-                need_book = course["need_book"]
-                
-                # 使用线程安全的方式记录"正在处理"日志
-                self.root.after(0, lambda tid=teach_id, r=remark, rn=round_num, un=url_name: 
-                                self.log(f"[第{rn}轮-{un}] 正在处理: {tid} ({r})"))
-                
+            # 按并发数调整各系统的连接池，并在第一个请求之前建立好连接
+            active = self.backends.logged_in()
+            def prepare(item):
+                url_name, enroller = item
                 try:
-                    success, message = enroller.select_course(real_teach_id, need_book)
-                    
-                    if success:
-                        self.root.after(0, lambda tid=teach_id, msg=message, rn=round_num, un=url_name: 
-                                        self.result_log(f"[第{rn}轮-{un}] ✓ 选课成功: {tid} - {msg}"))
-                        course["selected"] = True
-                        self.save_config()
-                        self.root.after(0, self.load_course_list)
-                    else:
-                        self.root.after(0, lambda tid=teach_id, msg=message, rn=round_num, un=url_name: 
-                                        self.result_log(f"[第{rn}轮-{un}] ✗ 选课失败: {tid} - {msg}"))
-                    
-                    return success
+                    self.log(f"{url_name} 已预建 {enroller.prepare_connections(max_workers)} 个连接")
                 except Exception as e:
-                    self.root.after(0, lambda tid=teach_id, err=str(e), rn=round_num, un=url_name: 
-                                    self.result_log(f"[第{rn}轮-{un}] ✗ 选课异常: {tid} - {err}"))
-                    return False
+                    self.log(f"{url_name} 预建连接失败: {e}")
+            
+            if not use_async:
+                with ThreadPoolExecutor(max_workers=len(active) or 1) as warm_executor:
+                    list(warm_executor.map(prepare, active))
             
-            # 创建持久的线程池
-            executor = ThreadPoolExecutor(max_workers=max_workers)
+            # 每个系统一个并发/间隔控制器；关闭自适应时并发数和间隔固定为设置值
+            self.pacing = {url_name: PacingController(max_workers, interval, adaptive=adaptive) for url_name, _ in active}
+            self.hedge = HedgePolicy() if hedged else None
+            self.root.after(0, self.refresh_pacing_label)
+            pending = [c for c in self.config["courses"] if outcome.is_pending(c)]
+            if hedged:
+                # 对冲模式下首轮每门课只向一个系统发出请求
+                self.timed_wave_size = -(-len(pending) // len(active))
+                self.log(f"待选课程数: {len(pending)}，每门课程先向一个系统提交，超过该系统延迟的 p90 仍未返回时再向另一个系统提交")
+            else:
+                self.timed_wave_size = len(pending)
+                self.log(f"待选课程数: {len(pending)}，每门课程在每个系统上同时只有一个请求，返回后间隔一段时间再发下一个")
             
             try:
-                while self.is_grabbing:
-                    # 筛选未选上的课程
-                    pending_courses = [c for c in self.config["courses"] if not c["selected"]]
-                    
-                    if not pending_courses:
-                        self.log("✓ 所有课程都已选上！")
-                        break
-                    
-                    self.log(f"\n--- 第 {round_num} 轮抢课 ---")
-                    self.log(f"待选课程数: {len(pending_courses)}，直接提交")
-                    
-                    # 对每门课程，同时向两个URL提交请求
-                    for course in pending_courses:
-                        if not self.is_grabbing:
-                            break
-                        # 提交到 URL1
-                        if self.enroller1 and self.enroller1.is_logged_in:
-                            executor.submit(process_course, course, round_num, self.enroller1, "URL1")
-                        # 提交到 URL2
-                        if self.enroller2 and self.enroller2.is_logged_in:
-                            executor.submit(process_course, course, round_num, self.enroller2, "URL2")
-                    
-                    # 等待间隔后进入下一轮
-                    round_num += 1
-                    if self.is_grabbing:
-                        self.log(f"等待 {interval} 秒后进入下一轮...")
-                        time.sleep(interval)
+                if use_async:
+                    stats = self.run_async_grab(active, interval, max_workers, retry_tracker, start_at)
+                else:
+                    self.grab_engine = GrabScheduler(active, self.pacing, retry_tracker, max_workers, router=self.backends,
+                                                      hedge=self.hedge)
+                    stats = self.grab_engine.run(self.config["courses"], lambda: self.is_grabbing,
+                                                 on_submit=self.on_grab_submit, on_result=self.on_grab_result,
+                                                 start_at=start_at)
+                    if not [c for c in self.config["courses"] if outcome.is_pending(c)]:
+                        self.log_all_done()
+                    self.log(f"调度统计: 提交 {stats['submitted']} 次，完成 {stats['completed']} 次，"
+                             f"线程池最多排队 {stats['max_queued']} 个请求")
+                if stats["cancelled_queued"] or stats["aborted"]:
+                    self.log(f"取消统计: 课程选上或停止后取消 {stats['cancelled_queued']} 个未发出的请求，"
+                             f"中止 {stats['aborted']} 个进行中的请求")
             
             except Exception as e:
                 self.log(f"✗ 抢课过程发生异常: {e}")
             
             finally:
-                # 关闭线程池，等待所有任务完成
-                executor.shutdown(wait=True)
+                self.log_outcome_summary(retry_tracker)
+                self.log_pacing_summary()
+                self.log_backend_health()
+                self.log_hedge_summary()
+                for url_name, enroller in ([] if use_async else active):
+                    stats = enroller.connection_stats()
+                    self.log(f"{url_name} 连接统计: 请求 {stats['requests']} 次，新建连接 {stats['new_connections']} 个，"
+                             f"复用率 {stats['reuse_rate']:.1%}，平均等待 {stats['avg_wait_ms']:.1f} ms")
                 
+                self.log_timed_report()
+                self.timed_start = None
+                self.grab_engine = None
                 self.is_grabbing = False
+                if self.stop_requested_at is not None:
+                    self.log(f"停止耗时 {time.perf_counter() - self.stop_requested_at:.2f} 秒")
                 self.root.after(0, lambda: self.start_btn.config(state='normal'))
+                self.root.after(0, lambda: self.timed_btn.config(state='normal'))
                 self.root.after(0, lambda: self.stop_btn.config(state='disabled'))
+                self.root.after(0, self.refresh_login_button)
                 self.log("=== 抢课已停止 ===")
         
         self.grab_thread = threading.Thread(target=grab_thread, daemon=True)
         self.grab_thread.start()
     
+    def on_grab_submit(self, attempt, url_name, course):
+        """一个选课请求发出（线程池或事件循环中调用）"""
+        self.root.after(0, lambda: self.log(f"[第{attempt}次-{url_name}] 正在处理: {course['teach_id']} ({course['remark']})"))
+        timed = self.timed_start
+        if timed is not None and attempt == 1 and timed.record_send(url_name) == self.timed_wave_size:
+            self.root.after(0, self.log_timed_report, [url_name])
+    
+    def on_grab_result(self, attempt, url_name, course, success, message, result, changed):
+        """一个选课请求返回（线程池或事件循环中调用）"""
+        tid = course["teach_id"]
+        prefix = f"[第{attempt}次-{url_name}]"
+        if success:
+            text = f"{prefix} ✓ 选课成功: {tid} - {message}"
+        elif result.policy == outcome.DONE:
+            text = f"{prefix} ✓ 已选过: {tid} - {message}"
+        elif result.policy == outcome.DROP:
+            text = f"{prefix} ✗ {result.label}，不再重试: {tid} - {message}"
+        else:
+            text = f"{prefix} ✗ 选课失败: {tid} - {message}"
+        self.root.after(0, lambda: self.result_log(text))
+        if changed:
+            self.save_config()
+            self.root.after(0, self.load_course_list)
+    
+    def run_async_grab(self, active, interval, max_in_flight, retry_tracker, start_at=None):
+        """用 AsyncGrabEngine 代替线程池抢课，在当前（抢课）线程中运行事件循环直到停止，返回引擎的统计"""
+        async def run():
+            backends = [(url_name, AsyncEnroller(enroller, max_connections=max_in_flight)) for url_name, enroller in active]
+            self.grab_engine = AsyncGrabEngine(backends, max_in_flight=max_in_flight, retry_tracker=retry_tracker,
+                                               pacing=self.pacing, router=self.backends, hedge=self.hedge)
+            try:
+                stats = await self.grab_engine.run(self.config["courses"], interval, lambda: self.is_grabbing,
+                                                   on_submit=self.on_grab_submit, on_result=self.on_grab_result,
+                                                   start_at=start_at)
+            finally:
+                for _, async_enroller in backends:
+                    await async_enroller.aclose()
+            if not [c for c in self.config["courses"] if outcome.is_pending(c)]:
+                self.log_all_done()
+            self.log(f"异步引擎统计: 提交 {stats['submitted']} 次，完成 {stats['completed']} 次，"
+                     f"最大同时挂起 {stats['max_in_flight']} 个请求")
+            return stats
+        
+        return asyncio.run(run())
+    
+    def refresh_pacing_label(self):
+        """抢课期间每秒刷新各系统当前的权重、并发数、排队数、间隔与实测吞吐"""
+        engine = self.grab_engine
+        depth = engine.queue_depth() if engine is not None else None
+        weights = self.backends.weights()
+        parts = []
+        for url_name, controller in self.pacing.items():
+            snap = controller.snapshot()
+            waiting = depth["waiting"].get(url_name, 0) if depth else 0
+            parts.append(f"{url_name}: 权重 {weights.get(url_name, 0):.2f} 并发 {snap['in_flight']}/{snap['limit']} 排队 {waiting} "
+                         f"间隔 {snap['interval']:.2f}s 吞吐 {snap['throughput']:.1f}/s 延迟 {snap['p50_ms']:.0f}ms "
+                         f"错误 {snap['error_rate']:.0%}")
+        self.pacing_label.config(text="   ".join(parts))
+        if self.is_grabbing:
+            self.root.after(1000, self.refresh_pacing_label)
+    
+    def log_pacing_summary(self):
+        """记录各系统最终的并发数与间隔"""
+        for url_name, controller in self.pacing.items():
+            snap = controller.snapshot()
+            self.log(f"{url_name} 节奏控制: 最终并发 {snap['limit']}/{snap['max_limit']}，间隔 {snap['interval']:.2f} 秒，"
+                     f"提高 {controller.increases} 次，降低 {controller.decreases} 次")
+    
+    def log_backend_health(self):
+        """记录各系统的健康状态与请求权重"""
+        weights = self.backends.weights()
+        for backend in self.backends:
+            health = backend.health.snapshot()
+            if not health["requests"]:
+                continue
+            self.log(f"{backend.name} 健康状态: {backend.session_status}，延迟 {health['latency_ms']:.0f} ms，"
+                     f"错误率 {health['error_rate']:.0%}，请求 {health['requests']} 次，当前权重 {weights[backend.name]:.2f}")
+    
+    def log_hedge_summary(self):
+        """记录对冲请求的次数、胜出次数与估计节省的时间"""
+        if self.hedge is None:
+            return
+        summary = self.hedge.summary()
+        if not summary["races"]:
+            return
+        self.log(f"对冲统计: 主请求 {summary['races']} 次，对冲 {summary['fired']} 次（{summary['fire_rate']:.1%}），"
+                 f"对冲先返回 {summary['won']} 次，估计共节省 {summary['saved']:.1f} 秒"
+                 f"（每次 {summary['saved_per_win_ms']:.0f} ms），因比例上限或没有名额放弃 {summary['skipped']} 次；"
+                 f"得到答复 p50 {summary['answer_p50_ms']:.0f} ms，p99 {summary['answer_p99_ms']:.0f} ms")
+    
+    def log_all_done(self):
+        """没有待选课程时的提示：区分全部选上与部分课程被放弃"""
+        dropped = [c for c in self.config["courses"] if not c["selected"] and c.get("dropped")]
+        if not dropped:
+            self.log("✓ 所有课程都已选上！")
+            return
+        self.log(f"没有可继续尝试的课程，{len(dropped)} 门课程已放弃:")
+        for course in dropped:
+            self.log(f"  {course['teach_id']} ({course['remark']}): {course['dropped']}")
+    
+    def log_outcome_summary(self, retry_tracker):
+        """记录各类选课结果的次数与累计退避时间"""
+        counts, backoff_time = retry_tracker.summary()
+        if counts:
+            self.log("选课结果统计: " + "，".join(f"{label} {n} 次" for label, n in counts.items()) +
+                     f"；累计退避 {backoff_time:.1f} 秒")
+    
     def stop_grabbing(self):
-        """停止抢课"""
+        """停止抢课：取消排队中的请求并中止正在进行的请求"""
+        self.stop_requested_at = time.perf_counter()
         self.is_grabbing = False
         self.log("正在停止抢课...")
         self.stop_btn.config(state='disabled')
+        if self.timed_start is not None:
+            self.timed_start.stop()
+        engine = self.grab_engine
+        if engine is not None:
+            engine.stop()
 
 def main():
     root = tk.Tk()
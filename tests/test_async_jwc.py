@@ -0,0 +1,122 @@
+# tests/test_async_jwc.py
+import asyncio
+import time
+from urllib.parse import parse_qsl
+
+import httpx
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import ocr
+from utils.async_jwc import AsyncEnroller, AsyncGrabEngine
+from utils.hedge import HedgePolicy
+from utils.jwc import Enroller
+
+
+class FakeEnroller:
+    """只实现 AsyncGrabEngine 用到的接口：每次选课等待 delay 秒后返回 message（replies 中列出的课程返回对应的提示信息）"""
+    is_logged_in = True
+    session_ready = True
+    relogging = False
+
+    def __init__(self, message="人数已满", delay=0.01, replies=None):
+        self.message = message
+        self.delay = delay
+        self.replies = replies or {}
+        self.calls = 0
+
+    async def open(self):
+        return self
+
+    async def select_course(self, real_teach_id, need_book=True, deadline=None, raise_errors=False):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        message = self.replies.get(real_teach_id, self.message)
+        return message == "选课成功", message
+
+
+class FakeProbeCache:
+    def resolve(self, base):
+        return f"https://{base}"
+
+
+def make_courses(count):
+    return [{"teach_id": f"T{i}", "real_teach_id": f"T{i}", "need_book": True, "selected": False} for i in range(count)]
+
+
+def test_run_selects_all_courses():
+    courses = make_courses(3)
+    engine = AsyncGrabEngine([("URL1", FakeEnroller("选课成功"))], max_in_flight=4)
+    stats = asyncio.run(engine.run(courses, 0.01))
+    assert all(course["selected"] for course in courses)
+    assert stats["succeeded"] == 3
+
+
+def test_hedge_probe_result_is_not_reported():
+    # T0 的主请求发往慢的系统，对冲请求胜出；第一次胜出时抽样，主请求不中止。T1 一直人数已满，让抢课持续到主请求返回
+    courses = make_courses(2)
+    slow = FakeEnroller(delay=0.3, replies={"T0": "选课成功"})
+    fast = FakeEnroller(replies={"T0": "选课成功"})
+    policy = HedgePolicy(initial_delay=0.05, max_ratio=1.0)
+    engine = AsyncGrabEngine([("slow", slow), ("fast", fast)], max_in_flight=4, hedge=policy)
+    results = []
+    end = time.monotonic() + 0.6
+    asyncio.run(engine.run(courses, 0.01, lambda: time.monotonic() < end,
+                           on_result=lambda attempt, name, course, success, message, result, changed:
+                           results.append((course["teach_id"], name))))
+    assert courses[0]["selected"]
+    assert [name for teach_id, name in results if teach_id == "T0"] == ["fast"]
+    summary = policy.summary()
+    assert summary["saved_per_win_ms"] > 0
+
+
+def test_stop_after_run_returns_does_not_raise():
+    # asyncio.run 返回（或按 Ctrl+C 中断）后事件循环已关闭，stop() 不能再向它投递回调
+    engine = AsyncGrabEngine([("URL1", FakeEnroller())], max_in_flight=2)
+    end = time.monotonic() + 0.1
+    asyncio.run(engine.run(make_courses(2), 0.01, lambda: time.monotonic() < end))
+    engine.stop()
+
+
+def test_stop_from_other_thread_cancels_run():
+    enroller = FakeEnroller(delay=5)
+    engine = AsyncGrabEngine([("URL1", enroller)], max_in_flight=2)
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.05, engine.stop)
+        return await engine.run(make_courses(2), 0.01)
+
+    start = time.perf_counter()
+    stats = asyncio.run(main())
+    assert time.perf_counter() - start < 2
+    assert stats["aborted"] == 2
+
+
+def test_async_login_shares_sync_login_steps():
+    enroller = Enroller("2026000000", "secret", base="jwc.example", probe_cache=FakeProbeCache())
+    captchas = iter([ocr.CaptchaResult("ab", 0.99, None), ocr.CaptchaResult("ab12", 0.99, None)])
+    enroller.recognize_captcha = lambda image_bytes: next(captchas)
+    completed = []
+    enroller.complete_login = lambda: completed.append(True)
+    posts = []
+
+    def handler(request):
+        if request.url.path.endswith("UserLoginAction"):
+            posts.append(dict(parse_qsl(request.content.decode())))
+            return httpx.Response(200, json={"loginStatus": "1", "loginMsg": "登录成功"})
+        return httpx.Response(200, content=b"")
+
+    async def main():
+        async_enroller = AsyncEnroller(enroller)
+        async_enroller.clients = [httpx.AsyncClient(transport=httpx.MockTransport(handler))]
+        try:
+            return await async_enroller.login(use_saved_session=False, retry_delay=0)
+        finally:
+            await async_enroller.clients[0].aclose()
+
+    assert asyncio.run(main())
+    # 长度不对的识别结果不提交（Enroller.captcha_rejection），提交的表单来自 Enroller.login_request
+    assert [post["ranstring"] for post in posts] == ["ab12"]
+    assert posts[0]["username"] == "2026000000"
+    assert completed == [True]
@@ -0,0 +1,97 @@
+# tests/test_backends.py
+from types import SimpleNamespace
+
+import pytest
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import backends
+from utils import outcome
+from utils.backends import BackendRegistry
+
+FULL = outcome.classify(False, "该课程人数已满")
+BUSY = outcome.classify(False, "系统繁忙")
+
+
+def make_registry(names=("fast", "slow")):
+    registry = BackendRegistry([{"name": name, "base": f"{name}.example"} for name in names])
+    for backend in registry:
+        backend.enroller = SimpleNamespace(is_logged_in=True, relogging=False)
+    return registry
+
+
+def test_defaults_and_validation():
+    assert [backend.name for backend in BackendRegistry.from_config({})] == ["URL1", "URL2"]
+    assert BackendRegistry([{"base": "a"}, {"base": "b"}]).get("URL2").base == "b"
+    with pytest.raises(ValueError):
+        BackendRegistry([{"name": "x", "base": "a"}, {"name": "x", "base": "b"}])
+    with pytest.raises(ValueError):
+        BackendRegistry([{"name": "x"}])
+    with pytest.raises(ValueError):
+        BackendRegistry([])
+
+
+def test_weights_follow_health_score():
+    registry = make_registry()
+    # 没有样本时都按 1 计
+    assert registry.weights() == {"fast": 1.0, "slow": 1.0}
+    registry.record("fast", 0.1, FULL)
+    registry.record("slow", 0.4, FULL)
+    weights = registry.weights()
+    assert weights["fast"] == 1.0
+    assert weights["slow"] == pytest.approx(0.25)
+
+
+def test_slow_or_failing_backend_keeps_min_weight():
+    registry = make_registry()
+    registry.record("fast", 0.05, FULL)
+    for _ in range(20):
+        registry.record("slow", 5.0, BUSY)
+    assert registry.weight("slow") == backends.MIN_WEIGHT
+
+
+def test_logged_out_or_relogging_backend_gets_zero_weight():
+    registry = make_registry()
+    registry.get("slow").enroller.relogging = True
+    assert registry.weight("slow") == 0.0
+    registry.get("slow").enroller = None
+    assert registry.weight("slow") == 0.0
+    assert [name for name, _ in registry.logged_in()] == ["fast"]
+    assert registry.best_enroller() is registry.get("fast").enroller
+
+
+def test_budget_splits_total_by_weight():
+    registry = make_registry()
+    registry.record("fast", 0.1, FULL)
+    registry.record("slow", 0.3, FULL)
+    assert registry.budget("fast", 20) == 15
+    assert registry.budget("slow", 20) == 5
+    # 权重为 0 时也保留一个名额
+    registry.get("slow").enroller.relogging = True
+    assert registry.budget("slow", 20) == 1
+    assert registry.budget("fast", 20) == 20
+
+
+def test_health_ewma():
+    health = backends.BackendHealth()
+    health.record(1.0, BUSY)
+    health.record(2.0, FULL)
+    snapshot = health.snapshot()
+    assert snapshot["latency_ms"] == pytest.approx(1000 + 1000 * backends.EWMA_ALPHA)
+    assert snapshot["error_rate"] == pytest.approx(backends.EWMA_ALPHA * (1 - backends.EWMA_ALPHA))
+    assert snapshot["requests"] == 2 and snapshot["errors"] == 1
+
+
+def test_replace_enroller_closes_the_old_one():
+    registry = make_registry(("URL1",))
+    backend = registry.get("URL1")
+    closed = []
+    old = backend.enroller
+    old.close = lambda: closed.append(old)
+    new = SimpleNamespace(is_logged_in=False, relogging=False, close=lambda: closed.append(new))
+    assert backend.replace_enroller(new) is old
+    assert backend.enroller is new and closed == [old]
+    # 换上同一个 Enroller 时不关闭
+    backend.replace_enroller(new)
+    assert closed == [old]
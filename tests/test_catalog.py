@@ -0,0 +1,107 @@
+# tests/test_catalog.py
+from types import SimpleNamespace
+
+import pytest
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.catalog import CatalogCrawler, CourseCatalog, parse_catalog_page
+
+HEADER = "<tr><th>选课编号</th><th>课程名称</th><th>任课教师</th><th>上课时间</th></tr>"
+
+
+def make_page(courses, total):
+    rows = "".join(f'<tr><td><span id="teachIdChoose{teach_id}">{real_id}</span></td><td>{name}</td>'
+                   f'<td>{teacher}</td><td>星期3 1-2节</td></tr>'
+                   for teach_id, real_id, name, teacher in courses)
+    footer = f"<td>共有记录[{total}]条</td>" if total is not None else ""
+    return f"<html><table>{HEADER}{rows}</table>{footer}</html>"
+
+
+CATALOG = [(f"B{1000 + i}", f"R{i:04d}", f"课程{i}", f"教师{i % 3}") for i in range(5)]
+# 每页 2 行，共 3 页
+PAGES = {page: make_page(CATALOG[(page - 1) * 2:page * 2], len(CATALOG)) for page in (1, 2, 3)}
+
+
+class FakeCrawler(CatalogCrawler):
+    def __init__(self, catalog, pages):
+        enroller = SimpleNamespace(base="jwc.example", connections=SimpleNamespace(pool_size=4))
+        super().__init__(enroller, catalog=catalog, term="2026-2027-1")
+        self.pages = pages
+
+    def fetch_page(self, page):
+        return self.pages[page]
+
+
+def test_parse_catalog_page_uses_header_columns():
+    total, courses = parse_catalog_page(PAGES[1])
+    assert total == 5
+    assert [c["teach_id"] for c in courses] == ["B1000", "B1001"]
+    assert courses[0]["real_teach_id"] == "R0000"
+    assert courses[0]["name"] == "课程0"
+    assert courses[1]["teacher"] == "教师1"
+    assert courses[0]["time_slot"] == "星期3 1-2节"
+
+
+def test_crawl_stores_all_pages_and_search():
+    catalog = CourseCatalog(":memory:")
+    crawler = FakeCrawler(catalog, PAGES)
+    stats = crawler.crawl()
+    assert stats["pages"] == 3
+    assert stats["courses"] == 5
+    assert catalog.lookup(crawler.key, "B1004")["real_teach_id"] == "R0004"
+    assert {c["teach_id"] for c in catalog.search(crawler.key, "教师1")} == {"B1001", "B1004"}
+
+
+def test_refresh_skips_recent_pages_and_unchanged_content():
+    catalog = CourseCatalog(":memory:")
+    FakeCrawler(catalog, PAGES).crawl()
+    stats = FakeCrawler(catalog, PAGES).crawl(max_age=600)
+    assert stats["fetched"] == 1 and stats["skipped"] == 2
+    assert stats["changed"] == 0
+
+
+def test_dynamic_content_does_not_count_as_change():
+    catalog = CourseCatalog(":memory:")
+    FakeCrawler(catalog, PAGES).crawl()
+    # 余量、时间戳等动态内容变了，课程没变
+    pages = {page: html.replace("</html>", f"<div>剩余 {page * 7} 个名额，查询时间 12:00:0{page}</div></html>")
+             for page, html in PAGES.items()}
+    assert FakeCrawler(catalog, pages).crawl()["changed"] == 0
+    renamed = [(teach_id, real_id, name + "（更名）", teacher) for teach_id, real_id, name, teacher in CATALOG[2:4]]
+    stats = FakeCrawler(catalog, {**pages, 2: make_page(renamed, len(CATALOG))}).crawl()
+    assert stats["changed"] == 1
+
+
+@pytest.mark.parametrize("page", [
+    "<html>系统繁忙，请稍后再试</html>",    # 没有总记录数
+    make_page([], 5),                      # 有总记录数但没有课程行
+])
+def test_unparsable_first_page_keeps_catalog(page):
+    catalog = CourseCatalog(":memory:")
+    crawler = FakeCrawler(catalog, PAGES)
+    crawler.crawl()
+    crawler.pages = {**PAGES, 1: page}
+    with pytest.raises(RuntimeError):
+        crawler.crawl()
+    assert catalog.info(crawler.key)["courses"] == 5
+
+
+def test_unparsable_later_page_keeps_its_rows():
+    catalog = CourseCatalog(":memory:")
+    crawler = FakeCrawler(catalog, PAGES)
+    crawler.crawl()
+    crawler.pages = {**PAGES, 2: "<html>系统繁忙</html>"}
+    with pytest.raises(RuntimeError):
+        crawler.crawl()
+    assert catalog.lookup(crawler.key, "B1002") is not None
+
+
+def test_empty_catalog_clears_rows():
+    catalog = CourseCatalog(":memory:")
+    crawler = FakeCrawler(catalog, PAGES)
+    crawler.crawl()
+    crawler.pages = {1: make_page([], 0)}
+    stats = crawler.crawl()
+    assert stats["courses"] == 0
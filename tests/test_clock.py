@@ -0,0 +1,67 @@
+# tests/test_clock.py
+from email.utils import formatdate
+
+import pytest
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import clock
+
+
+class SimulatedServer:
+    """本机时钟与服务器时钟相差 offset 秒，每次探测往返 rtt 秒，服务器在往返中点生成 Date 头"""
+
+    def __init__(self, offset, rtt, start=1_800_000_000.3):
+        self.offset = offset
+        self.rtt = rtt
+        self.now = start
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def probe(self):
+        self.now += self.rtt / 2
+        date = formatdate(int(self.now + self.offset), usegmt=True)
+        self.now += self.rtt / 2
+        return date
+
+
+@pytest.mark.parametrize("offset", [0.0, 3.37, -1.81, 42.05])
+def test_estimate_offset_converges_within_error(offset):
+    server = SimulatedServer(offset, rtt=0.02)
+    estimate = clock.estimate_offset(server.probe, samples=8, clock=server.clock, sleep=server.sleep)
+    assert estimate.samples == 8
+    assert abs(estimate.offset - offset) <= estimate.error
+    # 每次对准跨秒时刻的探测约把区间减半，8 次后误差与往返时间相当
+    assert estimate.error <= 0.05
+    assert estimate.rtt == pytest.approx(0.02)
+
+
+def test_estimate_offset_skips_failed_probes():
+    assert clock.estimate_offset(lambda: None, samples=3, clock=lambda: 1_800_000_000.0, sleep=lambda seconds: None) is None
+    server = SimulatedServer(1.5, rtt=0.02)
+    failures = iter([ConnectionError("reset"), "not a date"])
+
+    def probe():
+        failure = next(failures, None)
+        if isinstance(failure, Exception):
+            raise failure
+        return failure if failure is not None else server.probe()
+
+    estimate = clock.estimate_offset(probe, samples=6, clock=server.clock, sleep=server.sleep)
+    assert estimate.samples == 4
+    assert abs(estimate.offset - 1.5) <= estimate.error
+
+
+def test_parse_open_time_is_beijing_time():
+    timestamp = clock.parse_open_time("2026-10-20 12:30:00")
+    assert clock.format_open_time(timestamp) == "2026-10-20 12:30:00"
+    assert timestamp == 1_792_470_600
+    today = clock.parse_open_time("12:30", now=timestamp - 3600)
+    assert today == timestamp
+    with pytest.raises(ValueError):
+        clock.parse_open_time("明天中午")
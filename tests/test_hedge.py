@@ -0,0 +1,112 @@
+# tests/test_hedge.py
+import pytest
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import hedge, outcome
+from utils.hedge import HedgePolicy, Race, quantile
+
+SELECTED = outcome.classify(True, "选课成功")
+BUSY = outcome.classify(False, "请求过于频繁，请稍后再试")
+
+
+def test_quantile_nearest_rank():
+    values = list(range(1, 11))
+    assert quantile(values, 0.5) == 5
+    assert quantile(values, 0.9) == 9
+    assert quantile(values, 1.0) == 10
+    assert quantile([], 0.9) is None
+
+
+def test_delay_uses_initial_until_enough_samples_then_p90():
+    policy = HedgePolicy(initial_delay=1.5)
+    for latency in range(hedge.MIN_SAMPLES - 1):
+        policy.record("URL1", 0.1 * (latency + 1))
+    assert policy.delay("URL1") == 1.5
+    policy.record("URL1", 1.0)
+    assert policy.delay("URL1") == pytest.approx(0.9)
+    # 另一个系统的样本互不影响
+    assert policy.delay("URL2") == 1.5
+
+
+def test_delay_is_clamped():
+    policy = HedgePolicy()
+    for _ in range(hedge.MIN_SAMPLES):
+        policy.record("fast", 0.001)
+        policy.record("slow", 100.0)
+    assert policy.delay("fast") == hedge.MIN_DELAY
+    assert policy.delay("slow") == hedge.MAX_DELAY
+
+
+def test_allow_caps_hedges_at_max_ratio():
+    policy = HedgePolicy(max_ratio=0.2)
+    for _ in range(10):
+        policy.start_race()
+    assert [policy.allow() for _ in range(4)] == [True, True, False, False]
+    summary = policy.summary()
+    assert summary["fired"] == 2 and summary["skipped"] == 2
+    assert summary["fire_rate"] == pytest.approx(0.2)
+
+
+def test_max_ratio_zero_never_hedges():
+    policy = HedgePolicy(max_ratio=0)
+    policy.start_race()
+    assert not policy.allow()
+
+
+def test_probe_every_tenth_win_and_savings():
+    policy = HedgePolicy()
+    probes = [policy.finish_race(0.5, hedge_won=True) for _ in range(2 * hedge.PROBE_EVERY)]
+    assert probes.count(True) == 2 and probes[0]
+    assert not policy.finish_race(0.5, hedge_won=False)
+    policy.record_probe(2.0)
+    policy.record_probe(4.0)
+    summary = policy.summary()
+    assert summary["won"] == 2 * hedge.PROBE_EVERY
+    assert summary["saved_per_win_ms"] == pytest.approx(3000)
+    assert summary["saved"] == pytest.approx(3.0 * 2 * hedge.PROBE_EVERY)
+
+
+def test_answer_latencies_are_bounded():
+    policy = HedgePolicy()
+    for _ in range(hedge.ANSWER_WINDOW + 100):
+        policy.finish_race(0.1, hedge_won=False)
+    assert len(policy.answer_latencies) == hedge.ANSWER_WINDOW
+    assert policy.summary()["answer_p99_ms"] == pytest.approx(100)
+
+
+def test_race_probe_result_is_only_measured():
+    policy = HedgePolicy(max_ratio=1.0)
+    race = Race(policy, {"real_teach_id": "T0"}, "URL1")
+    race.add("primary")
+    assert race.hedge_target(lambda exclude: "URL2" if exclude else "URL1", lambda name: True, None) == "URL2"
+    race.add("hedge", is_hedge=True)
+    # 第一次对冲胜出时抽样：主请求不中止
+    step = race.finish("hedge", SELECTED)
+    assert step.decides and step.report and step.losers == [] and step.probe == "primary"
+    assert race.hedge_target(lambda exclude: "URL2", lambda name: True, None) is None
+    step = race.finish("primary", SELECTED)
+    assert not step.decides and not step.report
+    assert policy.summary()["saved_per_win_ms"] > 0
+
+
+def test_race_cancels_losers_and_waits_for_definitive_answer():
+    policy = HedgePolicy(max_ratio=1.0)
+    policy.finish_race(0.1, hedge_won=True)  # 用掉第一次抽样
+    race = Race(policy, {"real_teach_id": "T0"}, "URL1")
+    race.add("primary")
+    race.add("hedge", is_hedge=True)
+    # 不明确的答复照常处理，但要等另一个请求
+    step = race.finish("primary", BUSY)
+    assert not step.decides and step.report
+    step = race.finish("hedge", SELECTED)
+    assert step.decides and step.probe is None
+
+    race = Race(policy, {"real_teach_id": "T0"}, "URL1")
+    race.add("primary")
+    race.add("hedge", is_hedge=True)
+    step = race.finish("hedge", SELECTED)
+    assert step.decides and step.losers == ["primary"] and step.probe is None
+    # 被中止的主请求结束时不再处理
+    assert race.finish("primary", None) == (False, False, [], None)
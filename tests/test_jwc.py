@@ -0,0 +1,91 @@
+# tests/test_jwc.py
+import threading
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import jwc
+from utils import ocr
+from utils.jwc import Enroller
+
+
+class FakeProbeCache:
+    def resolve(self, base):
+        return f"https://{base}"
+
+
+def make_enroller():
+    return Enroller("2026000000", "secret", base="jwc.example", probe_cache=FakeProbeCache())
+
+
+def test_login_session_carries_origin_without_saved_session():
+    enroller = make_enroller()
+    session = enroller.new_login_session()
+    assert session.headers["Origin"] == "https://jwc.example"
+
+
+def test_pipelined_login_does_not_submit_after_another_lane_succeeded():
+    enroller = make_enroller()
+    both_fetching = threading.Barrier(2)
+    succeeded = threading.Event()
+    lock = threading.Lock()
+    fetches = []
+    submits = []
+
+    def fetch_captcha(session=None):
+        with lock:
+            fetches.append(session)
+            second = len(fetches) > 1
+        both_fetching.wait(2)
+        if second:
+            # 第二条通道的验证码在第一条通道登录成功后才识别完
+            succeeded.wait(2)
+        return ocr.CaptchaResult("ab12", 0.99, None)
+
+    def submit_login(captcha_code, session=None):
+        submits.append(session)
+        succeeded.set()
+        return {"loginStatus": "1"}
+
+    enroller.fetch_captcha = fetch_captcha
+    enroller.submit_login = submit_login
+    enroller.finish_login = lambda session=None: None
+    assert enroller.login_pipelined(lanes=2, use_saved_session=False)
+    # 等第二条通道结束
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread() and thread.daemon:
+            thread.join(2)
+    assert len(fetches) == 2
+    assert len(submits) == 1
+
+
+def test_close_stops_keepalive():
+    enroller = make_enroller()
+    enroller.connections.start_keepalive(enroller.login_page_url, interval=60)
+    stop = enroller.connections._keepalive_stop
+    enroller.close()
+    assert stop.is_set()
+    assert enroller.connections._keepalive_stop is None
+
+
+def test_failed_relogin_stops_requests_and_relogins():
+    enroller = make_enroller()
+    enroller.mark_logged_in()
+    relogins = []
+
+    def login_pipelined(**kwargs):
+        relogins.append(kwargs)
+        return False
+
+    enroller.login_pipelined = login_pipelined
+    assert enroller.handle_session_lost(enroller.session_generation)
+    assert not enroller.wait_session(2)
+    assert not enroller.is_logged_in and not enroller.relogging
+
+    requests_sent = []
+    enroller.session.get = lambda *args, **kwargs: requests_sent.append(args)
+    assert enroller.select_course("R1") == (False, jwc.SESSION_EXPIRED_MESSAGE)
+    assert requests_sent == []
+    # 已经放弃的系统不会再次发起验证码登录
+    assert not enroller.handle_session_lost(enroller.session_generation)
+    assert len(relogins) == 1
@@ -0,0 +1,86 @@
+# tests/test_multi_account.py
+import json
+
+import pytest
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import multi_account
+from utils.multi_account import jain_index, load_accounts, merge_reports, summarize
+
+
+def write_accounts(tmp_path, data):
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_load_accounts(tmp_path):
+    path = write_accounts(tmp_path, {
+        "interval": 0.5,
+        "max_in_flight": 3,
+        "accounts": [
+            {"username": "2026000001", "password": "a", "courses": [{"teach_id": "B1000"}]},
+            {"username": "2026000002", "password": "b", "max_in_flight": 8,
+             "courses": [{"teach_id": "B1001", "need_book": False, "real_teach_id": "R1"}]},
+        ],
+    })
+    settings, accounts = load_accounts(path)
+    assert settings == {"interval": 0.5, "max_in_flight": 3}
+    assert [account.max_in_flight for account in accounts] == [3, 8]
+    assert accounts[0].courses == [{"teach_id": "B1000", "real_teach_id": None, "remark": "", "need_book": True,
+                                    "selected": False}]
+    assert accounts[1].courses[0]["need_book"] is False
+    assert accounts[0].label == "2026***01"
+
+
+@pytest.mark.parametrize("data", [
+    {},
+    {"accounts": []},
+    {"accounts": [{"username": "2026000001"}]},
+    {"accounts": [{"username": "2026000001", "password": "a"}, {"username": "2026000001", "password": "b"}]},
+    {"accounts": [{"username": "2026000001", "password": "a", "courses": [{"remark": "没有编号"}]}]},
+])
+def test_load_accounts_rejects_bad_files(tmp_path, data):
+    with pytest.raises(ValueError):
+        load_accounts(write_accounts(tmp_path, data))
+
+
+def test_jain_index():
+    assert jain_index([1, 1, 1, 1]) == pytest.approx(1.0)
+    assert jain_index([1, 0, 0, 0]) == pytest.approx(0.25)
+    assert jain_index([]) is None
+
+
+def make_row(completed, slots=2, grab_s=10.0, error=None, first=0.5):
+    return {"error": error, "completed": completed, "slots": slots, "grab_s": grab_s, "selected": 1, "dropped": 0,
+            "first_response_s": first}
+
+
+def test_summarize_normalizes_by_slots_and_time():
+    # 两个账号每个名额每秒完成的请求数相同，公平性为 1；登录失败的账号不参与
+    rows = [make_row(100), make_row(100, slots=4, grab_s=5.0, first=0.9), make_row(0, error="登录失败", first=None)]
+    summary = summarize(rows, 10.0)
+    assert summary["fairness"] == pytest.approx(1.0)
+    assert summary["active"] == 2 and summary["accounts"] == 3
+    assert summary["throughput"] == pytest.approx(20.0)
+    assert summary["first_response_max_s"] == 0.9
+
+
+def test_merge_reports_recomputes_summary():
+    reports = [{"accounts": [make_row(100)], "summary": {"elapsed_s": 10.0}, "login_s": 3.0},
+               {"accounts": [make_row(50)], "summary": {"elapsed_s": 8.0}, "login_s": 4.0}]
+    merged = merge_reports(reports)
+    assert merged["summary"]["completed"] == 150
+    assert merged["summary"]["elapsed_s"] == 10.0
+    assert merged["login_s"] == 4.0
+    assert merged["summary"]["min_share"] == pytest.approx(50 / 75)
+
+
+def test_runner_stop_before_login_skips_accounts():
+    account = multi_account.Account("2026000001", "a", [])
+    runner = multi_account.MultiAccountRunner([account], ocr_pool=object(), log=lambda message: None)
+    runner.stop()
+    assert runner.login_all() == 0
+    assert account.error == "已停止"
@@ -0,0 +1,132 @@
+# tests/test_ocr.py
+import os
+import random
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from pathlib import Path
+import sys
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+from utils import ocr
+from bench_recognize import make_char_image, recognize_character_reference
+from captcha_synth import generate_captcha
+
+
+def test_score_templates_matches_pixel_reference():
+    rng = random.Random(0)
+    templates = ocr.load_templates()
+    tensor = ocr.stack_templates(templates)
+    for _ in range(12):
+        _, img = make_char_image(templates, rng)
+        best, results = recognize_character_reference(img, templates)
+        assert ocr.score_templates(img, tensor) == results
+        assert ocr.recognize_character(img, tensor, debug=False) == best
+
+
+def test_classify_synthetic_captchas():
+    rng = random.Random(1)
+    samples = [generate_captcha(rng) for _ in range(20)]
+    correct = sum(ocr.classify(image, debug=False) == label for label, image in samples)
+    assert correct >= 16
+
+
+def test_bundle_round_trip(tmp_path):
+    bank = ocr.TemplateBank.from_directory()
+    path = str(tmp_path / "templates.npy")
+    bank.save(path)
+    loaded = ocr.TemplateBank.load(path)
+    assert loaded.names == bank.names
+    _, image = generate_captcha(random.Random(2))
+    assert ocr.classify(image, debug=False, bank=loaded) == ocr.classify(image, debug=False, bank=bank)
+
+
+def test_pool_fallback_uses_pool_templates(tmp_path, monkeypatch):
+    path = str(tmp_path / "templates.npy")
+    ocr.TemplateBank.from_directory().save(path)
+    pool = ocr.OcrPool(max_workers=1, bundle_path=path)
+
+    def broken(*args, **kwargs):
+        raise BrokenProcessPool("worker died")
+
+    monkeypatch.setattr(pool, "submit", broken)
+    banks = []
+    monkeypatch.setattr(ocr, "_classify_inline", lambda image_bytes, debug, detailed, ensemble, bank=None: banks.append(bank))
+    pool.classify(b"")
+    assert banks == [ocr.get_template_bank(ocr.TEMPLATE_DIR, path)]
+    assert banks[0] is not ocr.get_template_bank()
+
+
+def test_pool_map_falls_back_when_submit_fails(monkeypatch):
+    pool = ocr.OcrPool(max_workers=1)
+    submitted = []
+
+    def submit(*args, **kwargs):
+        if submitted:
+            raise BrokenProcessPool("worker died")
+        submitted.append(args)
+        return Future()
+
+    monkeypatch.setattr(pool, "submit", submit)
+    monkeypatch.setattr(ocr, "_classify_inline", lambda image_bytes, *args, **kwargs: image_bytes.decode())
+    assert pool.map([b"a", b"b", b"c"], timeout=0.1) == ["a", "b", "c"]
+
+
+def test_pool_times_out_hung_worker(monkeypatch):
+    pool = ocr.OcrPool(max_workers=1)
+    monkeypatch.setattr(pool, "submit", lambda *args, **kwargs: Future())
+    monkeypatch.setattr(ocr, "_classify_inline", lambda image_bytes, *args, **kwargs: image_bytes.decode())
+    start = time.monotonic()
+    assert pool.classify(b"a", timeout=0.1) == "a"
+    assert pool.map([b"b", b"c"], timeout=0.1) == ["b", "c"]
+    assert time.monotonic() - start < 1.0
+
+
+def test_template_bank_reloads_only_when_asked(tmp_path, monkeypatch):
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir()
+    for name in ("A", "B"):
+        ocr.TemplateBank.from_directory().templates[name].save(template_dir / f"{name}.png")
+    bank = ocr.get_template_bank(str(template_dir))
+    assert bank.names == ["A", "B"]
+    ocr.TemplateBank.from_directory().templates["C"].save(template_dir / "C.png")
+
+    def no_io(*args):
+        raise AssertionError("识别时不应访问文件系统")
+
+    monkeypatch.setattr(ocr.os, "listdir", no_io)
+    assert ocr.get_template_bank(str(template_dir)) is bank
+    monkeypatch.undo()
+    assert ocr.get_template_bank(str(template_dir), reload=True).names == ["A", "B", "C"]
+
+
+def test_bundle_is_built_and_refreshed_from_directory(tmp_path):
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir()
+    source = ocr.TemplateBank.from_directory()
+    source.templates["A"].save(template_dir / "A.png")
+    bundle = tmp_path / "cache" / "templates.npy"
+    assert ocr.TemplateBank.from_bundle(str(bundle), str(template_dir)).names == ["A"]
+    assert bundle.exists()
+    assert ocr.TemplateBank.load(str(bundle)).names == ["A"]
+    # 模板目录比预编译包新时重新生成
+    source.templates["B"].save(template_dir / "B.png")
+    stamp = bundle.stat().st_mtime_ns + 10 ** 9
+    os.utime(template_dir / "B.png", ns=(stamp, stamp))
+    bank = ocr.TemplateBank.from_bundle(str(bundle), str(template_dir))
+    assert bank.names == ["A", "B"]
+    assert ocr.TemplateBank.load(str(bundle)).names == ["A", "B"]
+    assert not bank.is_stale()
+
+
+def test_char_vote_keeps_top_k_candidates():
+    def hypothesis(candidates):
+        chars = [ocr.CharResult(candidates[0][0], candidates[0][1], candidates) for _ in range(ocr.CAPTCHA_LENGTH)]
+        return ocr.CaptchaResult(chars[0].char * ocr.CAPTCHA_LENGTH, candidates[0][1], chars)
+
+    hypotheses = [hypothesis([("a", 0.9), ("b", 0.5), ("c", 0.4)]), hypothesis([("b", 0.8), ("d", 0.6), ("e", 0.3)])]
+    result = ocr.vote_hypotheses(hypotheses, "char", top_k=2)
+    assert result.text == "b" * ocr.CAPTCHA_LENGTH
+    assert [char for char, _ in result.chars[0].candidates] == ["b", "a"]
@@ -0,0 +1,99 @@
+# tests/test_outcome.py
+import httpx
+import pytest
+import requests
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import jwc
+from utils import outcome
+
+# (success, 提示信息, 期望的结果类别)
+RULES = [
+    (True, "选课成功", outcome.SUCCESS),
+    (False, "该课程人数已满", outcome.FULL),
+    (False, "课程已选满", outcome.FULL),
+    (False, "课程余量不足", outcome.FULL),
+    (False, "与已选课程上课时间冲突", outcome.CONFLICT),
+    (False, "已选学分超过上限", outcome.NOT_ELIGIBLE),
+    (False, "该课程不对你开放", outcome.NOT_ELIGIBLE),
+    (False, "您已选过该课程", outcome.ALREADY_SELECTED),
+    (False, "你已经选择了该课程", outcome.ALREADY_SELECTED),
+    (False, "不能重复选课", outcome.ALREADY_SELECTED),
+    (False, "选课尚未开始", outcome.NOT_STARTED),
+    (False, "请求过于频繁，请稍后再试", outcome.THROTTLED),
+    (False, "选课请求超时（60 秒）", outcome.THROTTLED),
+    (False, "选课已结束", outcome.NOT_ELIGIBLE),
+    (False, jwc.SESSION_EXPIRED_MESSAGE, outcome.SESSION_LOST),
+    (False, "请先登录", outcome.SESSION_LOST),
+    (False, "登录超时，请重新登录", outcome.SESSION_LOST),
+    # 只是含有这些字的提示不能结束抢课或触发重新登录
+    (False, "申请记录已存在，请等待审核", outcome.UNKNOWN),
+    (False, "已申请教材，请登录教材系统查看", outcome.UNKNOWN),
+    (False, "学分统计将在本轮结束后更新", outcome.UNKNOWN),
+    (False, "第一阶段已结束，第二阶段名单公示中", outcome.UNKNOWN),
+    # 本地异常的文字不参与匹配（由 classify_error 按类型归类）
+    (False, "选课请求失败: HTTPSConnectionPool(host='jwc.swjtu.edu.cn', port=443): Max retries exceeded", outcome.UNKNOWN),
+    (False, "", outcome.UNKNOWN),
+    (False, None, outcome.UNKNOWN),
+]
+
+
+@pytest.mark.parametrize("success, message, expected", RULES)
+def test_classify(success, message, expected):
+    result = outcome.classify(success, message)
+    assert result.outcome == expected
+    assert result.policy == outcome.RETRY_POLICY[expected]
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} Server Error", response=response)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (requests.ConnectionError("Max retries exceeded"), outcome.THROTTLED),
+    (requests.Timeout("read timed out"), outcome.THROTTLED),
+    (httpx.ConnectTimeout("timed out"), outcome.THROTTLED),
+    (httpx.RemoteProtocolError("Server disconnected"), outcome.THROTTLED),
+    (TimeoutError("60 秒内没有返回"), outcome.THROTTLED),
+    (http_error(503), outcome.THROTTLED),
+    (httpx.HTTPStatusError("429", request=httpx.Request("GET", "https://jwc.example"), response=httpx.Response(429)),
+     outcome.THROTTLED),
+    (http_error(404), outcome.UNKNOWN),
+    (ValueError("Connection reset"), outcome.UNKNOWN),
+])
+def test_classify_error_by_type(error, expected):
+    assert outcome.classify_error(error).outcome == expected
+    assert outcome.classify_error(error).policy == outcome.BACKOFF
+
+
+def test_apply_marks_selected_and_dropped():
+    course = {"teach_id": "B1000", "selected": False}
+    outcome.apply(course, outcome.classify(False, "与已选课程上课时间冲突"), "与已选课程上课时间冲突")
+    assert not outcome.is_pending(course) and not course["selected"]
+    course = {"teach_id": "B1001", "selected": False}
+    outcome.apply(course, outcome.classify(False, "您已选过该课程"), "您已选过该课程")
+    assert course["selected"]
+
+
+def test_is_definitive():
+    assert outcome.is_definitive(outcome.classify(False, "该课程人数已满"))
+    assert outcome.is_definitive(outcome.classify(True, "选课成功"))
+    assert not outcome.is_definitive(outcome.classify(False, "系统繁忙"))
+    assert not outcome.is_definitive(outcome.classify(False, "请先登录"))
+
+
+def test_retry_tracker_backs_off_exponentially_and_resets():
+    tracker = outcome.RetryTracker(base_delay=1, max_delay=3)
+    busy = outcome.classify(False, "系统繁忙")
+    for expected in (1, 2, 3, 3):
+        tracker.record("key", busy)
+        assert tracker.delay("key") == pytest.approx(expected, abs=0.05)
+    tracker.record("key", outcome.classify(False, "该课程人数已满"))
+    assert tracker.delay("key") == 0
+    counts, backoff_time = tracker.summary()
+    assert counts == {"服务器繁忙": 4, "人数已满": 1}
+    assert backoff_time == pytest.approx(9)
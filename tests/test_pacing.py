@@ -0,0 +1,83 @@
+# tests/test_pacing.py
+import pytest
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+from utils import pacing
+from utils.pacing import PacingController
+
+FULL = outcome.classify(False, "该课程人数已满")
+BUSY = outcome.classify(False, "系统繁忙")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可以手动推进的 time.monotonic"""
+    now = [1000.0]
+    monkeypatch.setattr(pacing.time, "monotonic", lambda: now[0])
+    return now
+
+
+def run_window(controller, clock, latency, result):
+    """一个窗口内完成 MIN_SAMPLES 个请求（最后一个请求结束时调整）"""
+    for _ in range(pacing.MIN_SAMPLES):
+        assert controller.try_acquire()
+    clock[0] += pacing.WINDOW
+    for _ in range(pacing.MIN_SAMPLES):
+        controller.release(latency, result)
+
+
+def test_try_acquire_respects_limit():
+    controller = PacingController(4, 0.5, adaptive=False)
+    assert [controller.try_acquire() for _ in range(5)] == [True] * 4 + [False]
+    controller.discard()
+    assert controller.try_acquire()
+
+
+def test_adaptive_starts_at_half_and_grows_additively(clock):
+    controller = PacingController(20, 0.5)
+    assert controller.snapshot()["limit"] == 10
+    run_window(controller, clock, 0.1, FULL)
+    assert controller.snapshot()["limit"] == 11
+    assert controller.increases == 1
+
+
+def test_errors_decrease_multiplicatively_and_back_off_interval(clock):
+    controller = PacingController(20, 0.5)
+    run_window(controller, clock, 0.1, BUSY)
+    snapshot = controller.snapshot()
+    assert snapshot["limit"] == int(10 * pacing.DECREASE_FACTOR)
+    assert snapshot["interval"] == pytest.approx(0.5 * pacing.INTERVAL_BACKOFF)
+    assert snapshot["error_rate"] == 1.0
+    # 恢复后间隔逐步缩回下限
+    for _ in range(10):
+        run_window(controller, clock, 0.1, FULL)
+    assert controller.snapshot()["interval"] == 0.5
+
+
+def test_latency_above_baseline_counts_as_congestion(clock):
+    controller = PacingController(20, 0.5)
+    run_window(controller, clock, 0.1, FULL)
+    run_window(controller, clock, 0.1 * pacing.LATENCY_TOLERANCE * 2, FULL)
+    assert controller.decreases == 1
+
+
+def test_limit_stays_within_bounds(clock):
+    controller = PacingController(8, 0.2, min_limit=pacing.MIN_SAMPLES)
+    for _ in range(20):
+        run_window(controller, clock, 0.1, BUSY)
+    assert controller.snapshot()["limit"] == pacing.MIN_SAMPLES
+    assert controller.snapshot()["interval"] <= pacing.MAX_INTERVAL
+    for _ in range(20):
+        run_window(controller, clock, 0.1, FULL)
+    assert controller.snapshot()["limit"] == 8
+
+
+def test_not_adaptive_only_records(clock):
+    controller = PacingController(8, 0.5, adaptive=False)
+    run_window(controller, clock, 0.1, BUSY)
+    snapshot = controller.snapshot()
+    assert snapshot["limit"] == 8 and snapshot["interval"] == 0.5
+    assert snapshot["error_rate"] == 1.0
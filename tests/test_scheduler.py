@@ -0,0 +1,108 @@
+# tests/test_scheduler.py
+import threading
+import time
+
+import requests
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+from utils.hedge import HedgePolicy
+from utils.pacing import PacingController
+from utils.scheduler import GrabScheduler
+
+
+class FakeEnroller:
+    """只实现 GrabScheduler 用到的接口：replies 为 {real_teach_id: 提示信息}，没有列出的课程返回人数已满"""
+    is_logged_in = True
+    relogging = False
+
+    def __init__(self, replies=None, delay=0.01):
+        self.replies = replies or {}
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def select_course(self, real_teach_id, need_book=True, raise_errors=False):
+        with self.lock:
+            self.calls.append(real_teach_id)
+        time.sleep(self.delay)
+        message = self.replies.get(real_teach_id, "该课程人数已满")
+        return message == "选课成功", message
+
+
+def make_courses(count):
+    return [{"teach_id": f"T{i}", "real_teach_id": f"T{i}", "need_book": True, "selected": False} for i in range(count)]
+
+
+def make_scheduler(backends, workers=4, interval=0.01, hedge=None):
+    pacing = {name: PacingController(workers, interval, adaptive=False) for name, _ in backends}
+    return GrabScheduler(backends, pacing, outcome.RetryTracker(base_delay=interval, max_delay=interval), workers,
+                         hedge=hedge)
+
+
+def run_for(scheduler, courses, seconds=2.0):
+    end = time.monotonic() + seconds
+    return scheduler.run(courses, lambda: time.monotonic() < end)
+
+
+def test_courses_end_selected_or_dropped():
+    courses = make_courses(3)
+    enroller = FakeEnroller({"T0": "选课成功", "T1": "与已选课程上课时间冲突", "T2": "您已选过该课程"})
+    start = time.monotonic()
+    stats = run_for(make_scheduler([("URL1", enroller)]), courses)
+    # 所有课程都有结论后立即结束，不等到超时
+    assert time.monotonic() - start < 1.5
+    assert [course["selected"] for course in courses] == [True, False, True]
+    assert courses[1]["dropped"].startswith("时间冲突")
+    assert stats["succeeded"] == 1
+
+
+def test_full_course_is_retried_per_backend():
+    courses = make_courses(1)
+    backends = [("URL1", FakeEnroller()), ("URL2", FakeEnroller())]
+    stats = run_for(make_scheduler(backends), courses, seconds=0.3)
+    assert not courses[0]["selected"] and not courses[0].get("dropped")
+    assert all(len(enroller.calls) > 3 for _, enroller in backends)
+    assert stats["completed"] == sum(len(enroller.calls) for _, enroller in backends)
+
+
+def test_hedge_goes_to_other_backend_when_primary_is_slow():
+    courses = make_courses(1)
+    slow = FakeEnroller({"T0": "选课成功"}, delay=1.0)
+    fast = FakeEnroller({"T0": "选课成功"})
+    policy = HedgePolicy(initial_delay=0.05, max_ratio=1.0)
+    results = []
+    start = time.monotonic()
+    end = start + 2.0
+    make_scheduler([("slow", slow), ("fast", fast)], hedge=policy).run(
+        courses, lambda: time.monotonic() < end,
+        on_result=lambda attempt, name, course, success, message, result, changed: results.append(name))
+    assert courses[0]["selected"]
+    assert fast.calls == ["T0"]
+    assert time.monotonic() - start < 1.5
+    summary = policy.summary()
+    assert summary["fired"] == 1 and summary["won"] == 1
+    # 第一次胜出时抽样的主请求返回后只记录节省的时间，不再作为结果处理
+    assert slow.calls == ["T0"] and results == ["fast"]
+
+
+def test_request_errors_are_classified_by_type():
+    class FailingEnroller(FakeEnroller):
+        def select_course(self, real_teach_id, need_book=True, raise_errors=False):
+            assert raise_errors
+            super().select_course(real_teach_id, need_book)
+            raise requests.ConnectionError("HTTPSConnectionPool: Max retries exceeded")
+
+    courses = make_courses(1)
+    results = []
+    scheduler = make_scheduler([("URL1", FailingEnroller())])
+    end = time.monotonic() + 0.2
+    scheduler.run(courses, lambda: time.monotonic() < end,
+                  on_result=lambda attempt, name, course, success, message, result, changed: results.append((message, result)))
+    assert results
+    message, result = results[0]
+    assert result.outcome == outcome.THROTTLED
+    assert message.startswith("选课请求失败: ")
+    assert outcome.is_pending(courses[0])
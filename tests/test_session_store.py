@@ -0,0 +1,73 @@
+# tests/test_session_store.py
+import stat
+import time
+
+import requests
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.session_store import SessionStore
+
+USERNAME = "2026000001"
+BASE = "jwc.swjtu.edu.cn"
+
+
+def make_jar():
+    session = requests.Session()
+    session.cookies.set("JSESSIONID", "abc123", domain=BASE, path="/")
+    return session.cookies
+
+
+def test_save_and_load_round_trip(tmp_path):
+    store = SessionStore(tmp_path / "sessions")
+    store.save(USERNAME, BASE, make_jar())
+    cookies = store.load(USERNAME, BASE)
+    assert [(cookie["name"], cookie["value"]) for cookie in cookies] == [("JSESSIONID", "abc123")]
+    jar = requests.Session().cookies
+    SessionStore.apply(cookies, jar)
+    assert jar.get("JSESSIONID", domain=BASE) == "abc123"
+    # 另一个主机或账号没有会话
+    assert store.load(USERNAME, "jiaowu.swjtu.edu.cn/TMS") is None
+    assert store.load("2026000002", BASE) is None
+
+
+def test_files_are_private(tmp_path):
+    directory = tmp_path / "sessions"
+    store = SessionStore(directory)
+    store.save(USERNAME, BASE, make_jar())
+    assert stat.S_IMODE(directory.stat().st_mode) == 0o700
+    files = list(directory.iterdir())
+    assert len(files) == 1
+    assert stat.S_IMODE(files[0].stat().st_mode) == 0o600
+
+
+def test_file_name_is_hashed(tmp_path):
+    directory = tmp_path / "sessions"
+    store = SessionStore(directory)
+    store.save(USERNAME, BASE, make_jar())
+    store.save(USERNAME, "jiaowu.swjtu.edu.cn/TMS", make_jar())
+    names = sorted(path.name for path in directory.iterdir())
+    assert len(names) == 2
+    for name in names:
+        assert USERNAME not in name and name.endswith(".json")
+        assert len(name) == len(".json") + 32
+
+
+def test_expired_session_is_not_loaded(tmp_path, monkeypatch):
+    store = SessionStore(tmp_path / "sessions", max_age=60)
+    store.save(USERNAME, BASE, make_jar())
+    now = time.time()
+    monkeypatch.setattr("utils.session_store.time.time", lambda: now + 61)
+    assert store.load(USERNAME, BASE) is None
+    monkeypatch.setattr("utils.session_store.time.time", lambda: now + 59)
+    assert store.load(USERNAME, BASE) is not None
+
+
+def test_delete(tmp_path):
+    store = SessionStore(tmp_path / "sessions")
+    store.save(USERNAME, BASE, make_jar())
+    store.delete(USERNAME, BASE)
+    assert store.load(USERNAME, BASE) is None
+    # 没有保存过时也不报错
+    store.delete(USERNAME, BASE)
@@ -0,0 +1,615 @@
+# utils/async_jwc.py
+"""
+基于 asyncio + httpx 的异步选课引擎，可替代 ThreadPoolExecutor 抢课循环。
+
+线程池里每个选课请求都要独占一个线程，最长 60 秒；异步引擎在一个事件循环里同时挂起数百个请求，
+每个请求有独立的截止时间。AsyncEnroller 包装一个已有的 Enroller，直接共用它的 Cookie（同一个 CookieJar）、
+请求头和各个 URL，所以同步登录后即可异步抢课，反之亦然。
+多个账号同时抢课时，SharedTransports 让各账号的 AsyncEnroller 共用到同一系统的连接（Cookie 仍各自独立）。
+"""
+import asyncio
+import time
+
+import httpx
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import jwc
+from utils import outcome
+from utils.hedge import Race
+from utils.pacing import PacingController
+
+# 同时挂起的选课请求数上限
+DEFAULT_MAX_IN_FLIGHT = 500
+# 单个选课请求的截止时间（秒），与同步实现的超时一致
+SELECT_DEADLINE = 60
+# 每个 httpx.AsyncClient 的连接数。httpcore 每次分配连接都要遍历整个连接池和等待队列，
+# 单个客户端挂上数百个连接时 CPU 开销随连接数平方增长，所以拆成多个小客户端轮流使用。
+# 在 benchmarks/grab_bench.py 中 500 并发时，每个客户端 4 个连接的吞吐约为 64 个连接时的 3 倍
+CLIENT_POOL_SIZE = 4
+# 多个账号共用时，到每个系统的连接数
+SHARED_CONNECTIONS = 64
+
+
+class SharedTransports:
+    """
+    多个账号共用的连接池
+
+    httpx 的连接池在 transport 上，Cookie 在 AsyncClient 上：每个账号用自己的 AsyncClient（自己的 CookieJar）
+    包装这里的 transport，只共享 TCP/TLS 连接，不共享会话。每个系统 max_connections 个连接，
+    按 CLIENT_POOL_SIZE 拆成多个 transport（原因同上），各账号从不同的 transport 开始轮流使用。
+
+    参数:
+        max_connections: 到每个系统的连接数
+        verify: 是否校验证书
+    """
+
+    def __init__(self, max_connections=SHARED_CONNECTIONS, verify=True):
+        self.max_connections = max_connections
+        self.verify = verify
+        self._ssl_context = None
+        # base_url -> [httpx.AsyncHTTPTransport, ...]
+        self._transports = {}
+        self._handed_out = 0
+
+    def get(self, base_url):
+        """到 base_url 的 transport 列表（首次调用时创建），每次调用的起始位置依次错开"""
+        transports = self._transports.get(base_url)
+        if transports is None:
+            if self._ssl_context is None:
+                self._ssl_context = httpx.create_ssl_context(verify=self.verify)
+            pool_size = min(self.max_connections, CLIENT_POOL_SIZE)
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            transports = [httpx.AsyncHTTPTransport(verify=self._ssl_context, limits=limits)
+                          for _ in range(-(-self.max_connections // pool_size))]
+            self._transports[base_url] = transports
+        offset = self._handed_out % len(transports)
+        self._handed_out += 1
+        return transports[offset:] + transports[:offset]
+
+    async def aclose(self):
+        transports, self._transports = self._transports, {}
+        for items in transports.values():
+            for transport in items:
+                await transport.aclose()
+
+
+class AsyncEnroller:
+    """
+    Enroller 的异步版本
+
+    参数:
+        enroller: 共享 Cookie、请求头与 URL 的 Enroller
+        max_connections: 到该系统的最大连接数
+        shared: SharedTransports，传入时使用其中的连接（多个账号共用），不另建连接池
+    """
+
+    def __init__(self, enroller, max_connections=DEFAULT_MAX_IN_FLIGHT, shared=None):
+        self.enroller = enroller
+        self.max_connections = max_connections
+        self.shared = shared
+        self.clients = []
+        self._next_client = 0
+
+    @property
+    def is_logged_in(self):
+        return self.enroller.is_logged_in
+
+    @property
+    def session_ready(self):
+        """会话可用（没有在后台重新登录）"""
+        return not self.enroller.relogging
+
+    async def wait_session(self, timeout=jwc.SESSION_HOLD_TIMEOUT):
+        """Enroller 正在后台重新登录时等待其完成（轮询，不占用线程），返回会话是否可用"""
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        while self.enroller.relogging:
+            if loop.time() >= end:
+                return False
+            await asyncio.sleep(0.1)
+        return self.enroller.is_logged_in
+
+    @property
+    def client(self):
+        """轮流返回各个 httpx.AsyncClient"""
+        client = self.clients[self._next_client % len(self.clients)]
+        self._next_client += 1
+        return client
+
+    async def open(self):
+        """解析协议并创建 httpx.AsyncClient（协议探测可能阻塞，放到线程中执行）"""
+        if not self.clients:
+            base_url = await asyncio.to_thread(lambda: self.enroller.base_url)
+            session = self.enroller.session
+            if self.shared is not None:
+                # 按本账号的连接数取用其中几个 transport（至少两个，一个排满时还有另一个）
+                count = max(2, -(-self.max_connections // CLIENT_POOL_SIZE))
+                self.clients = [httpx.AsyncClient(cookies=session.cookies, headers=dict(session.headers),
+                                                  transport=transport, timeout=SELECT_DEADLINE)
+                                for transport in self.shared.get(base_url)[:count]]
+                return self
+            pool_size = min(self.max_connections, CLIENT_POOL_SIZE)
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            # 证书加载很慢（每次数十毫秒），所有客户端共用一个 SSLContext
+            ssl_context = httpx.create_ssl_context(verify=session.verify)
+            # 直接传入 requests 的 CookieJar，httpx 会共用同一个对象而不是复制，所有客户端与 Enroller 共享 Cookie
+            self.clients = [httpx.AsyncClient(cookies=session.cookies, headers=dict(session.headers),
+                                              verify=ssl_context, limits=limits, timeout=SELECT_DEADLINE)
+                            for _ in range(-(-self.max_connections // pool_size))]
+        return self
+
+    async def aclose(self):
+        clients, self.clients = self.clients, []
+        # 共用的连接由 SharedTransports.aclose 关闭（AsyncClient.aclose 会关闭它的 transport）
+        if self.shared is not None:
+            return
+        for client in clients:
+            await client.aclose()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def login(self, max_retries=10, retry_delay=1, min_confidence=jwc.MIN_CAPTCHA_CONFIDENCE, use_saved_session=True):
+        """与 Enroller.login 相同的流程，验证码识别在线程（或 OCR 进程池）中进行"""
+        await self.open()
+        enroller = self.enroller
+        if use_saved_session and await asyncio.to_thread(enroller.restore_session):
+            return True
+        for attempt in range(1, max_retries + 1):
+            print(f"--- 登录尝试 #{attempt}/{max_retries} ---")
+
+            try:
+                # 1. 获取并识别验证码（是否值得提交与 Enroller.login 使用同一判断）
+                response = await self.client.get(**enroller.captcha_request())
+                response.raise_for_status()
+                captcha = await asyncio.to_thread(enroller.recognize_captcha, response.content)
+                if captcha:
+                    print(f"OCR 识别结果: {captcha.text} (置信度 {captcha.confidence:.3f})")
+                else:
+                    print("OCR 识别结果: None")
+                rejection = enroller.captcha_rejection(captcha, min_confidence, attempt == max_retries)
+                if rejection:
+                    print(f"{rejection}，立即重新获取验证码。")
+                    continue
+
+                # 2. 尝试API登录
+                response = await self.client.post(**enroller.login_request(captcha.text))
+                response.raise_for_status()
+                login_result = response.json()
+
+                if login_result.get('loginStatus') == '1':
+                    print("正在访问加载页面以建立完整会话...")
+                    await self.client.get(**enroller.loading_request())
+                    # 进入已登录状态、保存会话、保持连接，与同步登录相同
+                    await asyncio.to_thread(enroller.complete_login)
+                    return True
+                print(f"登录API失败: {login_result.get('loginMsg', '未知错误')}")
+
+            except Exception as e:
+                print(f"登录过程中发生异常: {e}")
+
+            if attempt < max_retries:
+                await asyncio.sleep(retry_delay)
+
+        print(f"\n登录失败 {max_retries} 次，程序终止。")
+        return False
+
+    async def search_course_by_teach_id(self, teach_id, deadline=10):
+        """
+        按选课编号查询课程，获取真正的课程ID
+        Returns:
+            tuple: (success, real_teach_id, error_message)
+        """
+        await self.open()
+        try:
+            async with asyncio.timeout(deadline):
+                response = await self.client.post(self.enroller.course_url, data=jwc.build_search_payload(teach_id),
+                                                  headers={'Referer': self.enroller.course_url})
+                if jwc.is_login_required(response):
+                    self.enroller.handle_session_lost()
+                    return False, None, jwc.SESSION_EXPIRED_MESSAGE
+                response.raise_for_status()
+            return jwc.parse_search_response(response.text, teach_id)
+        except TimeoutError:
+            return False, None, f"查询课程超时（{deadline} 秒）"
+        except Exception as e:
+            return False, None, f"查询课程失败: {str(e)}"
+
+    async def select_course(self, real_teach_id, need_book=True, deadline=SELECT_DEADLINE,
+                            hold_timeout=jwc.SESSION_HOLD_TIMEOUT, retry_on_expired=True, raise_errors=False):
+        """
+        提交选课请求，deadline 秒内没有完成则放弃；会话失效时与 Enroller.select_course 一样挂起并重发一次，
+        raise_errors 也与 Enroller.select_course 相同（超过 deadline 时抛出 TimeoutError）
+        Returns:
+            tuple: (success, message)
+        """
+        await self.open()
+        if not await self.wait_session(hold_timeout):
+            return False, jwc.SESSION_EXPIRED_MESSAGE
+        generation = self.enroller.session_generation
+        try:
+            async with asyncio.timeout(deadline):
+                response = await self.client.get(self.enroller.course_url,
+                                                 params=jwc.build_select_params(real_teach_id, need_book),
+                                                 headers={'Referer': self.enroller.course_url})
+                # httpx 不跟随重定向，会话失效时这里是指向登录页的 302
+                if jwc.is_login_required(response):
+                    self.enroller.handle_session_lost(generation)
+                    if retry_on_expired and await self.wait_session(hold_timeout):
+                        return await self.select_course(real_teach_id, need_book, deadline, hold_timeout, False,
+                                                        raise_errors)
+                    return False, jwc.SESSION_EXPIRED_MESSAGE
+                response.raise_for_status()
+            return jwc.parse_select_response(response.text)
+        except TimeoutError:
+            if raise_errors:
+                raise TimeoutError(f"{deadline} 秒内没有返回") from None
+            return False, f"选课请求超时（{deadline} 秒）"
+        except Exception as e:
+            if raise_errors:
+                raise
+            return False, f"选课请求失败: {str(e)}"
+
+    async def auto_select_course(self, teach_id, need_book=True):
+        """
+        自动选课：先搜索再选课
+        Returns:
+            tuple: (success, message)
+        """
+        if not self.is_logged_in:
+            return False, "请先登录"
+        success, real_teach_id, error = await self.search_course_by_teach_id(teach_id)
+        if not success:
+            return False, error
+        return await self.select_course(real_teach_id, need_book)
+
+
+class AsyncGrabEngine:
+    """
+    异步抢课调度：与 utils/scheduler.GrabScheduler 相同，按 (课程, 系统) 调度而不是按固定轮次
+
+    每个 (课程, 系统) 由 per_pair 个协程负责，一个请求返回后等待该系统当前的间隔（或退避时间）再发下一个；
+    系统的并发名额用完时协程在该系统的 asyncio.Condition 上等待，有请求返回时被唤醒。
+    一门课选上（或被放弃）后，它在其他系统上的协程立即取消（正在进行的请求随之中止）；
+    stop() 可以在其他线程中调用，取消所有协程。
+    传入 hedge 时为对冲模式（与 GrabScheduler 相同）：每门课一个协程，每次向一个系统发出主请求，
+    超过对冲延迟仍未返回时向另一个系统发出对冲请求，先返回明确答复的胜出，另一个随即取消。
+
+    参数:
+        backends: [(名称, AsyncEnroller), ...]
+        max_in_flight: 没有传入 pacing 时每个系统同时挂起的请求数上限
+        deadline: 单个选课请求的截止时间（秒）
+        retry_tracker: outcome.RetryTracker，按结果分类决定放弃、退避或立即重试
+        pacing: {名称: PacingController}，各系统的并发数与间隔；为 None 时并发只受 max_in_flight 限制
+        per_pair: 每个 (课程, 系统) 同时未完成的请求数
+        router: 路由（如 utils/backends.BackendRegistry），用法与 GrabScheduler 相同
+        hedge: utils/hedge.HedgePolicy，传入时使用对冲模式
+    """
+
+    def __init__(self, backends, max_in_flight=DEFAULT_MAX_IN_FLIGHT, deadline=SELECT_DEADLINE, retry_tracker=None,
+                 pacing=None, per_pair=1, router=None, hedge=None):
+        self.backends = backends
+        self.max_in_flight = max_in_flight
+        self.deadline = deadline
+        self.retry_tracker = retry_tracker or outcome.RetryTracker()
+        self.pacing = pacing
+        self.per_pair = per_pair
+        self.router = router
+        self.hedge = hedge
+        # cancelled_queued: 等待并发名额时被取消的请求；aborted: 发出后被中止的请求
+        self.stats = {"submitted": 0, "completed": 0, "succeeded": 0, "max_in_flight": 0,
+                      "cancelled_queued": 0, "aborted": 0}
+        self._in_flight = 0
+        # 系统名 -> 等待并发名额的协程数
+        self._waiting = {name: 0 for name, _ in backends}
+        # 课程 real_teach_id -> 负责它的协程；等待并发名额的协程 -> "waiting"
+        self._tasks = {}
+        self._states = {}
+        self._attempts = {}
+        # 对冲胜出后没有中止、用来测量节省时间的主请求
+        self._probes = set()
+        # 系统名 -> PacingController / asyncio.Condition（run 中创建）
+        self._pacing = {}
+        self._conditions = {}
+        self._loop = None
+        self._stopped = False
+
+    def queue_depth(self):
+        """
+        当前排队情况
+
+        返回:
+            dict: {"queued": 0（没有线程池队列）, "waiting": {系统名: 等待并发名额的课程数}}
+        """
+        return {"queued": 0, "waiting": dict(self._waiting)}
+
+    def stop(self):
+        """停止抢课（可以在其他线程中调用）：取消所有协程，正在进行的请求随之中止"""
+        self._stopped = True
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._cancel_all)
+
+    def _cancel_all(self):
+        for tasks in self._tasks.values():
+            for task in tasks:
+                task.cancel()
+        for probe in list(self._probes):
+            probe.cancel()
+
+    def _cancel_course(self, course):
+        """课程已选上或被放弃：取消它在其他系统上的协程"""
+        current = asyncio.current_task()
+        for task in self._tasks.get(course["real_teach_id"], ()):
+            if task is not current:
+                task.cancel()
+
+    def _try_acquire(self, name, controller):
+        """在路由分给该系统的并发数与控制器的并发数之内占用一个名额"""
+        if self.router is not None and controller.in_flight >= self.router.budget(name, self.max_in_flight):
+            return False
+        return controller.try_acquire()
+
+    async def _acquire(self, name, controller, condition, should_continue):
+        """等待该系统的并发名额，停止时返回 False"""
+        if self._try_acquire(name, controller):
+            return True
+        self._waiting[name] += 1
+        try:
+            async with condition:
+                while not self._try_acquire(name, controller):
+                    if not should_continue():
+                        return False
+                    # 控制器的并发数可能在别处被调高，定期重试
+                    try:
+                        await asyncio.wait_for(condition.wait(), 0.5)
+                    except TimeoutError:
+                        pass
+            return True
+        finally:
+            self._waiting[name] -= 1
+
+    def _available(self, name):
+        enroller = self._enrollers[name]
+        return enroller.is_logged_in and enroller.session_ready
+
+    def _pick_backend(self, exclude=None):
+        """对冲模式下主请求（或对冲请求）发往的系统（见 HedgePolicy.pick_backend）；没有时返回 None"""
+        return self.hedge.pick_backend([name for name, _ in self.backends if name != exclude and self._available(name)],
+                                       self.router)
+
+    def _next_delay(self, course, name):
+        """同一 (课程, 系统) 下一次请求前的等待时间：按路由权重放大的间隔与退避时间取较大者"""
+        controller = self._pacing[name]
+        # 权重为 0（正在重新登录）时由循环开头的检查等待
+        weight = self.router.weight(name) if self.router is not None else 1.0
+        interval = controller.interval / weight if weight > 0 else controller.interval
+        return max(interval, self.retry_tracker.delay((course["real_teach_id"], name)))
+
+    async def _worker(self, course, name, should_continue, on_submit, on_result, start_at=None):
+        """负责一个 (课程, 系统)（对冲模式下为一门课）：循环提交直到课程选上、被放弃或停止；被取消时按所处阶段计入统计"""
+        task = asyncio.current_task()
+        try:
+            if start_at is not None:
+                await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+            if self.hedge is not None:
+                await self._loop_course(course, name, should_continue, on_submit, on_result)
+            else:
+                await self._loop_pair(course, name, should_continue, on_submit, on_result)
+        except asyncio.CancelledError:
+            # 请求进行中被取消的在 _select 中计入 aborted
+            if self._states.get(task) == "waiting":
+                self.stats["cancelled_queued"] += 1
+        finally:
+            self._states.pop(task, None)
+
+    async def _select(self, course, name, on_submit):
+        """
+        发出一个选课请求（调用前已占用名额），结束后释放名额并记录延迟
+
+        返回:
+            (attempt, success, message, result)；被取消时计入中止数并重新抛出 CancelledError
+        """
+        enroller, controller, condition = self._enrollers[name], self._pacing[name], self._conditions[name]
+        key = (course["real_teach_id"], name)
+        self._attempts[key] = attempt = self._attempts.get(key, 0) + 1
+        self.stats["submitted"] += 1
+        self._in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+        if on_submit is not None:
+            on_submit(attempt, name, course)
+        start = time.perf_counter()
+        result = None
+        try:
+            try:
+                success, message = await enroller.select_course(course["real_teach_id"], course["need_book"], self.deadline,
+                                                                raise_errors=True)
+                result = outcome.classify(success, message)
+            except Exception as e:
+                # 本地请求异常按异常类型归类，不匹配提示信息
+                success, message = False, outcome.error_message(e)
+                result = outcome.classify_error(e)
+        except asyncio.CancelledError:
+            self.stats["aborted"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            if result is not None:
+                latency = time.perf_counter() - start
+                controller.release(latency, result)
+                if self.router is not None:
+                    self.router.record(name, latency, result)
+                if self.hedge is not None:
+                    self.hedge.record(name, latency)
+            else:
+                controller.discard()
+            async with condition:
+                condition.notify()
+        return attempt, success, message, result
+
+    def _handle_result(self, course, name, attempt, success, message, result, on_result):
+        """记录一个请求的结果并更新课程状态；课程选上或放弃时取消它的其他协程"""
+        self.stats["completed"] += 1
+        if success:
+            self.stats["succeeded"] += 1
+        self.retry_tracker.record((course["real_teach_id"], name), result)
+        changed = outcome.apply(course, result, message)
+        if changed:
+            self._cancel_course(course)
+        if on_result is not None:
+            on_result(attempt, name, course, success, message, result, changed)
+
+    async def _acquire_for(self, course, name, should_continue):
+        """等待该系统的并发名额；停止、或等待期间这门课已经选上或放弃时返回 False"""
+        task = asyncio.current_task()
+        controller, condition = self._pacing[name], self._conditions[name]
+        self._states[task] = "waiting"
+        if not await self._acquire(name, controller, condition, should_continue):
+            return False
+        self._states.pop(task, None)
+        # 等待名额期间其他请求可能已经选上或放弃了这门课
+        if not outcome.is_pending(course) or not should_continue():
+            controller.discard()
+            async with condition:
+                condition.notify()
+            return False
+        return True
+
+    async def _loop_pair(self, course, name, should_continue, on_submit, on_result):
+        """_worker 的主循环"""
+        enroller = self._enrollers[name]
+        while should_continue() and outcome.is_pending(course):
+            # 正在后台重新登录的系统等待其完成，课程照常提交到其他系统
+            if not enroller.is_logged_in or not enroller.session_ready:
+                await asyncio.sleep(0.5)
+                continue
+            if not await self._acquire_for(course, name, should_continue):
+                break
+            attempt, success, message, result = await self._select(course, name, on_submit)
+            self._handle_result(course, name, attempt, success, message, result, on_result)
+            if outcome.is_pending(course) and should_continue():
+                await asyncio.sleep(self._next_delay(course, name))
+
+    async def _loop_course(self, course, first, should_continue, on_submit, on_result):
+        """对冲模式下 _worker 的主循环；first 为首轮主请求发往的系统"""
+        while should_continue() and outcome.is_pending(course):
+            name = first if first is not None and self._available(first) else self._pick_backend()
+            first = None
+            if name is None:
+                await asyncio.sleep(0.5)
+                continue
+            if not await self._acquire_for(course, name, should_continue):
+                break
+            race = Race(self.hedge, course, name)
+            # 请求协程 -> 系统名
+            send = asyncio.create_task(self._select(course, name, on_submit))
+            sends = {send: name}
+            race.add(send)
+            decided = None
+            try:
+                done, _ = await asyncio.wait(sends, timeout=self.hedge.delay(name))
+                if not done:
+                    self._fire_hedge(race, sends, on_submit)
+                pending = set(sends)
+                while pending and decided is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for send in done:
+                        if send not in sends:
+                            continue  # 同时返回、已经作为抽样交给 _watch_probe 的主请求
+                        sent_name = sends.pop(send)
+                        step = self._finish_send(race, send, sent_name, on_result)
+                        if step.decides:
+                            decided = sent_name
+                        for loser in step.losers:
+                            loser.cancel()
+                        if step.probe is not None:
+                            self._watch_probe(race, step.probe, sends.pop(step.probe), on_result)
+            finally:
+                for send in sends:
+                    send.cancel()
+                await asyncio.gather(*sends, return_exceptions=True)
+            if decided is None:
+                continue
+            if outcome.is_pending(course) and should_continue():
+                await asyncio.sleep(self._next_delay(course, decided))
+
+    def _finish_send(self, race, send, name, on_result):
+        """对冲中的一个请求结束：交给 race 记账（见 hedge.Race.finish），需要时处理结果"""
+        if send.cancelled() or send.exception() is not None:
+            return race.finish(send, None)
+        attempt, success, message, result = send.result()
+        step = race.finish(send, result)
+        if step.report:
+            self._handle_result(race.course, name, attempt, success, message, result, on_result)
+        return step
+
+    def _watch_probe(self, race, send, name, on_result):
+        """对冲胜出后没有中止的主请求：返回时由 race 记录它比对冲请求晚了多久，结果不再处理"""
+        self._probes.add(send)
+
+        def done(task):
+            self._probes.discard(task)
+            self._finish_send(race, task, name, on_result)
+
+        send.add_done_callback(done)
+
+    def _fire_hedge(self, race, sends, on_submit):
+        """主请求到了对冲时间仍未返回：向另一个系统（没有时向同一系统）发出对冲请求；没有名额或超过比例上限时放弃"""
+        name = race.hedge_target(self._pick_backend, lambda name: self._try_acquire(name, self._pacing[name]),
+                                 lambda name: self._pacing[name].discard())
+        if name is None:
+            return
+        send = asyncio.create_task(self._select(race.course, name, on_submit))
+        sends[send] = name
+        race.add(send, is_hedge=True)
+
+    async def run(self, courses, interval, should_continue=lambda: True, on_submit=None, on_result=None, start_at=None):
+        """
+        运行抢课，直到所有课程选上或放弃，或 should_continue() 返回 False；返回前等待已发出的请求结束
+
+        参数:
+            courses: 课程字典列表（含 real_teach_id、need_book、selected），选上后原地置 selected=True，
+                放弃时原地写入 dropped
+            interval: 同一 (课程, 系统) 两次请求之间的间隔（秒），没有传入 pacing 时使用
+            should_continue: 返回 False 时停止提交新请求
+            on_submit: on_submit(attempt, name, course)，每个请求发出时调用
+            on_result: on_result(attempt, name, course, success, message, result, changed)，每个请求完成时调用；
+                result 为 outcome.SelectOutcome，changed 表示课程状态（选上或放弃）是否改变
+            start_at: {系统名: time.monotonic() 时刻}，该系统的首轮请求在此时刻发出（定时开抢），默认立即发出
+
+        返回:
+            dict: 提交数、完成数、成功数、最大同时挂起数，以及取消的排队请求数与中止的请求数
+        """
+        self._pacing = self.pacing or {name: PacingController(self.max_in_flight, interval, adaptive=False)
+                                       for name, _ in self.backends}
+        self._enrollers = dict(self.backends)
+        for _, enroller in self.backends:
+            await enroller.open()
+        self._conditions = {name: asyncio.Condition() for name, _ in self.backends}
+        self._loop = asyncio.get_running_loop()
+        try:
+            names = [name for name, _ in self.backends]
+            pending = [course for course in courses if outcome.is_pending(course)]
+            for index, course in enumerate(pending):
+                # 对冲模式下每门课一个协程，首轮主请求轮流分给各系统
+                for name in (names[index % len(names)],) if self.hedge is not None else names:
+                    for _ in range(self.per_pair):
+                        worker = self._worker(course, name, should_continue, on_submit, on_result, (start_at or {}).get(name))
+                        self._tasks.setdefault(course["real_teach_id"], []).append(asyncio.create_task(worker))
+            if self._stopped:
+                self._cancel_all()
+            await asyncio.gather(*(task for tasks in self._tasks.values() for task in tasks), return_exceptions=True)
+            # 抢课已结束，还没返回的抽样主请求不再等待
+            probes = list(self._probes)
+            for probe in probes:
+                probe.cancel()
+            await asyncio.gather(*probes, return_exceptions=True)
+            return dict(self.stats)
+        finally:
+            # run 返回（或被取消）后事件循环可能随即关闭，之后的 stop() 不再向它投递回调
+            self._loop = None
@@ -0,0 +1,210 @@
+# utils/backends.py
+"""
+教务系统后端注册表，以及按健康状况分配抢课请求。
+
+config.json 的 "backends" 可以列出任意多个教务入口（不同主机或镜像），缺省为两个官方入口：
+    [{"name": "URL1", "base": "jwc.swjtu.edu.cn"}, {"name": "URL2", "base": "jiaowu.swjtu.edu.cn/TMS"}]
+每个后端记录自己的健康状态：选课请求延迟与错误率的指数滑动平均（EWMA），以及会话状态。
+路由按 (1 - 错误率) / 延迟 给后端打分，分数最高的后端权重为 1，其余按分数比例（不低于 MIN_WEIGHT）。抢课调度器：
+    - 把同时进行的请求数（线程数 / 并发数）按权重比例分给各后端，慢的后端不会占满所有线程；
+    - 把同一 (课程, 后端) 两次请求之间的间隔除以权重。
+回应最快的后端分到最多的请求，慢的、出错多的后端仍保留少量请求，恢复后权重随之回升。
+会话失效、正在重新登录的后端权重为 0。
+"""
+import math
+import threading
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.pacing import CONGESTION_OUTCOMES
+
+DEFAULT_BACKENDS = (
+    {"name": "URL1", "base": "jwc.swjtu.edu.cn"},
+    {"name": "URL2", "base": "jiaowu.swjtu.edu.cn/TMS"},
+)
+# 新样本在滑动平均中的权重
+EWMA_ALPHA = 0.2
+# 已登录后端的最低权重，保证慢的后端仍有少量请求用来发现它恢复
+MIN_WEIGHT = 0.1
+# 延迟的下限（秒），避免个别极快的响应让分数失真
+MIN_LATENCY = 0.01
+
+
+class BackendHealth:
+    """单个后端的健康状态（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = None         # 延迟 EWMA（秒），还没有样本时为 None
+        self.error_rate = 0.0       # 错误率 EWMA（服务器繁忙 / 超时 / 无法识别）
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, latency, result):
+        """
+        记录一次选课请求
+
+        参数:
+            latency: 耗时（秒）
+            result: outcome.SelectOutcome
+        """
+        error = result.outcome in CONGESTION_OUTCOMES
+        with self._lock:
+            self.requests += 1
+            self.errors += error
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += (latency - self.latency) * EWMA_ALPHA
+            self.error_rate += (error - self.error_rate) * EWMA_ALPHA
+
+    def score(self):
+        """(1 - 错误率) / 延迟；还没有样本时返回 None"""
+        with self._lock:
+            if self.latency is None:
+                return None
+            return (1.0 - self.error_rate) / max(self.latency, MIN_LATENCY)
+
+    def snapshot(self):
+        with self._lock:
+            return {"latency_ms": self.latency * 1000 if self.latency is not None else None,
+                    "error_rate": self.error_rate, "requests": self.requests, "errors": self.errors}
+
+
+class Backend:
+    """
+    一个教务入口
+
+    参数:
+        name: 显示名称（日志与状态栏中使用）
+        base: 主机（可带路径），如 jwc.swjtu.edu.cn 或 jiaowu.swjtu.edu.cn/TMS
+    """
+
+    def __init__(self, name, base):
+        self.name = name
+        self.base = base
+        self.enroller = None
+        self.health = BackendHealth()
+
+    def replace_enroller(self, enroller):
+        """
+        换上新的 Enroller，并关闭被替换的 Enroller 的连接池与保活线程
+
+        返回:
+            被替换的 Enroller，原来没有时为 None
+        """
+        old, self.enroller = self.enroller, enroller
+        if old is not None and old is not enroller:
+            old.close()
+        return old
+
+    @property
+    def logged_in(self):
+        return self.enroller is not None and self.enroller.is_logged_in
+
+    @property
+    def session_status(self):
+        """未登录 / 重新登录中 / 已登录"""
+        if not self.logged_in:
+            return "未登录"
+        return "重新登录中" if self.enroller.relogging else "已登录"
+
+
+class BackendRegistry:
+    """
+    按配置顺序排列的后端集合，同时作为抢课调度器的路由（budget / weight / record）
+
+    参数:
+        specs: [{"name": 名称, "base": 主机}, ...]，name 缺省为 URL1、URL2…
+    """
+
+    def __init__(self, specs=DEFAULT_BACKENDS):
+        self._backends = {}
+        for index, spec in enumerate(specs, 1):
+            base = spec.get("base", "").strip()
+            if not base:
+                raise ValueError(f"第 {index} 个后端缺少 base")
+            name = spec.get("name") or f"URL{index}"
+            if name in self._backends:
+                raise ValueError(f"后端名称重复: {name}")
+            self._backends[name] = Backend(name, base)
+        if not self._backends:
+            raise ValueError("至少需要一个后端")
+
+    @classmethod
+    def from_config(cls, config):
+        """从 config["backends"] 创建，没有配置时使用 DEFAULT_BACKENDS"""
+        return cls(config.get("backends") or DEFAULT_BACKENDS)
+
+    def __iter__(self):
+        return iter(list(self._backends.values()))
+
+    def __len__(self):
+        return len(self._backends)
+
+    def get(self, name):
+        return self._backends[name]
+
+    def bases(self):
+        return [backend.base for backend in self]
+
+    def logged_in(self):
+        """已登录的后端 [(名称, Enroller), ...]，按配置顺序"""
+        return [(backend.name, backend.enroller) for backend in self if backend.logged_in]
+
+    def best_enroller(self):
+        """权重最高的已登录后端的 Enroller（查询课程等单次请求使用），都未登录时返回 None"""
+        candidates = [backend for backend in self if backend.logged_in]
+        if not candidates:
+            return None
+        weights = self.weights()
+        return max(candidates, key=lambda backend: weights[backend.name]).enroller
+
+    def weights(self):
+        """
+        各后端的请求权重
+
+        返回:
+            dict: {名称: 权重}；分数最高的已登录后端为 1，未登录或正在重新登录的为 0，
+                还没有样本的后端按 1 计（先让它参与，积累样本）
+        """
+        scores = {backend.name: backend.health.score() for backend in self}
+        best = max((score for score in scores.values() if score), default=None)
+        weights = {}
+        for backend in self:
+            score = scores[backend.name]
+            if not backend.logged_in or backend.enroller.relogging:
+                weights[backend.name] = 0.0
+            elif score is None or not best:
+                weights[backend.name] = 1.0
+            else:
+                weights[backend.name] = max(MIN_WEIGHT, score / best)
+        return weights
+
+    def weight(self, name):
+        return self.weights()[name]
+
+    def budget(self, name, total):
+        """
+        按权重比例分给该后端的同时进行请求数
+
+        参数:
+            total: 全部后端共用的并发数（线程数）
+
+        返回:
+            int: 至少为 1（权重为 0 时也保留一个，会话恢复后立即可用）
+        """
+        weights = self.weights()
+        weight_sum = sum(weights.values())
+        if weight_sum <= 0:
+            return max(1, total)
+        return max(1, math.ceil(total * weights[name] / weight_sum))
+
+    def record(self, name, latency, result):
+        """记录一次选课请求的耗时与结果（抢课调度器调用）"""
+        self.get(name).health.record(latency, result)
+
+    def status_text(self):
+        """状态栏文字，如 "✓ URL1 | ✗ URL2" """
+        return " | ".join(f"{'✓' if backend.logged_in else '✗'} {backend.name}" for backend in self)
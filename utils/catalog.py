@@ -0,0 +1,339 @@
+# utils/catalog.py
+"""
+本地课程目录：抓取 courseType=all 的全部课程分页，存入 SQLite 并建立索引，离线查询课程。
+
+CatalogCrawler 先取第 1 页得到总记录数，再以有限的并发抓取其余页，每页返回后立即解析入库。
+服务器没有提供变更通知，也不支持条件请求，所以增量刷新的做法是：
+    - 最近 max_age 秒内抓取过的页不再请求；
+    - 重新抓取的页按内容摘要比较，没有变化的页只更新抓取时间，不改动课程数据。
+目录按 学期+主机 区分，与 utils/teach_ids.py 的缓存一致。
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html import unescape
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import storage
+from utils import jwc
+from utils.teach_ids import current_term, cache_key
+
+CATALOG_FILE = storage.cache_path("catalog.sqlite3")
+# 增量刷新时，该时间（秒）内抓取过的页不再请求
+CATALOG_REFRESH_AGE = 10 * 60
+# 抓取分页的最大并发数（不超过 Enroller 的连接池大小）
+CRAWL_CONCURRENCY = 8
+
+ROW_PATTERN = re.compile(r'<tr\b[^>]*>(.*?)</tr>', re.S | re.I)
+CELL_PATTERN = re.compile(r'<t[dh]\b[^>]*>(.*?)</t[dh]>', re.S | re.I)
+TEACH_ID_SPAN_PATTERN = re.compile(r'<span\b[^>]*\bid\s*=\s*["\']?teachIdChoose([^"\'\s>]+)[^>]*>(.*?)</span>', re.S | re.I)
+TOTAL_PATTERN = re.compile(r'共有记录\[(\d+)\]条')
+SPACE_PATTERN = re.compile(r'\s+')
+
+# 表头关键字 -> 字段，按表头定位各列，表格列顺序变化时仍能解析
+COLUMN_KEYWORDS = {
+    "name": ("课程名称", "课程名"),
+    "teacher": ("任课教师", "教师", "老师"),
+    "time_slot": ("上课时间", "时间", "节次"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    catalog TEXT NOT NULL,
+    teach_id TEXT NOT NULL,
+    real_teach_id TEXT,
+    name TEXT,
+    teacher TEXT,
+    time_slot TEXT,
+    page INTEGER,
+    cells TEXT,
+    updated_at REAL,
+    PRIMARY KEY (catalog, teach_id)
+);
+CREATE INDEX IF NOT EXISTS idx_courses_name ON courses (catalog, name);
+CREATE INDEX IF NOT EXISTS idx_courses_teacher ON courses (catalog, teacher);
+CREATE INDEX IF NOT EXISTS idx_courses_time_slot ON courses (catalog, time_slot);
+CREATE INDEX IF NOT EXISTS idx_courses_page ON courses (catalog, page);
+CREATE TABLE IF NOT EXISTS pages (
+    catalog TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    digest TEXT,
+    row_count INTEGER,
+    fetched_at REAL,
+    PRIMARY KEY (catalog, page)
+);
+CREATE TABLE IF NOT EXISTS catalogs (
+    catalog TEXT PRIMARY KEY,
+    total INTEGER,
+    page_count INTEGER,
+    crawled_at REAL
+);
+"""
+
+COURSE_FIELDS = ("teach_id", "real_teach_id", "name", "teacher", "time_slot", "page")
+
+
+def _text(fragment):
+    return SPACE_PATTERN.sub(' ', unescape(jwc.TAG_PATTERN.sub(' ', fragment))).strip()
+
+
+def parse_catalog_page(html):
+    """
+    解析一页课程列表
+
+    参数:
+        html: 查询结果页
+
+    返回:
+        tuple: (总记录数或 None, 课程字典列表)；课程字典含 teach_id、real_teach_id、name、teacher、time_slot、cells
+    """
+    total_match = TOTAL_PATTERN.search(html)
+    total = int(total_match.group(1)) if total_match else None
+    columns = {}
+    courses = []
+    for row_match in ROW_PATTERN.finditer(html):
+        row = row_match.group(1)
+        span = TEACH_ID_SPAN_PATTERN.search(row)
+        cells = [_text(cell) for cell in CELL_PATTERN.findall(row)]
+        if span is None:
+            # 表头行：记录各字段所在的列
+            if not columns and any("选课编号" in cell for cell in cells):
+                for field, keywords in COLUMN_KEYWORDS.items():
+                    for index, cell in enumerate(cells):
+                        if any(keyword in cell for keyword in keywords):
+                            columns[field] = index
+                            break
+            continue
+        course = {"teach_id": span.group(1), "real_teach_id": _text(span.group(2)) or None, "cells": cells}
+        for field in COLUMN_KEYWORDS:
+            index = columns.get(field)
+            course[field] = cells[index] if index is not None and index < len(cells) else None
+        courses.append(course)
+    return total, courses
+
+
+def page_digest(courses):
+    """
+    一页课程的摘要：只取课程的固定字段（选课编号、真实ID、名称、教师、上课时间），
+    余量、时间戳等每次请求都会变化的内容不影响摘要，增量刷新时没有变化的页不重写
+    """
+    rows = [[c["teach_id"], c["real_teach_id"], c["name"], c["teacher"], c["time_slot"]] for c in courses]
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class CourseCatalog:
+    """
+    SQLite 课程目录
+
+    参数:
+        path: 数据库文件路径，":memory:" 表示只保存在内存中
+    """
+
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def page_states(self, catalog):
+        """返回 {页码: (内容摘要, 抓取时间)}"""
+        with self._lock:
+            rows = self._db.execute("SELECT page, digest, fetched_at FROM pages WHERE catalog = ?", (catalog,)).fetchall()
+        return {row["page"]: (row["digest"], row["fetched_at"]) for row in rows}
+
+    def store_page(self, catalog, page, courses):
+        """
+        保存一页的课程
+
+        返回:
+            bool: 该页课程是否有变化（没有变化时只更新抓取时间）
+        """
+        digest = page_digest(courses)
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT digest FROM pages WHERE catalog = ? AND page = ?", (catalog, page)).fetchone()
+            changed = row is None or row["digest"] != digest
+            if changed:
+                self._db.execute("DELETE FROM courses WHERE catalog = ? AND page = ?", (catalog, page))
+                # 课程可能从其他页移到这一页，以新数据为准
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO courses (catalog, teach_id, real_teach_id, name, teacher, time_slot, page, cells, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(catalog, c["teach_id"], c["real_teach_id"], c["name"], c["teacher"], c["time_slot"], page,
+                      json.dumps(c["cells"], ensure_ascii=False), now) for c in courses])
+            self._db.execute("INSERT OR REPLACE INTO pages (catalog, page, digest, row_count, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                             (catalog, page, digest, len(courses), now))
+        return changed
+
+    def finish_crawl(self, catalog, total, page_count):
+        """记录总记录数与页数，删除超出页数的旧页"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM courses WHERE catalog = ? AND page > ?", (catalog, page_count))
+            self._db.execute("DELETE FROM pages WHERE catalog = ? AND page > ?", (catalog, page_count))
+            self._db.execute("INSERT OR REPLACE INTO catalogs (catalog, total, page_count, crawled_at) VALUES (?, ?, ?, ?)",
+                             (catalog, total, page_count, time.time()))
+
+    def info(self, catalog):
+        """返回 {"total", "page_count", "crawled_at", "courses"}，没有抓取过时返回 None"""
+        with self._lock:
+            row = self._db.execute("SELECT total, page_count, crawled_at FROM catalogs WHERE catalog = ?", (catalog,)).fetchone()
+            count = self._db.execute("SELECT COUNT(*) FROM courses WHERE catalog = ?", (catalog,)).fetchone()[0]
+        if row is None:
+            return None
+        return {"total": row["total"], "page_count": row["page_count"], "crawled_at": row["crawled_at"], "courses": count}
+
+    def lookup(self, catalog, teach_id):
+        """按选课编号精确查找，返回课程字典或 None"""
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(COURSE_FIELDS)} FROM courses WHERE catalog = ? AND teach_id = ?",
+                                   (catalog, teach_id)).fetchone()
+        return dict(row) if row else None
+
+    def search(self, catalog, keyword, limit=50):
+        """
+        按选课编号、课程名称、教师或上课时间搜索
+
+        选课编号完全匹配走主键；其余按子串匹配（一个学期几千门课，扫描一遍也只需约一毫秒）。
+
+        返回:
+            list: 课程字典列表，编号完全匹配的排在最前
+        """
+        keyword = keyword.strip()
+        if not keyword:
+            return []
+        pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(COURSE_FIELDS)} FROM courses WHERE catalog = ? AND "
+                "(teach_id = ? OR name LIKE ? ESCAPE '\\' OR teacher LIKE ? ESCAPE '\\' OR time_slot LIKE ? ESCAPE '\\' "
+                "OR teach_id LIKE ? ESCAPE '\\') "
+                "ORDER BY teach_id = ? DESC, teach_id LIMIT ?",
+                (catalog, keyword, pattern, pattern, pattern, pattern, keyword, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+
+_course_catalog = None
+_course_catalog_lock = threading.Lock()
+
+
+def get_course_catalog():
+    """返回进程内共享的 CourseCatalog"""
+    global _course_catalog
+    with _course_catalog_lock:
+        if _course_catalog is None:
+            _course_catalog = CourseCatalog()
+        return _course_catalog
+
+
+def catalog_key(enroller, term=None):
+    """目录的键：学期@主机"""
+    return cache_key(term or current_term(), enroller.base)
+
+
+class CatalogCrawler:
+    """
+    抓取全部课程分页并写入 CourseCatalog
+
+    参数:
+        enroller: 已登录的 Enroller（共用其会话与连接池）
+        catalog: CourseCatalog，默认使用进程内共享的目录
+        term: 学期，默认按日期推断
+        concurrency: 最大并发请求数
+        on_progress: on_progress(已完成页数, 总页数)，每页入库后调用
+    """
+
+    def __init__(self, enroller, catalog=None, term=None, concurrency=CRAWL_CONCURRENCY, on_progress=None):
+        self.enroller = enroller
+        self.catalog = catalog or get_course_catalog()
+        self.key = catalog_key(enroller, term)
+        self.concurrency = concurrency
+        self.on_progress = on_progress
+
+    def fetch_page(self, page):
+        """请求第 page 页，返回页面 HTML；会话失效时触发后台重新登录并抛出 RuntimeError"""
+        response = self.enroller.session.post(self.enroller.course_url, data=jwc.build_catalog_payload(page),
+                                              headers={'Referer': self.enroller.course_url}, timeout=30)
+        response.raise_for_status()
+        if jwc.is_login_required(response):
+            self.enroller.handle_session_lost()
+            raise RuntimeError(jwc.SESSION_EXPIRED_MESSAGE)
+        return response.text
+
+    def crawl(self, max_age=0):
+        """
+        抓取目录；max_age 秒内抓取过的页跳过（0 表示全部重新抓取）
+
+        返回:
+            dict: 总页数、请求页数、变化页数、跳过页数、课程数与耗时
+        """
+        start = time.perf_counter()
+        stats = {"pages": 0, "fetched": 0, "changed": 0, "skipped": 0, "courses": 0, "elapsed": 0.0}
+        # 第 1 页总要请求：从中得到总记录数与每页行数
+        html = self.fetch_page(1)
+        total, courses = parse_catalog_page(html)
+        # 无法解析的页（错误页、提示页）不能入库，否则会清空本地目录；只有总记录数为 0 时才清空
+        if total is None or (total and not courses):
+            raise RuntimeError("课程目录第 1 页无法解析，本地目录保持不变")
+        stats["fetched"] += 1
+        stats["changed"] += self.catalog.store_page(self.key, 1, courses)
+        page_count = -(-total // len(courses)) if courses else 1
+        stats["pages"] = page_count
+        if self.on_progress is not None:
+            self.on_progress(1, page_count)
+
+        now = time.time()
+        states = self.catalog.page_states(self.key)
+        pages = []
+        for page in range(2, page_count + 1):
+            fetched_at = states.get(page, (None, 0))[1]
+            if max_age and now - fetched_at < max_age:
+                stats["skipped"] += 1
+            else:
+                pages.append(page)
+
+        done = 1 + stats["skipped"]
+        if pages:
+            concurrency = max(1, min(self.concurrency, self.enroller.connections.pool_size, len(pages)))
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = {executor.submit(self.fetch_page, page): page for page in pages}
+                try:
+                    # 每页返回后立即解析入库，不等其他页
+                    for future in as_completed(futures):
+                        page = futures[future]
+                        html = future.result()
+                        page_courses = parse_catalog_page(html)[1]
+                        if not page_courses:
+                            raise RuntimeError(f"课程目录第 {page} 页无法解析，本地目录中该页保持不变")
+                        stats["fetched"] += 1
+                        stats["changed"] += self.catalog.store_page(self.key, page, page_courses)
+                        done += 1
+                        if self.on_progress is not None:
+                            self.on_progress(done, page_count)
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        self.catalog.finish_crawl(self.key, total, page_count)
+        stats["courses"] = self.catalog.info(self.key)["courses"]
+        stats["elapsed"] = time.perf_counter() - start
+        return stats
+
+    def refresh(self, max_age=CATALOG_REFRESH_AGE):
+        """增量刷新：只请求超过 max_age 秒没有抓取的页，内容没有变化的页不改动数据"""
+        return self.crawl(max_age=max_age)
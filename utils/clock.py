@@ -0,0 +1,259 @@
+# utils/clock.py
+"""
+教务服务器时钟同步与定时开抢。
+
+开放选课的时刻以服务器时间为准，本机时钟可能差几秒。这里从轻量请求（HEAD 登录页）响应的 Date 头估计偏差：
+Date 只精确到秒，服务器在本机时间 t0（发出）到 t1（收到）之间生成了 Date = D，所以
+    偏差 offset = 服务器时间 - 本机时间 ∈ (D - t1, D + 1 - t0)
+多次探测的区间取交集。第一次之后的探测都对准当前估计下服务器跨秒的时刻发出：跨秒落在 [t0, t1] 中，
+Date 是否已经进位就说明真实偏差在区间的哪一半，每次探测大约把区间减半，直到与往返时间相当。
+
+TimedStart 在开放前 prepare_lead 秒开始准备（登录、确认课程 ID、预建连接），之后在 resync_at 指定的时刻重新测量，
+按 本机发出时刻 = 开放时刻 - 偏差 + 余量 计算各系统首轮请求的发出时刻。余量默认取偏差的误差上限，
+单程时间按 0 计：早到的请求只会得到“尚未开始”，还要再等一个重试间隔，所以宁可晚到几毫秒也不早到。
+首轮请求发出后统计预计到达服务器的时间（按半个往返时间估计单程）与开放时刻的差距。
+"""
+import statistics
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+# 每次测量的探测次数
+SAMPLES = 8
+PROBE_TIMEOUT = 5
+# 开放前多少秒开始准备（登录、确认课程 ID、预建连接）
+PREPARE_LEAD = 60
+# 准备完成后，在开放前这些秒数重新测量偏差；最后一次的结果决定首轮请求的发出时刻
+# （每次测量要等几次服务器跨秒，最多约 samples 秒）
+RESYNC_AT = (30, 15)
+# 开放时间按北京时间解释
+SERVER_TZ = timezone(timedelta(hours=8))
+OPEN_TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%H:%M:%S", "%H:%M")
+
+# offset: 服务器时间 - 本机时间（秒）；error: 偏差的误差上限（秒）；rtt: 最小往返时间（秒）；samples: 有效探测数
+ClockEstimate = namedtuple("ClockEstimate", ["offset", "error", "rtt", "samples"])
+
+
+def parse_date_header(value):
+    """HTTP Date 头 -> Unix 时间戳；缺失或无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_open_time(text, now=None):
+    """
+    解析开放选课时间（北京时间）
+
+    参数:
+        text: "YYYY-MM-DD HH:MM[:SS]"，或只写 "HH:MM[:SS]" 表示今天
+        now: 当前 Unix 时间戳，默认 time.time()
+
+    返回:
+        float: Unix 时间戳；格式不对时抛出 ValueError
+    """
+    text = text.strip()
+    today = datetime.fromtimestamp(now if now is not None else time.time(), SERVER_TZ)
+    for fmt in OPEN_TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if not fmt.startswith("%Y"):
+            parsed = parsed.replace(year=today.year, month=today.month, day=today.day)
+        return parsed.replace(tzinfo=SERVER_TZ).timestamp()
+    raise ValueError(f"无法识别的时间: {text}，应为 YYYY-MM-DD HH:MM:SS 或 HH:MM:SS")
+
+
+def format_open_time(timestamp):
+    return datetime.fromtimestamp(timestamp, SERVER_TZ).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def estimate_offset(probe, samples=SAMPLES, clock=time.time, sleep=time.sleep):
+    """
+    用多次探测的 Date 头估计服务器与本机的时钟偏差
+
+    参数:
+        probe: probe() -> Date 头的值，失败时返回 None 或抛出异常
+        samples: 探测次数
+        clock: 本机时钟（返回 Unix 时间戳）
+
+    返回:
+        ClockEstimate；全部探测失败时返回 None
+    """
+    low, high = float("-inf"), float("inf")
+    midpoints, rtts = [], []
+    for _ in range(samples):
+        if rtts:
+            # 让请求在估计的服务器跨秒时刻到达服务器
+            guess = (low + high) / 2 if low <= high else statistics.median(midpoints)
+            now = clock()
+            boundary = int(now + guess + min(rtts) / 2) + 1
+            sleep(max(0.0, boundary - guess - min(rtts) / 2 - now))
+        t0 = clock()
+        try:
+            value = probe()
+        except Exception as e:
+            print(f"时钟探测失败: {e}")
+            continue
+        t1 = clock()
+        date = parse_date_header(value)
+        if date is None:
+            continue
+        low = max(low, date - t1)
+        high = min(high, date + 1 - t0)
+        midpoints.append(date + 0.5 - (t0 + t1) / 2)
+        rtts.append(t1 - t0)
+    if not rtts:
+        return None
+    if low <= high:
+        return ClockEstimate((low + high) / 2, (high - low) / 2, min(rtts), len(rtts))
+    # 区间不相交（负载均衡后的多台服务器时钟不一致等）：退回到各次中点的中位数
+    return ClockEstimate(statistics.median(midpoints), 0.5 + min(rtts) / 2, min(rtts), len(rtts))
+
+
+def measure_clock(enroller, samples=SAMPLES):
+    """用 HEAD 登录页估计 enroller 所在服务器的时钟偏差，返回 ClockEstimate 或 None"""
+    def probe():
+        response = enroller.session.head(enroller.login_page_url, timeout=PROBE_TIMEOUT, allow_redirects=False)
+        return response.headers.get("Date")
+
+    return estimate_offset(probe, samples)
+
+
+class TimedStart:
+    """
+    定时开抢
+
+    参数:
+        open_at: 开放选课的服务器时间（Unix 时间戳）
+        prepare_lead: 开放前多少秒开始准备
+        resync_at: 准备完成后，开放前这些秒数重新测量时钟偏差
+        margin: 首轮请求预计到达时间比开放时刻推迟的秒数；None 表示取偏差的误差上限，保证不会早到
+        on_event: on_event(消息)，测量结果与进度
+    """
+
+    def __init__(self, open_at, prepare_lead=PREPARE_LEAD, resync_at=RESYNC_AT, margin=None, on_event=print):
+        self.open_at = open_at
+        self.prepare_lead = prepare_lead
+        self.resync_at = sorted(resync_at, reverse=True)
+        self.margin = margin
+        self.on_event = on_event
+        # 名称 -> ClockEstimate（最近一次测量）
+        self.estimates = {}
+        # 名称 -> 首轮请求的发出时刻（time.monotonic）
+        self.fire_at = {}
+        self._arrivals = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def server_now(self):
+        """按已测得的偏差（各系统的中位数）估计当前服务器时间"""
+        offsets = [estimate.offset for estimate in self.estimates.values()]
+        return time.time() + (statistics.median(offsets) if offsets else 0.0)
+
+    def _wait_until(self, seconds_before):
+        """等到服务器时间距开放只剩 seconds_before 秒；被停止时返回 False"""
+        while True:
+            remaining = self.open_at - seconds_before - self.server_now()
+            if remaining <= 0:
+                return not self.stopped
+            if self._stop.wait(min(remaining, 1.0)):
+                return False
+
+    def sync(self, backends, samples=SAMPLES):
+        """并行测量各系统的时钟偏差并记录"""
+        backends = list(backends)
+        with ThreadPoolExecutor(max_workers=len(backends) or 1) as executor:
+            results = list(executor.map(lambda item: measure_clock(item[1], samples), backends))
+        for (name, _), estimate in zip(backends, results):
+            if estimate is None:
+                self.on_event(f"{name} 时钟测量失败，沿用上次的结果" if name in self.estimates else
+                              f"{name} 时钟测量失败，按本机时间计算")
+                continue
+            self.estimates[name] = estimate
+            self.on_event(f"{name} 时钟偏差 {estimate.offset:+.3f} 秒（±{estimate.error * 1000:.0f} ms），"
+                          f"往返 {estimate.rtt * 1000:.0f} ms，有效探测 {estimate.samples} 次")
+
+    def _fire_time(self, name):
+        """该系统首轮请求的发出时刻（time.monotonic）"""
+        estimate = self.estimates.get(name, ClockEstimate(0.0, 0.0, 0.0, 0))
+        margin = estimate.error if self.margin is None else self.margin
+        send_wall = self.open_at - estimate.offset + margin
+        return time.monotonic() + max(0.0, send_wall - time.time())
+
+    def run(self, prepare, get_backends):
+        """
+        等待并完成准备与时钟同步（阻塞，在后台线程中调用）
+
+        参数:
+            prepare: prepare()，开放前 prepare_lead 秒调用（登录、确认课程 ID、预建连接）
+            get_backends: get_backends() -> [(名称, Enroller), ...]，准备完成后可用的系统
+
+        返回:
+            dict: {名称: 首轮请求的发出时刻（time.monotonic）}；被停止或没有可用系统时返回 None
+        """
+        self.on_event(f"定时开抢: {format_open_time(self.open_at)}，提前 {self.prepare_lead} 秒开始准备")
+        if not self._wait_until(self.prepare_lead):
+            return None
+        prepare()
+        backends = get_backends()
+        if not backends or self.stopped:
+            return None
+        self.sync(backends)
+        for lead in self.resync_at:
+            if lead >= self.prepare_lead:
+                continue
+            if not self._wait_until(lead):
+                return None
+            self.sync(backends)
+        self.fire_at = {name: self._fire_time(name) for name, _ in backends}
+        now = time.monotonic()
+        self.on_event("首轮请求发出时间: " + "，".join(f"{name} {max(0.0, at - now):.3f} 秒后"
+                                                   for name, at in self.fire_at.items()))
+        return self.fire_at
+
+    def record_send(self, name, sent_at=None):
+        """
+        记录一个首轮请求的发出时间（Unix 时间戳，默认现在）
+
+        返回:
+            int: 该系统已记录的首轮请求数
+        """
+        estimate = self.estimates.get(name, ClockEstimate(0.0, 0.0, 0.0, 0))
+        sent_at = time.time() if sent_at is None else sent_at
+        # 按偏差与单程时间估计的到达时间减去开放时刻（秒，正数表示晚到）
+        delta = sent_at + estimate.offset + estimate.rtt / 2 - self.open_at
+        with self._lock:
+            arrivals = self._arrivals.setdefault(name, [])
+            arrivals.append(delta)
+            return len(arrivals)
+
+    def report(self):
+        """
+        各系统首轮请求的计时精度
+
+        返回:
+            dict: {名称: {"count", "first_ms", "p50_ms", "last_ms", "offset", "error_ms"}}，毫秒为预计到达时间减开放时刻
+        """
+        with self._lock:
+            arrivals = {name: sorted(values) for name, values in self._arrivals.items()}
+        report = {}
+        for name, values in arrivals.items():
+            estimate = self.estimates.get(name, ClockEstimate(0.0, 0.0, 0.0, 0))
+            report[name] = {"count": len(values), "first_ms": values[0] * 1000, "p50_ms": statistics.median(values) * 1000,
+                            "last_ms": values[-1] * 1000, "offset": estimate.offset, "error_ms": estimate.error * 1000}
+        return report
@@ -0,0 +1,364 @@
+# utils/connection.py
+"""
+Enroller 的连接管理：按抢课并发数设置连接池大小、提前建立连接、空闲时保活，并统计连接复用情况。
+
+requests.Session 默认每个主机只保留 10 个连接，抢课线程数超过 10 时，多出的线程会临时新建连接，
+用完即关，每次都要重新握手 TCP+TLS。这里为 Session 挂载一个连接池与并发数一致的 HTTPAdapter：
+    - 连接池满时排队等待空闲连接（pool_block），不再新建一次性连接；
+    - warm_up() 在抢课开始前并行建立连接；
+    - 保活线程在没有请求时定期用 HEAD 请求刷新空闲连接，避免被服务器的 keep-alive 超时关闭；
+    - stats.snapshot() 返回请求数、新建连接数、复用率和等待空闲连接的时间；
+    - CancelScope 让其他线程可以中止本线程正在进行的请求（关闭其使用的 socket）。
+"""
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+from urllib3.poolmanager import PoolManager
+
+# 未指定并发数时的连接池大小（与 requests 默认一致）
+DEFAULT_POOL_SIZE = 10
+# 没有请求超过该时间（秒）后，保活线程开始刷新空闲连接
+KEEPALIVE_INTERVAL = 15
+
+
+class PoolStats:
+    """线程安全的连接池计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0          # 从连接池取连接的次数（每个请求一次）
+            self.reused = 0             # 取到的连接已经建立、无需握手的次数
+            self.new_connections = 0    # 实际建立的 TCP（+TLS）连接数（含预建与保活重连）
+            self.wait_time = 0.0        # 等待空闲连接的总时间（秒）
+            self.max_wait_time = 0.0
+            self.last_checkout = 0.0    # 最近一次取连接的时间（time.monotonic）
+
+    def record_checkout(self, wait, reused):
+        with self._lock:
+            self.checkouts += 1
+            self.reused += reused
+            self.wait_time += wait
+            self.max_wait_time = max(self.max_wait_time, wait)
+            self.last_checkout = time.monotonic()
+
+    def record_connect(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self):
+        """返回统计结果的字典"""
+        with self._lock:
+            checkouts = self.checkouts
+            return {
+                "requests": checkouts,
+                "new_connections": self.new_connections,
+                "reuse_rate": self.reused / checkouts if checkouts else 0.0,
+                "wait_time": self.wait_time,
+                "avg_wait_ms": self.wait_time / checkouts * 1000 if checkouts else 0.0,
+                "max_wait_ms": self.max_wait_time * 1000,
+            }
+
+
+class RequestCancelled(Exception):
+    """请求所在的 CancelScope 已被取消"""
+
+
+_current_scope = threading.local()
+
+
+class CancelScope:
+    """
+    可以从其他线程中止的一组请求
+
+    在 with 块中通过 TrackedHTTPAdapter 发出的请求会登记使用的连接；cancel() 关闭这些连接的 socket，
+    阻塞在读写上的请求立即以连接错误返回，之后再取连接时抛出 RequestCancelled。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conns = set()
+        self.cancelled = False
+
+    def __enter__(self):
+        self._previous = getattr(_current_scope, "scope", None)
+        _current_scope.scope = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_scope.scope = self._previous
+
+    def attach(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise RequestCancelled("请求已取消")
+            self._conns.add(conn)
+        conn.cancel_scope = self
+
+    def detach(self, conn):
+        with self._lock:
+            self._conns.discard(conn)
+        conn.cancel_scope = None
+
+    def cancel(self):
+        """
+        取消：中止正在进行的请求
+
+        返回:
+            bool: 取消时是否有请求正在使用连接
+        """
+        with self._lock:
+            if self.cancelled:
+                return False
+            self.cancelled = True
+            conns = list(self._conns)
+        for conn in conns:
+            sock = getattr(conn, "sock", None)
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # 连接已经关闭
+        return bool(conns)
+
+
+class _TrackedConnectionMixin:
+    """在 connect() 时计数，统计实际建立的连接"""
+    pool_stats = None
+    cancel_scope = None
+
+    def connect(self):
+        super().connect()
+        if self.pool_stats is not None:
+            self.pool_stats.record_connect()
+
+
+class _TrackedHTTPConnection(_TrackedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TrackedHTTPSConnection(_TrackedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TrackedPoolMixin:
+    """记录每次取连接的等待时间，让新建的连接共享同一个 PoolStats，并把连接登记到当前线程的 CancelScope"""
+    pool_stats = None
+
+    def _get_conn(self, timeout=None):
+        start = time.perf_counter()
+        conn = super()._get_conn(timeout)
+        if self.pool_stats is not None:
+            self.pool_stats.record_checkout(time.perf_counter() - start, conn.is_connected)
+        scope = getattr(_current_scope, "scope", None)
+        if scope is not None:
+            try:
+                scope.attach(conn)
+            except RequestCancelled:
+                super()._put_conn(conn)
+                raise
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None and conn.cancel_scope is not None:
+            conn.cancel_scope.detach(conn)
+        super()._put_conn(conn)
+
+    def _get_idle_conn(self):
+        """不等待、不计入统计地取一个连接，连接池已空（全部被占用）时抛出 EmptyPoolError"""
+        return super()._get_conn(timeout=0)
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        conn.pool_stats = self.pool_stats
+        return conn
+
+
+class _TrackedHTTPConnectionPool(_TrackedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _TrackedHTTPConnection
+
+
+class _TrackedHTTPSConnectionPool(_TrackedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _TrackedHTTPSConnection
+
+
+class _TrackedPoolManager(PoolManager):
+    def __init__(self, *args, pool_stats=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_stats = pool_stats
+        self.pool_classes_by_scheme = {"http": _TrackedHTTPConnectionPool, "https": _TrackedHTTPSConnectionPool}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool.pool_stats = self.pool_stats
+        return pool
+
+
+class TrackedHTTPAdapter(HTTPAdapter):
+    """连接池满时排队等待、并统计连接复用情况的 HTTPAdapter"""
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, pool_stats=None):
+        self.pool_stats = pool_stats if pool_stats is not None else PoolStats()
+        super().__init__(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _TrackedPoolManager(num_pools=connections, maxsize=maxsize, block=block,
+                                               pool_stats=self.pool_stats, **pool_kwargs)
+
+
+class ConnectionManager:
+    """
+    管理一个 requests.Session 的连接池
+
+    参数:
+        session: 要管理的 Session，http:// 与 https:// 都会挂载 TrackedHTTPAdapter
+        pool_size: 每个主机的连接数，应与抢课并发数一致
+    """
+
+    def __init__(self, session, pool_size=DEFAULT_POOL_SIZE):
+        self.session = session
+        self.stats = PoolStats()
+        self.pool_size = None
+        self.adapter = None
+        self._lock = threading.Lock()
+        self._keepalive_stop = None
+        self.resize(pool_size)
+
+    def resize(self, pool_size):
+        """调整连接池大小；大小变化时换上新的 adapter（旧连接随之关闭）"""
+        pool_size = max(1, int(pool_size))
+        with self._lock:
+            if pool_size == self.pool_size:
+                return
+            old_adapter = self.adapter
+            self.adapter = TrackedHTTPAdapter(pool_size, self.stats)
+            self.session.mount("http://", self.adapter)
+            self.session.mount("https://", self.adapter)
+            self.pool_size = pool_size
+        if old_adapter is not None:
+            old_adapter.close()
+
+    def _take_idle(self, pool, count):
+        """从连接池取出最多 count 个当前空闲的连接"""
+        conns = []
+        try:
+            for _ in range(count):
+                conns.append(pool._get_idle_conn())
+        except EmptyPoolError:
+            pass  # 其余连接正被请求占用
+        return conns
+
+    def _pool_for(self, url):
+        """返回 Session 请求 url 时会使用的连接池（TLS 参数按 Session.request 的规则合并，确保命中同一个池）"""
+        request = requests.Request("HEAD", url).prepare()
+        settings = self.session.merge_environment_settings(url, {}, None, None, None)
+        return self.adapter.get_connection_with_tls_context(request, settings["verify"], cert=settings["cert"])
+
+    def warm_up(self, url, count=None):
+        """
+        并行建立到 url 所在主机的连接并放回连接池
+
+        参数:
+            url: 目标主机上的任意地址（只用到协议、主机和端口）
+            count: 要建立的连接数，默认等于连接池大小
+
+        返回:
+            int: 实际可用的（新建或已建立的）连接数
+        """
+        pool = self._pool_for(url)
+        conns = self._take_idle(pool, min(count or self.pool_size, self.pool_size))
+
+        def connect(conn):
+            try:
+                if not conn.is_connected:
+                    conn.connect()
+                return True
+            except Exception as e:
+                print(f"预建连接失败: {e}")
+                conn.close()
+                return False
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(len(conns), 16) or 1) as executor:
+                ready = sum(executor.map(connect, conns))
+        finally:
+            for conn in conns:
+                pool._put_conn(conn)
+        return ready
+
+    def refresh_idle(self, url):
+        """
+        对空闲连接逐个发送 HEAD 请求，刷新服务器端的 keep-alive 计时；已断开的连接重新建立
+
+        返回:
+            int: 刷新的连接数
+        """
+        pool = self._pool_for(url)
+        path = urlparse(url).path or "/"
+        conns = self._take_idle(pool, self.pool_size)
+
+        refreshed = 0
+        try:
+            for conn in conns:
+                # 从未建立过的连接不保活，保持与 warm_up 之后相同的连接数即可
+                if not conn.is_connected:
+                    continue
+                try:
+                    conn.request("HEAD", path, headers={"User-Agent": self.session.headers.get("User-Agent", "")})
+                    conn.getresponse().read()
+                    refreshed += 1
+                except Exception:
+                    conn.close()
+                    try:
+                        conn.connect()
+                    except Exception as e:
+                        print(f"保活重连失败: {e}")
+                        conn.close()
+        finally:
+            for conn in conns:
+                pool._put_conn(conn)
+        return refreshed
+
+    def start_keepalive(self, url, interval=KEEPALIVE_INTERVAL):
+        """启动保活线程：超过 interval 秒没有请求时刷新一次空闲连接"""
+        self.stop_keepalive()
+        stop = threading.Event()
+        self._keepalive_stop = stop
+
+        def run():
+            last_refresh = time.monotonic()
+            while not stop.wait(interval / 3):
+                if time.monotonic() - max(self.stats.last_checkout, last_refresh) < interval:
+                    continue
+                try:
+                    self.refresh_idle(url)
+                except Exception as e:
+                    print(f"连接保活失败: {e}")
+                last_refresh = time.monotonic()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop_keepalive(self):
+        if self._keepalive_stop is not None:
+            self._keepalive_stop.set()
+            self._keepalive_stop = None
+
+    def close(self):
+        self.stop_keepalive()
+        if self.adapter is not None:
+            self.adapter.close()
@@ -0,0 +1,277 @@
+# utils/hedge.py
+"""
+对冲选课请求（hedged request），缩短长尾延迟。
+
+抢课高峰时 select_course 的 p50 不到一秒，p99 却有好几秒：少数请求卡在过载的服务器或坏掉的连接上，
+原来只能等到超时。对冲模式下每门课每次只向一个系统发出请求（主请求）；主请求超过该系统延迟的 p90
+仍没有返回时，再向另一个系统（只有一个系统可用时向同一系统的另一条连接）发出一个对冲请求，
+先返回明确答复（选上、人数已满、不可选等，见 outcome.is_definitive）的请求胜出，另一个立即中止。
+
+对冲延迟按系统取最近 WINDOW 个响应延迟的 QUANTILE 分位数，限制在 [MIN_DELAY, MAX_DELAY] 内；
+样本不足 MIN_SAMPLES 时用 INITIAL_DELAY。对冲请求数最多为主请求数的 MAX_RATIO，
+服务器整体变慢时不会让请求量翻倍。
+
+节省的时间按抽样估计：被中止的主请求本来还要多久返回无法得知，所以每 PROBE_EVERY 次对冲胜出中有一次
+不中止主请求，让它照常返回（只用来测量，结果不再计入课程状态），它比对冲请求晚返回的时间就是这一次节省的时间；
+每次胜出节省的时间取这些样本的平均值。
+
+一次对冲的记账（谁胜出、中止哪些请求、抽样哪个主请求）由 Race 完成，GrabScheduler 与 AsyncGrabEngine
+只负责发出和中止请求。
+"""
+import statistics
+import threading
+import time
+from collections import deque, namedtuple
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+
+# 每个系统保留的延迟样本数
+WINDOW = 200
+# 对冲延迟取的分位数
+QUANTILE = 0.9
+# 样本不足时的对冲延迟（秒）
+MIN_SAMPLES = 10
+INITIAL_DELAY = 2.0
+# 对冲延迟的范围（秒）
+MIN_DELAY = 0.05
+MAX_DELAY = 10.0
+# 对冲请求数最多为主请求数的比例
+MAX_RATIO = 0.2
+# 每多少次对冲胜出不中止一次主请求，用来测量节省的时间
+PROBE_EVERY = 10
+# 统计答复延迟 p50 / p99 时保留的最近答复数
+ANSWER_WINDOW = 5000
+
+
+# 对冲中一个请求结束后引擎要做的事（见 Race.finish）
+RaceStep = namedtuple('RaceStep', ['decides', 'report', 'losers', 'probe'])
+
+
+def quantile(values, q):
+    """最近秩法求分位数（q 在 0~1 之间），没有样本时返回 None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+
+class HedgePolicy:
+    """
+    对冲延迟与统计（线程安全，GrabScheduler 与 AsyncGrabEngine 共用）
+
+    参数:
+        quantile: 对冲延迟取各系统延迟的分位数
+        max_ratio: 对冲请求数最多为主请求数的比例；为 0 时只发主请求（用于对比）
+        initial_delay: 样本不足时的对冲延迟（秒）
+    """
+
+    def __init__(self, quantile=QUANTILE, max_ratio=MAX_RATIO, initial_delay=INITIAL_DELAY):
+        self.quantile = quantile
+        self.max_ratio = max_ratio
+        self.initial_delay = initial_delay
+        self._lock = threading.Lock()
+        # 系统名 -> 最近的响应延迟（秒）
+        self._samples = {}
+        # races: 主请求数；fired: 发出的对冲请求数；won: 对冲请求先返回明确答复的次数；
+        # skipped: 到了对冲时间但因比例上限或没有并发名额而没有发出的次数
+        self.stats = {"races": 0, "fired": 0, "won": 0, "skipped": 0}
+        # 对冲胜出后没有中止的主请求比对冲请求晚返回的时间（秒）
+        self._probe_savings = deque(maxlen=WINDOW)
+        # 最近 ANSWER_WINDOW 次从发出主请求到得到明确答复（或全部请求结束）的时间（秒）
+        self.answer_latencies = deque(maxlen=ANSWER_WINDOW)
+
+    def record(self, name, latency):
+        """记录一个响应（被中止的请求不记录）"""
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=WINDOW)).append(latency)
+
+    def delay(self, name):
+        """该系统的主请求发出多久后仍未返回时发出对冲请求（秒）"""
+        with self._lock:
+            samples = list(self._samples.get(name, ()))
+        if len(samples) < MIN_SAMPLES:
+            return self.initial_delay
+        return min(MAX_DELAY, max(MIN_DELAY, quantile(samples, self.quantile)))
+
+    def typical_latency(self, name):
+        """该系统延迟的中位数，没有样本时为 0（先让它参与，积累样本）"""
+        with self._lock:
+            samples = list(self._samples.get(name, ()))
+        return statistics.median(samples) if samples else 0.0
+
+    def pick_backend(self, candidates, router=None):
+        """
+        主请求（或对冲请求）发往的系统
+
+        参数:
+            candidates: 可用的系统名列表
+            router: 路由（如 utils/backends.BackendRegistry），为 None 时按延迟选择
+
+        返回:
+            路由权重最高、没有路由时延迟中位数最低的系统名；没有候选时为 None
+        """
+        if not candidates:
+            return None
+        if router is not None:
+            weights = router.weights()
+            return max(candidates, key=lambda name: weights[name])
+        return min(candidates, key=self.typical_latency)
+
+    def start_race(self):
+        """发出一个主请求"""
+        with self._lock:
+            self.stats["races"] += 1
+
+    def allow(self):
+        """比例上限内是否还可以发出对冲请求；可以时计入发出数"""
+        with self._lock:
+            if self.stats["fired"] >= self.max_ratio * self.stats["races"]:
+                self.stats["skipped"] += 1
+                return False
+            self.stats["fired"] += 1
+            return True
+
+    def skip(self):
+        """到了对冲时间但没有可用的并发名额"""
+        with self._lock:
+            self.stats["skipped"] += 1
+
+    def finish_race(self, elapsed, hedge_won):
+        """
+        记录一门课的一次对冲结束
+
+        参数:
+            elapsed: 从发出主请求到得到答复的时间（秒）
+            hedge_won: 是否由对冲请求先给出明确答复
+
+        返回:
+            bool: 为 True 时不中止主请求，在它返回时用 record_probe 记录晚了多久
+        """
+        with self._lock:
+            self.answer_latencies.append(elapsed)
+            if not hedge_won:
+                return False
+            self.stats["won"] += 1
+            return self.stats["won"] % PROBE_EVERY == 1
+
+    def record_probe(self, saved):
+        """没有中止的主请求返回：它比对冲请求晚返回的时间（秒）"""
+        with self._lock:
+            self._probe_savings.append(saved)
+
+    def summary(self):
+        """
+        对冲统计
+
+        返回:
+            dict: races、fired、won、skipped，以及 fire_rate（对冲比例）、probes（测量节省时间的样本数）、
+                saved_per_win_ms（每次对冲胜出估计节省的毫秒数）、saved（估计共节省的秒数）、answer_p50_ms / answer_p99_ms
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            latencies = list(self.answer_latencies)
+            savings = list(self._probe_savings)
+        stats["fire_rate"] = stats["fired"] / stats["races"] if stats["races"] else 0.0
+        stats["probes"] = len(savings)
+        stats["saved_per_win_ms"] = statistics.mean(savings) * 1000 if savings else 0.0
+        stats["saved"] = stats["saved_per_win_ms"] / 1000 * stats["won"]
+        for q in (50, 99):
+            value = quantile(latencies, q / 100)
+            stats[f"answer_p{q}_ms"] = value * 1000 if value is not None else 0.0
+        return stats
+
+
+class Race:
+    """
+    对冲模式下一门课的一次请求：主请求与（可能发出的）对冲请求，GrabScheduler 与 AsyncGrabEngine 共用
+
+    引擎只负责发出和中止请求：每个请求发出时调用 add，结束时调用 finish，按返回的 RaceStep
+    中止其他请求、处理结果并安排这门课的下一次。请求用引擎自己的对象表示（CancelScope 或 asyncio.Task）。
+    不是线程安全的：GrabScheduler 在自己的锁内调用，AsyncGrabEngine 在事件循环中调用。
+
+    参数:
+        policy: HedgePolicy
+        course: 课程字典
+        primary: 主请求发往的系统名
+    """
+
+    def __init__(self, policy, course, primary):
+        self.policy = policy
+        self.course = course
+        self.primary = primary
+        self.started = time.perf_counter()
+        # 尚未结束的请求 -> 是否为对冲请求
+        self._requests = {}
+        self.hedged = False
+        self.resolved = False
+        # 得到答复的时间（秒，相对 started）
+        self.elapsed = None
+        # 对冲胜出后不中止、用来测量节省时间的主请求
+        self.probe = None
+        policy.start_race()
+
+    def add(self, request, is_hedge=False):
+        """发出（或提交）一个请求"""
+        self._requests[request] = is_hedge
+        self.hedged = self.hedged or is_hedge
+
+    def hedge_target(self, pick_backend, try_acquire, release):
+        """
+        主请求到了对冲时间仍未返回：选出对冲请求发往的系统（另一个系统，没有时为同一系统）并占用名额
+
+        参数:
+            pick_backend: pick_backend(exclude)，返回除 exclude 以外可用的系统名或 None
+            try_acquire: try_acquire(系统名)，占用一个并发名额，没有名额时返回 False
+            release: release(系统名)，归还名额
+
+        返回:
+            系统名；已经有答复、已经对冲过、没有可用系统、没有名额或超过比例上限时为 None
+        """
+        if self.resolved or self.hedged:
+            return None
+        name = pick_backend(self.primary) or pick_backend(None)
+        if name is None:
+            return None
+        # 对冲请求不排队：没有名额或超过比例上限时放弃这次对冲
+        if not try_acquire(name):
+            self.policy.skip()
+            return None
+        if not self.policy.allow():
+            release(name)
+            return None
+        return name
+
+    def finish(self, request, result):
+        """
+        一个请求结束
+
+        参数:
+            request: add 时传入的请求
+            result: outcome.SelectOutcome；请求被跳过或被中止时为 None
+
+        返回:
+            RaceStep: decides 为 True 时这个请求决定了这次对冲（第一个明确答复，或最后一个结束的请求），
+                由它安排这门课的下一次；report 为 False 时结果只用于测量，不计入课程状态与结果日志
+                （决定之后才返回的请求，包括抽样的主请求）；losers 为需要中止的请求；
+                probe 为抽样中不中止的主请求（没有时为 None）
+        """
+        is_hedge = self._requests.pop(request, False)
+        elapsed = time.perf_counter() - self.started
+        if self.resolved:
+            if request is self.probe:
+                self.probe = None
+                if result is not None:
+                    self.policy.record_probe(elapsed - self.elapsed)
+            return RaceStep(False, False, [], None)
+        definitive = result is not None and outcome.is_definitive(result)
+        if not definitive and self._requests:
+            return RaceStep(False, result is not None, [], None)
+        self.resolved = True
+        self.elapsed = elapsed
+        if result is not None and self.policy.finish_race(elapsed, is_hedge and definitive):
+            self.probe = next((other for other, other_is_hedge in self._requests.items() if not other_is_hedge), None)
+        losers = [other for other in self._requests if other is not self.probe]
+        return RaceStep(True, result is not None, losers, self.probe)
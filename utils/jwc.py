@@ -3,91 +3,451 @@ import requests
 from bs4 import BeautifulSoup
 import time
 import logging
-from urllib.parse import urlparse
+import threading
+import re
+from html import unescape
 
 from pathlib import Path
 import sys, os
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from utils import ocr  # 导入自定义OCR模块
+from utils import probe
+from utils import connection
+
+# 验证码整体置信度低于该值时直接重新获取验证码，不再提交注定失败的登录请求
+MIN_CAPTCHA_CONFIDENCE = 0.6
+# 会话失效后台重新登录期间，选课请求最多等待的时间（秒），超时则跳过本次请求
+SESSION_HOLD_TIMEOUT = 15
+SESSION_EXPIRED_MESSAGE = "会话已失效，正在后台重新登录"
+
+# 选课接口返回的 XML 中依次是 结果标志 与 提示信息 两个 CDATA 段
+CDATA_PATTERN = re.compile(r'<!\[CDATA\[(.*?)\]\]>')
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36'
+
+
+def build_login_payload(username, password, captcha_code):
+    """登录接口的表单"""
+    return { 'username': username, 'password': password, 'ranstring': captcha_code, 'url': '', 'returnType': '', 'returnUrl': '', 'area': '' }
+
+
+def build_search_payload(teach_id):
+    """按选课编号查询课程的表单"""
+    return {
+        "setAction": "studentCourseSysSchedule",
+        "viewType": "",
+        "jumpPage": "1",
+        "selectAction": "TeachID",
+        "key1": teach_id,
+        "courseType": "all",
+        "key4": "",
+        "btn": "执行查询"
+    }
+
+
+def build_catalog_payload(page):
+    """查询全部课程（不按编号过滤）第 page 页的表单"""
+    payload = build_search_payload("")
+    payload.update({"selectAction": "", "jumpPage": str(page)})
+    return payload
+
+
+def build_select_params(real_teach_id, need_book=True):
+    """提交选课请求的查询参数"""
+    return {
+        "setAction": "addStudentCourseApply",
+        "teachId": real_teach_id,
+        "isBook": "1" if need_book else "0",
+        "tt": int(time.time() * 1000)
+    }
+
+
+def extract_real_teach_id(html, teach_id):
+    """
+    用正则直接定位 <span id="teachIdChoose{选课编号}">，不构建整页 DOM
+    Args:
+        html: 查询结果页
+        teach_id: 选课编号
+    Returns:
+        str | None: 真实ID；页面中没有该标签时返回 None
+    """
+    match = re.search(r'<span\b[^>]*\bid\s*=\s*["\']?teachIdChoose' + re.escape(teach_id) + r'["\'\s>][^>]*>(.*?)</span>',
+                      html, re.S | re.I)
+    if match is None:
+        return None
+    return unescape(TAG_PATTERN.sub('', match.group(1))).strip() or None
+
+
+def parse_search_response(html, teach_id):
+    """
+    从课程查询结果页中提取真正的课程ID
+    Args:
+        html: 查询结果页
+        teach_id: 选课编号
+    Returns:
+        tuple: (success, real_teach_id, error_message)
+    """
+    # 查找包含teachIdChooseBxxxx这样的span标签
+    teach_id_pattern = f"teachIdChoose{teach_id}"
+    real_teach_id = extract_real_teach_id(html, teach_id)
+    if real_teach_id is None and teach_id_pattern in html:
+        # 标签写法与正则不符时退回完整解析
+        teach_id_span = BeautifulSoup(html, 'html.parser').find('span', id=teach_id_pattern)
+        if teach_id_span and teach_id_span.text:
+            real_teach_id = teach_id_span.text.strip() or None
+    
+    if real_teach_id:
+        print(f"找到课程: {teach_id} -> 真实ID: {real_teach_id}")
+        return True, real_teach_id, None
+    
+    # 如果没有找到，检查是否没有该课程
+    if '共有记录[0]条' in html:
+        return False, None, f"未找到选课编号为 {teach_id} 的课程"
+    
+    return False, None, "无法解析课程信息"
+
+
+def is_login_required(response):
+    """
+    判断响应是否表示会话已失效（被重定向或跳转到登录页）
+    Args:
+        response: requests 或 httpx 的响应对象
+    Returns:
+        bool
+    """
+    if 300 <= response.status_code < 400 and 'login' in response.headers.get('location', '').lower():
+        return True
+    return 'service/login.html' in str(response.url) or 'UserLoginAction' in response.text
+
+
+def parse_select_response(text):
+    """
+    解析选课接口的响应
+    Returns:
+        tuple: (success, message)
+    """
+    results = CDATA_PATTERN.findall(text)
+    
+    if len(results) >= 2:
+        return results[0] == "1", results[1]
+    
+    return False, "选课响应格式错误"
 
 
 class Enroller:
-    def __init__(self, username, password, base="jwc.swjtu.edu.cn"):
+    def __init__(self, username, password, base="jwc.swjtu.edu.cn", ocr_pool=None, probe_cache=None,
+                 pool_size=connection.DEFAULT_POOL_SIZE, session_store=None):
         self.username = username
         self.password = password
+        # 验证码识别使用的 OCR 进程池，为 None 时在当前线程识别
+        self.ocr_pool = ocr_pool
         
-        # 检测并设置 BASE_URL
-        base_url = f"https://{base}"
-        try:
-            print(f"开始测试请求连通性和协议: " + f"{base_url}/service/login.html")
-            response = requests.get(f"{base_url}/service/login.html", timeout=5, allow_redirects=True, verify=True)
-            
-            # 输出重定向信息
-            if response.history:
-                print(f"\n重定向路径 ({len(response.history)} 次):")
-                for i, resp in enumerate(response.history, 1):
-                    status = resp.status_code
-                    from_url = resp.url
-                    to_url = resp.headers.get('location', resp.url)
-                    print(f"  {i}. [{status}] {from_url}")
-                    print(f"     重定向到: {to_url}")
-            
-            print(f"最终URL: {response.url}")
-            
-            parsed = urlparse(response.url)
-            if parsed.scheme == "http":
-                base_url = f"http://{base}"
-                print("检测到教务使用 HTTP，已切换为 HTTP 访问。")
-                
-        except Exception as e:
-            print(f"协议检测失败: {e}，使用默认 HTTPS")
-        
-        # 设置所有 URL
-        self.base_url = base_url
-        self.login_page_url = f"{base_url}/service/login.html"
-        self.login_api_url = f"{base_url}/vatuu/UserLoginAction"
-        self.captcha_url = f"{base_url}/vatuu/GetRandomNumberToJPEG"
-        self.loading_url = f"{base_url}/vatuu/UserLoadingAction"
-        self.course_url = f"{base_url}/vatuu/CourseStudentAction"
+        # 协议在第一次用到 base_url 时才解析（优先使用 utils/probe 的缓存），构造 Enroller 不做任何网络请求
+        self.base = base
+        self.probe_cache = probe_cache if probe_cache is not None else probe.get_probe_cache()
+        self._base_url = None
+        self._base_url_lock = threading.Lock()
     
-        # 设置 session 和 headers
+        # 设置 session 和 headers（Origin 在解析出 base_url 后补上）
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36',
-            'Origin': base_url,
+            'User-Agent': USER_AGENT,
         })
+        # 连接池大小应与抢课并发数一致，见 prepare_connections
+        self.connections = connection.ConnectionManager(self.session, pool_size)
+        # 保存登录 Cookie 的 SessionStore，为 None 时每次都完整登录
+        self.session_store = session_store
         self.is_logged_in = False
+        
+        # 会话失效检测：_session_ready 在后台重新登录期间被清除，选课请求在此等待；
+        # _session_generation 每次登录后加一，用来忽略在新会话建立前发出的旧请求
+        self._session_ready = threading.Event()
+        self._session_ready.set()
+        self._session_generation = 0
+        self._relogging = False
+        self._relogin_lock = threading.Lock()
+        # 会话事件回调 on_event(message)，GUI 用它把事件写入日志
+        self.on_event = None
+
+    @property
+    def base_url(self):
+        """教务系统根地址，首次访问时解析协议"""
+        if self._base_url is None:
+            with self._base_url_lock:
+                if self._base_url is None:
+                    base_url = self.probe_cache.resolve(self.base)
+                    self.session.headers['Origin'] = base_url
+                    self._base_url = base_url
+        return self._base_url
+
+    @property
+    def login_page_url(self):
+        return f"{self.base_url}/service/login.html"
+
+    @property
+    def login_api_url(self):
+        return f"{self.base_url}/vatuu/UserLoginAction"
+
+    @property
+    def captcha_url(self):
+        return f"{self.base_url}/vatuu/GetRandomNumberToJPEG"
+
+    @property
+    def loading_url(self):
+        return f"{self.base_url}/vatuu/UserLoadingAction"
+
+    @property
+    def course_url(self):
+        return f"{self.base_url}/vatuu/CourseStudentAction"
+
+    def prepare_connections(self, concurrency, keepalive=True):
+        """
+        抢课开始前按并发数调整连接池，并行建立连接，并在空闲时保活
+        Args:
+            concurrency: 同时使用该 Enroller 的线程数
+            keepalive: 是否启动保活线程
+        Returns:
+            int: 已建立的连接数
+        """
+        self.connections.resize(concurrency)
+        ready = self.connections.warm_up(self.login_page_url)
+        if keepalive:
+            self.connections.start_keepalive(self.login_page_url)
+        return ready
+
+    def connection_stats(self):
+        """连接池统计：请求数、新建连接数、复用率和等待时间"""
+        return self.connections.stats.snapshot()
+
+    def close(self):
+        """停止保活线程并关闭连接池（Enroller 被替换或不再使用时调用）"""
+        self.connections.close()
+
+    def _notify(self, message):
+        print(message)
+        if self.on_event is not None:
+            self.on_event(message)
 
-    def login(self, max_retries=10, retry_delay=1):
+    @property
+    def session_generation(self):
+        """会话代数，每次登录或恢复会话后加一"""
+        return self._session_generation
+
+    def mark_logged_in(self):
+        """进入已登录状态（新的会话）"""
+        self._session_generation += 1
+        self.is_logged_in = True
+
+    @property
+    def relogging(self):
+        """是否正在后台重新登录"""
+        return self._relogging
+
+    def wait_session(self, timeout=SESSION_HOLD_TIMEOUT):
+        """正在后台重新登录时等待其完成，返回会话是否可用"""
+        if not self._session_ready.wait(timeout):
+            return False
+        return self.is_logged_in
+
+    def handle_session_lost(self, generation=None):
+        """
+        发现会话失效时调用：在后台线程重新登录，其间的请求由 wait_session 挂起
+        Args:
+            generation: 发出请求时的 _session_generation；会话已经更新过时忽略
+        Returns:
+            bool: 是否由本次调用发起了重新登录；未登录（包括上次重新登录失败）时不会发起
+        """
+        with self._relogin_lock:
+            if self._relogging or not self.is_logged_in or \
+                    (generation is not None and generation != self._session_generation):
+                return False
+            self._relogging = True
+            self._session_ready.clear()
+        self._notify(f"[{self.base}] {SESSION_EXPIRED_MESSAGE}...")
+        threading.Thread(target=self._relogin, daemon=True).start()
+        return True
+
+    def _relogin(self):
+        try:
+            self.session.cookies.clear()
+            if self.session_store is not None:
+                self.session_store.delete(self.username, self.base)
+            if self.login_pipelined(use_saved_session=False):
+                self._notify(f"[{self.base}] 重新登录成功，恢复抢课")
+            else:
+                self.is_logged_in = False
+                self._notify(f"[{self.base}] 重新登录失败，该系统停止抢课")
+        except Exception as e:
+            self.is_logged_in = False
+            self._notify(f"[{self.base}] 重新登录异常: {e}")
+        finally:
+            with self._relogin_lock:
+                self._relogging = False
+                self._session_ready.set()
+
+    def check_session(self, timeout=5):
+        """
+        用一次轻量的已登录请求检查会话是否有效
+        Returns:
+            bool | None: 有效 / 无效；请求失败（超时等）无法判断时返回 None
+        """
+        try:
+            response = self.session.get(self.course_url, params={"setAction": "studentCourseSysSchedule"},
+                                        headers={'Referer': self.course_url}, timeout=timeout, allow_redirects=False)
+        except Exception as e:
+            print(f"会话检查失败: {e}")
+            return None
+        return response.status_code == 200 and not is_login_required(response)
+
+    def restore_session(self):
+        """
+        从 session_store 加载 Cookie 并验证，有效时直接进入已登录状态
+        Returns:
+            bool: 是否恢复成功
+        """
+        if self.session_store is None:
+            return False
+        cookies = self.session_store.load(self.username, self.base)
+        if not cookies:
+            return False
+        self.session_store.apply(cookies, self.session.cookies)
+        valid = self.check_session()
+        if valid is False:
+            print("保存的会话已失效，需要重新登录。")
+            self.session.cookies.clear()
+            self.session_store.delete(self.username, self.base)
+            return False
+        # 服务器过载、检查超时的时候完整登录同样会超时，先沿用保存的会话
+        print("已恢复保存的会话，跳过验证码登录。" if valid else "会话检查超时，先沿用保存的会话。")
+        self.mark_logged_in()
+        self.connections.start_keepalive(self.login_page_url)
+        return True
+
+    def save_session(self):
+        """把当前 Cookie 写入 session_store"""
+        if self.session_store is None:
+            return
+        try:
+            self.session_store.save(self.username, self.base, self.session.cookies)
+        except OSError as e:
+            print(f"保存会话失败: {e}")
+
+    def recognize_captcha(self, image_bytes):
+        """识别验证码（多阈值集成），返回 ocr.CaptchaResult（模板库不可用时为 None）"""
+        if self.ocr_pool is not None:
+            return self.ocr_pool.classify(image_bytes, ensemble=True)
+        return ocr.classify_ensemble(image_bytes)
+
+    def new_login_session(self):
+        """
+        新建一个独立 Cookie 的 Session（共用本 Enroller 的请求头和连接池），用于并行登录
+        验证码答案绑定在服务器端会话上，同一个 Session 取新验证码会让正在提交的那一张作废
+        """
+        # 先解析协议：Origin 请求头在解析出 base_url 时才加到 self.session 上
+        self.base_url
+        session = requests.Session()
+        session.headers.update(self.session.headers)
+        session.mount("http://", self.connections.adapter)
+        session.mount("https://", self.connections.adapter)
+        return session
+
+    def fetch_captcha(self, session=None):
+        """
+        获取并识别一张验证码
+        Returns:
+            ocr.CaptchaResult | None
+        """
+        session = session or self.session
+        response = session.get(**self.captcha_request())
+        response.raise_for_status()
+        return self.recognize_captcha(response.content)
+
+    # 以下 *_request 返回登录各步请求的参数（requests 与 httpx 通用），同步与异步登录共用
+    def captcha_request(self):
+        return {'url': self.captcha_url, 'params': {'test': int(time.time() * 1000)}, 'timeout': 10}
+
+    def login_request(self, captcha_code):
+        return {'url': self.login_api_url, 'data': build_login_payload(self.username, self.password, captcha_code),
+                'headers': {'Referer': self.login_page_url}, 'timeout': 10}
+
+    def loading_request(self):
+        return {'url': self.loading_url, 'headers': {'Referer': self.login_page_url}, 'timeout': 10}
+
+    def submit_login(self, captcha_code, session=None):
+        """
+        提交登录表单
+        Returns:
+            dict: 登录接口返回的 JSON
+        """
+        session = session or self.session
+        response = session.post(**self.login_request(captcha_code))
+        response.raise_for_status()
+        return response.json()
+
+    def finish_login(self, session=None):
+        """
+        登录接口验证成功后访问加载页建立完整会话，并进入已登录状态
+        Args:
+            session: 完成登录的 Session；不是 self.session 时把它的 Cookie 复制过来
+        """
+        if session is not None and session is not self.session:
+            self.session.cookies.clear()
+            self.session.cookies.update(session.cookies)
+        print("正在访问加载页面以建立完整会话...")
+        self.session.get(**self.loading_request())
+        self.complete_login()
+
+    def complete_login(self):
+        """访问加载页之后：进入已登录状态，保存会话并开始保持连接（同步与异步登录共用）"""
+        print("会话建立成功，已登录。")
+        self.mark_logged_in()
+        self.save_session()
+        # 登录后到抢课开始前往往要等一段时间，期间保持连接不被服务器关闭
+        self.connections.start_keepalive(self.login_page_url)
+
+    @staticmethod
+    def captcha_rejection(captcha, min_confidence, last_attempt=False):
+        """
+        判断识别结果是否值得提交
+        Returns:
+            str | None: 不提交的原因；值得提交时返回 None
+        """
+        captcha_code = captcha.text if captcha else None
+        if not captcha_code or len(captcha_code) != ocr.CAPTCHA_LENGTH:
+            return "验证码识别失败"
+        if captcha.confidence < min_confidence and not last_attempt:
+            return f"验证码置信度低于 {min_confidence}"
+        return None
+
+    def login(self, max_retries=10, retry_delay=1, min_confidence=MIN_CAPTCHA_CONFIDENCE, use_saved_session=True):
+        # 保存的会话仍然有效时不再走验证码登录
+        if use_saved_session and self.restore_session():
+            return True
         for attempt in range(1, max_retries + 1):
             print(f"--- 登录尝试 #{attempt}/{max_retries} ---")
             
             try:
                 # 1. 获取并识别验证码
                 print("正在获取验证码...")
-                captcha_params = {'test': int(time.time() * 1000)}
-                response = self.session.get(self.captcha_url, params=captcha_params, timeout=10)
-                response.raise_for_status()
-                captcha_code = ocr.classify(response.content)
-                print(f"OCR 识别结果: {captcha_code}")
-                if not captcha_code or len(captcha_code) != 4:
-                    print("验证码识别失败，跳过本次尝试。")
-                    if attempt < max_retries: time.sleep(retry_delay)
+                captcha = self.fetch_captcha()
+                if captcha:
+                    print(f"OCR 识别结果: {captcha.text} (置信度 {captcha.confidence:.3f})")
+                else:
+                    print("OCR 识别结果: None")
+                # 识别失败或置信度过低时立即换一张验证码，省掉必然失败的登录请求和重试等待
+                rejection = self.captcha_rejection(captcha, min_confidence, attempt == max_retries)
+                if rejection:
+                    print(f"{rejection}，立即重新获取验证码。")
                     continue
 
                 # 2. 尝试API登录
                 print("正在尝试登录API...")
-                login_payload = { 'username': self.username, 'password': self.password, 'ranstring': captcha_code, 'url': '', 'returnType': '', 'returnUrl': '', 'area': '' }
-                response = self.session.post(self.login_api_url, data=login_payload, headers={'Referer': self.login_page_url}, timeout=10)
-                response.raise_for_status()
-                login_result = response.json()
+                login_result = self.submit_login(captcha.text)
 
                 if login_result.get('loginStatus') == '1':
                     print(f"API验证成功！{login_result.get('loginMsg')[0:5]}")
-                    print("正在访问加载页面以建立完整会话...")
-                    self.session.get(self.loading_url, headers={'Referer': self.login_page_url}, timeout=10)
-                    print("会话建立成功，已登录。")
-                    self.is_logged_in = True
+                    self.finish_login()
                     return True
                 else:
                     print(f"登录API失败: {login_result.get('loginMsg', '未知错误')}")
@@ -101,7 +461,81 @@ class Enroller:
         
         print(f"\n登录失败 {max_retries} 次，程序终止。")
         return False
-        
+
+    def login_pipelined(self, lanes=2, max_attempts=10, retry_delay=1, min_confidence=MIN_CAPTCHA_CONFIDENCE,
+                        use_saved_session=True, stop_event=None):
+        """
+        流水线登录：lanes 条通道各用独立的 Session 并行执行 取验证码→识别→提交，
+        一条通道在等登录结果时，另一条已经在取下一张验证码；任一通道成功即采用它的会话
+        Args:
+            lanes: 并行通道数
+            max_attempts: 所有通道合计最多提交的验证码数
+            retry_delay: 发生异常（网络错误等）后该通道的等待时间；验证码错误时立即重试
+            stop_event: 外部设置后停止尝试
+        Returns:
+            bool: 是否登录成功
+        """
+        if use_saved_session and self.restore_session():
+            return True
+        stop_event = stop_event or threading.Event()
+        done = threading.Event()
+        lock = threading.Lock()
+        attempts = [0]
+        result = {"session": None}
+
+        def next_attempt():
+            with lock:
+                if done.is_set() or stop_event.is_set() or attempts[0] >= max_attempts:
+                    return None
+                attempts[0] += 1
+                return attempts[0]
+
+        def lane(lane_id):
+            session = self.new_login_session()
+            while True:
+                attempt = next_attempt()
+                if attempt is None:
+                    return
+                try:
+                    captcha = self.fetch_captcha(session)
+                    rejection = self.captcha_rejection(captcha, min_confidence, attempt == max_attempts)
+                    if rejection:
+                        print(f"[通道{lane_id}] 第 {attempt} 次: {rejection}，立即重新获取验证码。")
+                        continue
+                    # 识别期间其他通道可能已经登录成功，不再提交，免得在服务器上多建一个登录会话
+                    if done.is_set() or stop_event.is_set():
+                        return
+                    login_result = self.submit_login(captcha.text, session)
+                    if login_result.get('loginStatus') == '1':
+                        with lock:
+                            if not done.is_set():
+                                result["session"] = session
+                                done.set()
+                        print(f"[通道{lane_id}] 第 {attempt} 次: API验证成功！")
+                        return
+                    print(f"[通道{lane_id}] 第 {attempt} 次: 登录API失败: {login_result.get('loginMsg', '未知错误')}")
+                except Exception as e:
+                    print(f"[通道{lane_id}] 第 {attempt} 次: 登录过程中发生异常: {e}")
+                    if stop_event.wait(retry_delay) or done.is_set():
+                        return
+
+        threads = [threading.Thread(target=lane, args=(i + 1,), daemon=True) for i in range(max(1, lanes))]
+        for thread in threads:
+            thread.start()
+        # 成功后不必等其他通道的请求返回
+        while not done.is_set() and any(thread.is_alive() for thread in threads):
+            done.wait(0.05)
+
+        if result["session"] is None:
+            print(f"\n登录失败（共尝试 {attempts[0]} 次）。")
+            return False
+        try:
+            self.finish_login(result["session"])
+            return True
+        except Exception as e:
+            print(f"建立会话失败: {e}")
+            return False
+
     def search_course_by_teach_id(self, teach_id):
         """
         按选课编号查询课程，获取真正的课程ID
@@ -111,16 +545,7 @@ class Enroller:
             tuple: (success, real_teach_id, error_message)
         """
         try:
-            payload = {
-                "setAction": "studentCourseSysSchedule",
-                "viewType": "",
-                "jumpPage": "1",
-                "selectAction": "TeachID",
-                "key1": teach_id,
-                "courseType": "all",
-                "key4": "",
-                "btn": "执行查询"
-            }
+            payload = build_search_payload(teach_id)
             
             response = self.session.post(
                 self.course_url,
@@ -130,35 +555,33 @@ class Enroller:
             )
             response.raise_for_status()
             
-            # 解析HTML，提取真正的teachId
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 查找包含teachIdChooseBxxxx这样的span标签
-            teach_id_pattern = f"teachIdChoose{teach_id}"
-            teach_id_span = soup.find('span', id=teach_id_pattern)
-            
-            if teach_id_span and teach_id_span.text:
-                real_teach_id = teach_id_span.text.strip()
-                print(f"找到课程: {teach_id} -> 真实ID: {real_teach_id}")
-                return True, real_teach_id, None
-            
-            # 如果没有找到，检查是否没有该课程
-            no_results = soup.find('td', string=lambda x: x and '共有记录[0]条' in x)
-            if no_results:
-                return False, None, f"未找到选课编号为 {teach_id} 的课程"
+            if is_login_required(response):
+                self.handle_session_lost()
+                return False, None, SESSION_EXPIRED_MESSAGE
             
-            return False, None, "无法解析课程信息"
+            return parse_search_response(response.text, teach_id)
             
         except Exception as e:
             return False, None, f"查询课程失败: {str(e)}"
-    def select_course(self, real_teach_id, need_book=True):
+    def select_course(self, real_teach_id, need_book=True, hold_timeout=SESSION_HOLD_TIMEOUT, retry_on_expired=True,
+                      raise_errors=False):
+        """
+        提交选课请求
+        Args:
+            real_teach_id: 真实课程ID
+            need_book: 是否需要教材
+            hold_timeout: 会话正在后台重新登录时最多等待的时间（秒）
+            retry_on_expired: 发现会话失效时，等待重新登录完成后是否重发一次
+            raise_errors: 请求异常（超时、连接失败、HTTP 错误）时直接抛出，由调用方按异常类型归类（见 outcome.classify_error）
+        Returns:
+            tuple: (success, message)
+        """
+        # 重新登录超时或已经失败（is_logged_in 为 False）时都不再发出请求
+        if not self.wait_session(hold_timeout):
+            return False, SESSION_EXPIRED_MESSAGE
+        generation = self.session_generation
         try:
-            params = {
-                "setAction": "addStudentCourseApply",
-                "teachId": real_teach_id,
-                "isBook": "1" if need_book else "0",
-                "tt": int(time.time() * 1000)
-            }
+            params = build_select_params(real_teach_id, need_book)
             
             response = self.session.get(
                 self.course_url,
@@ -168,15 +591,18 @@ class Enroller:
             )
             response.raise_for_status()
             
-            import re
-            results = re.findall(r'<!\[CDATA\[(.*?)\]\]>', response.text)
-            
-            if len(results) >= 2:
-                return results[0] == "1", results[1]
+            # 会话失效时服务器返回登录页，不能当作普通的选课失败
+            if is_login_required(response):
+                self.handle_session_lost(generation)
+                if retry_on_expired and self.wait_session(hold_timeout):
+                    return self.select_course(real_teach_id, need_book, hold_timeout, False, raise_errors)
+                return False, SESSION_EXPIRED_MESSAGE
             
-            return False, "选课响应格式错误"
+            return parse_select_response(response.text)
             
         except Exception as e:
+            if raise_errors:
+                raise
             return False, f"选课请求失败: {str(e)}"
 
     def auto_select_course(self, teach_id, need_book=True):
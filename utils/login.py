@@ -0,0 +1,108 @@
+# utils/login.py
+"""
+多系统并行登录。
+
+每个系统一个线程，同时进行协议解析和流水线登录（Enroller.login_pipelined）；
+某个系统登录成功立即通过 on_ready 回调通知，不必等其他系统，抢课可以先在这个系统上开始。
+同时记录每个系统从开始到可用的耗时，以及第一个可用会话的耗时。
+"""
+import threading
+import time
+
+
+class LoginOrchestrator:
+    """
+    并行登录多个 Enroller
+
+    参数:
+        enrollers: [(名称, Enroller), ...]
+        lanes: 每个系统的流水线通道数
+        max_attempts: 每个系统最多提交的验证码数
+        on_ready: on_ready(名称, enroller, 耗时秒数)，某个系统登录成功时调用
+        on_failed: on_failed(名称, enroller, 耗时秒数)，某个系统登录失败时调用
+    """
+
+    def __init__(self, enrollers, lanes=2, max_attempts=10, on_ready=None, on_failed=None):
+        self.enrollers = list(enrollers)
+        self.lanes = lanes
+        self.max_attempts = max_attempts
+        self.on_ready = on_ready
+        self.on_failed = on_failed
+        self.stop_event = threading.Event()
+        self.results = {}
+        self.elapsed = {}
+        self.started_at = None
+        self.time_to_first_session = None
+        self._first_ready = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """在后台开始登录所有系统"""
+        self.started_at = time.perf_counter()
+        for name, enroller in self.enrollers:
+            thread = threading.Thread(target=self._login_one, args=(name, enroller), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _login_one(self, name, enroller):
+        try:
+            success = enroller.login_pipelined(lanes=self.lanes, max_attempts=self.max_attempts, stop_event=self.stop_event)
+        except Exception as e:
+            print(f"{name} 登录异常: {e}")
+            success = False
+        elapsed = time.perf_counter() - self.started_at
+        with self._lock:
+            self.results[name] = success
+            self.elapsed[name] = elapsed
+            if success and self.time_to_first_session is None:
+                self.time_to_first_session = elapsed
+        if success:
+            self._first_ready.set()
+            if self.on_ready is not None:
+                self.on_ready(name, enroller, elapsed)
+        elif self.on_failed is not None:
+            self.on_failed(name, enroller, elapsed)
+
+    def wait_first(self, timeout=None):
+        """
+        等待第一个系统登录成功
+
+        返回:
+            str | None: 最先可用的系统名称；全部失败或超时返回 None
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self._first_ready.is_set():
+            if not any(thread.is_alive() for thread in self._threads):
+                break
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                break
+            self._first_ready.wait(0.05 if remaining is None else min(0.05, remaining))
+        with self._lock:
+            ready = [name for name, success in self.results.items() if success]
+        return min(ready, key=self.elapsed.get) if ready else None
+
+    def wait_all(self, timeout=None):
+        """
+        等待所有系统登录结束
+
+        返回:
+            dict: {名称: 是否成功}
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        with self._lock:
+            return dict(self.results)
+
+    def stop(self):
+        """放弃尚未完成的登录"""
+        self.stop_event.set()
+
+    def report(self):
+        """各系统可用耗时与第一个可用会话的耗时（秒）"""
+        with self._lock:
+            return {"time_to_first_session": self.time_to_first_session, "elapsed": dict(self.elapsed),
+                    "results": dict(self.results)}
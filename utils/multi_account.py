@@ -0,0 +1,468 @@
+# utils/multi_account.py
+"""
+多账号无界面抢课。
+
+原来每个账号要开一个窗口（一个 CourseGrabberGUI），各自有线程、OCR 进程池、模板和连接。
+这里从账号文件读取多个账号及其课程，在一个进程里一起运行，账号很多时可以用 --shards 分给几个进程：
+    - 同一进程内的所有账号共用一个 OCR 进程池（登录时识别验证码）、协议探测缓存、真实 ID 缓存和本地课程目录；
+    - 抢课在一个事件循环里进行，各账号的 AsyncEnroller 共用 SharedTransports 的连接（每个系统 max_connections 个）；
+    - 每个账号有自己的会话（Cookie 与会话文件）、系统注册表和健康状态、每个系统的并发名额（PacingController）、
+      重试状态和结果。一个账号会话失效、被限流或放弃课程，不影响其他账号。
+同时登录的账号数不超过 LOGIN_CONCURRENCY（每个账号内各系统并行登录，同 LoginOrchestrator）。
+结束后报告每个账号的请求数、首个响应时间和选课结果，以及总吞吐和账号之间的公平性。
+公平性用 Jain 指数计算，1 表示完全均等。每个账号的服务量是 每秒完成的请求数 / 可同时进行的请求数，
+后者取课程数和并发名额中较小的一个。
+
+账号文件（JSON）:
+    {
+      "backends": [...],        // 可选，同 config.json
+      "term": "2026-2027-1",    // 可选，同 config.json
+      "interval": 1.0,          // 可选，同一 (课程, 系统) 两次请求的最小间隔（秒）
+      "max_in_flight": 4,       // 可选，每个账号在每个系统上同时进行的请求数
+      "accounts": [
+        {"username": "学号", "password": "密码", "max_in_flight": 8,
+         "courses": [{"teach_id": "选课编号", "need_book": true, "remark": ""}]}
+      ]
+    }
+
+运行:
+    python -m utils.multi_account accounts.json
+    python -m utils.multi_account accounts.json --shards 4 --seconds 600 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import catalog as course_catalog
+from utils import ocr
+from utils import outcome
+from utils import teach_ids as teach_id_resolver
+from utils.async_jwc import SHARED_CONNECTIONS, AsyncEnroller, AsyncGrabEngine, SharedTransports
+from utils.backends import BackendRegistry
+from utils.hedge import HedgePolicy
+from utils.jwc import Enroller
+from utils.login import LoginOrchestrator
+from utils.pacing import PacingController
+from utils.session_store import get_session_store
+
+# 同时登录的账号数
+LOGIN_CONCURRENCY = 16
+# 账号文件没有指定时，每个账号在每个系统上同时进行的请求数与重试间隔（秒）
+MAX_IN_FLIGHT = 4
+INTERVAL = 1.0
+
+
+class Account:
+    """
+    一个账号：自己的会话、系统注册表、并发名额、重试状态与结果
+
+    参数:
+        username: 学号
+        password: 密码
+        courses: 课程字典列表（同 config.json 的 courses），选上后原地置 selected=True
+        max_in_flight: 在每个系统上同时进行的请求数
+    """
+
+    def __init__(self, username, password, courses, max_in_flight=MAX_IN_FLIGHT):
+        self.username = username
+        self.password = password
+        self.courses = courses
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.backends = None
+        self.engine = None
+        self.retry_tracker = outcome.RetryTracker()
+        # 登录或抢课失败的原因，正常时为 None
+        self.error = None
+        # 时间均为秒；first_*_s 相对抢课开始；slots 为可同时进行的请求数（每个系统）
+        self.stats = {"login_s": None, "grab_s": None, "slots": 0, "submitted": 0, "completed": 0, "aborted": 0,
+                      "first_response_s": None, "first_success_s": None}
+
+    @property
+    def label(self):
+        """日志中显示的账号（隐去学号中间几位）"""
+        name = self.username
+        return f"{name[:4]}***{name[-2:]}" if len(name) > 6 else name
+
+
+def make_course(entry):
+    """账号文件中的一门课程 -> 抢课使用的课程字典"""
+    teach_id = str(entry.get("teach_id", "")).strip()
+    if not teach_id:
+        raise ValueError("课程缺少 teach_id")
+    return {
+        "teach_id": teach_id,
+        "real_teach_id": entry.get("real_teach_id"),
+        "remark": entry.get("remark", ""),
+        "need_book": entry.get("need_book", True),
+        "selected": entry.get("selected", False),
+    }
+
+
+def load_accounts(path):
+    """
+    读取账号文件
+
+    返回:
+        (settings, accounts): settings 为 accounts 以外的设置；accounts 为 Account 列表。格式不对时抛出 ValueError
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    entries = data.get("accounts") if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("账号文件中没有 accounts")
+    settings = {key: value for key, value in data.items() if key != "accounts"}
+    default_budget = settings.get("max_in_flight", MAX_IN_FLIGHT)
+    accounts = []
+    seen = set()
+    for index, entry in enumerate(entries, 1):
+        username = str(entry.get("username", "")).strip()
+        password = entry.get("password", "")
+        if not username or not password:
+            raise ValueError(f"第 {index} 个账号缺少学号或密码")
+        if username in seen:
+            raise ValueError(f"账号重复: {username}")
+        seen.add(username)
+        try:
+            courses = [make_course(course) for course in entry.get("courses", [])]
+        except ValueError as e:
+            raise ValueError(f"账号 {username}: {e}") from None
+        accounts.append(Account(username, password, courses, entry.get("max_in_flight", default_budget)))
+    return settings, accounts
+
+
+def jain_index(values):
+    """Jain 公平性指数：(Σx)² / (n·Σx²)，全部相等时为 1；没有数据时返回 None"""
+    squares = sum(value * value for value in values)
+    if not values or not squares:
+        return None
+    return sum(values) ** 2 / (len(values) * squares)
+
+
+def summarize(rows, elapsed):
+    """
+    汇总各账号的统计
+
+    参数:
+        rows: MultiAccountRunner.report() 中的 accounts（可以来自多个分片）
+        elapsed: 抢课耗时（秒）
+
+    返回:
+        dict: accounts、active（登录成功的账号数）、selected / dropped（课程数）、completed、
+            throughput（每秒完成的请求数）、fairness（Jain 指数）、min_share / max_share（服务量最低、最高的账号
+            相对平均值的比例）、first_response_p50_s / first_response_max_s
+    """
+    active = [row for row in rows if row["error"] is None]
+    shares = [row["completed"] / (row["slots"] * row["grab_s"]) for row in active if row["slots"] and row["grab_s"]]
+    mean_share = sum(shares) / len(shares) if shares else 0.0
+    firsts = sorted(row["first_response_s"] for row in active if row["first_response_s"] is not None)
+    completed = sum(row["completed"] for row in rows)
+    return {
+        "accounts": len(rows),
+        "active": len(active),
+        "selected": sum(row["selected"] for row in rows),
+        "dropped": sum(row["dropped"] for row in rows),
+        "completed": completed,
+        "throughput": completed / elapsed if elapsed else 0.0,
+        "fairness": jain_index(shares),
+        "min_share": min(shares) / mean_share if mean_share else None,
+        "max_share": max(shares) / mean_share if mean_share else None,
+        "first_response_p50_s": firsts[len(firsts) // 2] if firsts else None,
+        "first_response_max_s": firsts[-1] if firsts else None,
+        "elapsed_s": elapsed,
+    }
+
+
+class MultiAccountRunner:
+    """
+    在一个进程中登录并运行多个账号
+
+    参数:
+        accounts: Account 列表
+        settings: 账号文件中的设置（backends、term、interval）
+        ocr_pool: 所有账号共用的 OcrPool，默认 ocr.get_ocr_pool()
+        session_store: 所有账号共用的 SessionStore（按 账号+主机 分文件），None 表示每次都完整登录
+        probe_cache: 传给各 Enroller 的 ProbeCache，None 表示进程内共享的缓存
+        max_connections: 所有账号共用的、到每个系统的连接数
+        share_connections: 为 False 时每个账号各建自己的连接（用于对比）
+        login_concurrency: 同时登录的账号数
+        adaptive: 是否按各账号各系统的延迟和错误率自适应调整并发数与间隔（上限为账号的 max_in_flight）
+        hedge: 是否使用对冲请求（utils/hedge）
+        log: log(消息)
+    """
+
+    def __init__(self, accounts, settings=None, ocr_pool=None, session_store=None, probe_cache=None,
+                 max_connections=SHARED_CONNECTIONS, share_connections=True, login_concurrency=LOGIN_CONCURRENCY, adaptive=True, hedge=False,
+                 log=print):
+        self.accounts = accounts
+        self.settings = settings or {}
+        self.ocr_pool = ocr_pool or ocr.get_ocr_pool()
+        self.session_store = session_store
+        self.probe_cache = probe_cache
+        self.max_connections = max_connections
+        self.share_connections = share_connections
+        self.login_concurrency = login_concurrency
+        self.adaptive = adaptive
+        self.hedge = hedge
+        self.log = log
+        self.login_elapsed = None
+        self.elapsed = None
+        self.started_at = None
+        self._stopped = threading.Event()
+
+    def stop(self):
+        """停止（可以在任意线程中调用）：不再登录新的账号，各账号的抢课随之停止"""
+        self._stopped.set()
+        for account in self.accounts:
+            if account.engine is not None:
+                account.engine.stop()
+
+    def login_all(self):
+        """
+        登录所有账号，并确认课程的真实 ID（阻塞）
+
+        返回:
+            int: 可以抢课的账号数
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.login_concurrency) as executor:
+            list(executor.map(self._prepare, self.accounts))
+        self.login_elapsed = time.perf_counter() - start
+        ready = [account for account in self.accounts if account.error is None]
+        self.log(f"登录完成: {len(ready)}/{len(self.accounts)} 个账号可以抢课，耗时 {self.login_elapsed:.2f} 秒")
+        for account in self.accounts:
+            if account.error is not None:
+                self.log(f"[{account.label}] ✗ {account.error}")
+        return len(ready)
+
+    def _prepare(self, account):
+        """登录一个账号（先尝试恢复保存的会话）并确认课程的真实 ID"""
+        if self._stopped.is_set():
+            account.error = "已停止"
+            return
+        start = time.perf_counter()
+        try:
+            account.backends = BackendRegistry.from_config(self.settings)
+            for backend in account.backends:
+                backend.enroller = Enroller(account.username, account.password, base=backend.base, ocr_pool=self.ocr_pool,
+                                            probe_cache=self.probe_cache, session_store=self.session_store)
+                backend.enroller.on_event = lambda message, label=account.label: self.log(f"[{label}] {message}")
+            LoginOrchestrator([(backend.name, backend.enroller) for backend in account.backends]).start().wait_all()
+            account.stats["login_s"] = time.perf_counter() - start
+            if not account.backends.logged_in():
+                account.error = "所有系统都登录失败，请检查账号密码"
+                return
+            self._resolve_courses(account)
+            self.log(f"[{account.label}] ✓ 已登录 {account.backends.status_text()}（{account.stats['login_s']:.2f} 秒）")
+        except Exception as e:
+            account.error = f"登录异常: {e}"
+        finally:
+            # 抢课使用共用的异步连接，同步连接池只在后台重新登录时用到（届时按需新建）
+            for backend in account.backends or ():
+                if backend.enroller is not None:
+                    backend.enroller.connections.close()
+
+    def _resolve_courses(self, account):
+        """查询没有真实 ID 的课程（优先使用共用的缓存与本地课程目录），查询失败的课程标记为放弃"""
+        missing = [course["teach_id"] for course in account.courses if not course.get("real_teach_id")]
+        if not missing:
+            return
+        results = teach_id_resolver.resolve_teach_ids(account.backends.best_enroller(), missing,
+                                                      term=self.settings.get("term"),
+                                                      catalog=course_catalog.get_course_catalog())
+        for course in account.courses:
+            if course.get("real_teach_id"):
+                continue
+            success, real_teach_id, error = results[course["teach_id"]]
+            if success:
+                course["real_teach_id"] = real_teach_id
+            else:
+                course["dropped"] = f"查询失败: {error}"
+                self.log(f"[{account.label}] ✗ 查询失败: {course['teach_id']}: {error}")
+
+    async def grab(self, should_continue=lambda: True):
+        """
+        所有已登录的账号一起抢课，直到都没有待选课程、should_continue() 返回 False 或 stop()
+
+        参数:
+            should_continue: 返回 False 时停止
+        """
+        interval = self.settings.get("interval", INTERVAL)
+        shared = SharedTransports(self.max_connections) if self.share_connections else None
+        self.started_at = time.perf_counter()
+        running = [account for account in self.accounts if account.error is None]
+        connections = f"共用每个系统 {self.max_connections} 个连接" if shared is not None else "各账号使用自己的连接"
+        self.log(f"开始抢课: {len(running)} 个账号，{connections}")
+        try:
+            await asyncio.gather(*(self._grab_account(account, shared, interval, should_continue)
+                                   for account in running))
+        finally:
+            if shared is not None:
+                await shared.aclose()
+            self.elapsed = time.perf_counter() - self.started_at
+
+    async def _grab_account(self, account, shared, interval, should_continue):
+        """一个账号的抢课：自己的 AsyncGrabEngine、并发名额与重试状态"""
+        active = account.backends.logged_in()
+        backends = [(name, AsyncEnroller(enroller, max_connections=account.max_in_flight, shared=shared))
+                    for name, enroller in active]
+        pacing = {name: PacingController(account.max_in_flight, interval, adaptive=self.adaptive) for name, _ in active}
+        account.engine = AsyncGrabEngine(backends, max_in_flight=account.max_in_flight,
+                                         retry_tracker=account.retry_tracker, pacing=pacing, router=account.backends,
+                                         hedge=HedgePolicy() if self.hedge else None)
+        account.stats["slots"] = min(account.max_in_flight, sum(outcome.is_pending(c) for c in account.courses))
+        if self._stopped.is_set():
+            account.engine.stop()
+        start = time.perf_counter()
+        try:
+            await account.engine.run(
+                account.courses, interval, lambda: should_continue() and not self._stopped.is_set(),
+                on_result=lambda *args: self._on_result(account, *args))
+        except Exception as e:
+            account.error = f"抢课异常: {e}"
+        finally:
+            # 按 Ctrl+C 时 run 被取消，统计同样从引擎中取
+            account.stats["grab_s"] = time.perf_counter() - start
+            for key in ("submitted", "completed", "aborted"):
+                account.stats[key] = account.engine.stats[key]
+            for _, async_enroller in backends:
+                await async_enroller.aclose()
+
+    def _on_result(self, account, attempt, name, course, success, message, result, changed):
+        """一个请求返回（事件循环中调用）"""
+        now = time.perf_counter() - self.started_at
+        if account.stats["first_response_s"] is None:
+            account.stats["first_response_s"] = now
+        if success and account.stats["first_success_s"] is None:
+            account.stats["first_success_s"] = now
+        if changed:
+            state = "✓ 选课成功" if course["selected"] else f"✗ {result.label}，不再重试"
+            self.log(f"[{account.label}] [第{attempt}次-{name}] {state}: {course['teach_id']} - {message}")
+
+    def report(self):
+        """
+        各账号的统计与汇总
+
+        返回:
+            dict: {"accounts": [每个账号一行], "summary": summarize() 的结果, "login_s": 登录阶段耗时}
+        """
+        rows = []
+        for account in self.accounts:
+            counts, _ = account.retry_tracker.summary()
+            rows.append({
+                "username": account.username,
+                "label": account.label,
+                "error": account.error,
+                "courses": len(account.courses),
+                "selected": sum(bool(course["selected"]) for course in account.courses),
+                "dropped": sum(bool(not course["selected"] and course.get("dropped")) for course in account.courses),
+                "outcomes": counts,
+                "results": [{"teach_id": course["teach_id"], "real_teach_id": course.get("real_teach_id"),
+                             "selected": course["selected"], "dropped": course.get("dropped")}
+                            for course in account.courses],
+                **account.stats,
+            })
+        return {"accounts": rows, "summary": summarize(rows, self.elapsed or 0.0), "login_s": self.login_elapsed}
+
+
+def run_accounts(path, shard=0, shards=1, seconds=None, max_connections=SHARED_CONNECTIONS, ocr_workers=None,
+                 adaptive=True, hedge=False, save_sessions=True):
+    """
+    运行账号文件中第 shard 个分片的账号（账号按顺序轮流分到 shards 个分片），返回 MultiAccountRunner.report()
+
+    参数:
+        seconds: 抢课最长运行时间（秒），None 表示直到没有待选课程；Ctrl+C 随时停止并返回统计
+        ocr_workers: 本进程 OCR 进程池的大小，默认按 CPU 核数在各分片之间平分
+    """
+    settings, accounts = load_accounts(path)
+    accounts = accounts[shard::shards]
+    ocr_pool = ocr.get_ocr_pool(max_workers=ocr_workers or max(1, (os.cpu_count() or 1) // shards))
+    runner = MultiAccountRunner(accounts, settings, ocr_pool=ocr_pool,
+                                session_store=get_session_store() if save_sessions else None,
+                                max_connections=max_connections, adaptive=adaptive, hedge=hedge,
+                                log=lambda message: print(f"[分片{shard + 1}] {message}" if shards > 1 else message))
+    try:
+        if runner.login_all():
+            end = None if seconds is None else time.monotonic() + seconds
+            asyncio.run(runner.grab(lambda: end is None or time.monotonic() < end))
+    except KeyboardInterrupt:
+        runner.stop()
+        print("已停止")
+    finally:
+        ocr_pool.shutdown(wait=False)
+    return runner.report()
+
+
+def merge_reports(reports):
+    """合并各分片的统计（吞吐按最长的分片耗时计算）"""
+    rows = [row for report in reports for row in report["accounts"]]
+    elapsed = max((report["summary"]["elapsed_s"] for report in reports), default=0.0)
+    login_s = max((report["login_s"] or 0.0 for report in reports), default=0.0)
+    return {"accounts": rows, "summary": summarize(rows, elapsed), "login_s": login_s}
+
+
+def print_report(report):
+    for row in report["accounts"]:
+        if row["error"] is not None:
+            print(f"{row['label']:<12} ✗ {row['error']}")
+            continue
+        first = f"{row['first_response_s']:.2f}s" if row["first_response_s"] is not None else "-"
+        print(f"{row['label']:<12} 选上 {row['selected']}/{row['courses']}  放弃 {row['dropped']}  "
+              f"请求 {row['submitted']:5d}  完成 {row['completed']:5d}  首个响应 {first}  登录 {row['login_s']:.2f}s")
+    summary = report["summary"]
+    fairness = f"{summary['fairness']:.3f}" if summary["fairness"] is not None else "-"
+    spread = (f"（最低 {summary['min_share']:.2f}，最高 {summary['max_share']:.2f} 倍平均值）"
+              if summary["min_share"] is not None else "")
+    print(f"账号 {summary['active']}/{summary['accounts']} 个可用，选上 {summary['selected']} 门，放弃 {summary['dropped']} 门；"
+          f"登录耗时 {report['login_s'] or 0:.2f} 秒，抢课 {summary['elapsed_s']:.2f} 秒")
+    print(f"吞吐 {summary['throughput']:.1f} 次/s，公平性 {fairness}{spread}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多账号无界面抢课")
+    parser.add_argument("accounts", help="账号文件（JSON）")
+    parser.add_argument("--shards", type=int, default=1, help="进程数，账号轮流分到各进程")
+    parser.add_argument("--seconds", type=float, default=None, help="抢课最长运行时间（秒）")
+    parser.add_argument("--connections", type=int, default=SHARED_CONNECTIONS, help="每个进程到每个系统的连接数")
+    parser.add_argument("--ocr-workers", type=int, default=None, help="每个进程的 OCR 进程数")
+    parser.add_argument("--no-adaptive", action="store_true", help="不自适应调整并发数与间隔")
+    parser.add_argument("--hedge", action="store_true", help="使用对冲请求")
+    parser.add_argument("--no-save-sessions", action="store_true", help="不保存、不恢复登录会话")
+    parser.add_argument("--output", help="把各账号的结果与统计写入该 JSON 文件")
+    args = parser.parse_args()
+
+    options = dict(seconds=args.seconds, max_connections=args.connections, ocr_workers=args.ocr_workers,
+                   adaptive=not args.no_adaptive, hedge=args.hedge, save_sessions=not args.no_save_sessions)
+    if args.shards <= 1:
+        report = run_accounts(args.accounts, **options)
+    else:
+        reports = []
+        with ProcessPoolExecutor(max_workers=args.shards) as executor:
+            futures = [executor.submit(run_accounts, args.accounts, shard, args.shards, **options)
+                       for shard in range(args.shards)]
+            for shard, future in enumerate(futures, 1):
+                # Ctrl+C 同样会让各分片停止抢课并返回统计，这里继续等待
+                while True:
+                    try:
+                        reports.append(future.result())
+                        break
+                    except KeyboardInterrupt:
+                        print("正在停止，等待各分片返回统计...")
+                    except Exception as e:
+                        print(f"分片{shard} 异常，统计中不含它的账号: {e}")
+                        break
+        report = merge_reports(reports)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 from PIL import Image, ImageDraw
+import numpy as np
 
+from collections import namedtuple
+from functools import lru_cache
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-import sys, os
+import sys, os, json, tempfile, threading, time
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import storage
 
 PROJECT_ROOT = str(Path(__file__).resolve().parent.parent)
 # --- 准备工作：创建用于存放调试结果的文件夹 ---
@@ -11,7 +17,52 @@ DEBUG_FOLDER = os.path.join(PROJECT_ROOT, "utils" , "debug_output")
 if not os.path.exists(DEBUG_FOLDER):
     os.makedirs(DEBUG_FOLDER)
 
+# 验证码二值化阈值
+BINARY_THRESHOLD = 94
+# 验证码字符数
+CAPTCHA_LENGTH = 4
+# 集成识别默认使用的 (二值化阈值, 清理方式) 组合；
+# 可以用 benchmarks/calibrate_thresholds.py 根据标注数据生成校准文件覆盖
+ENSEMBLE_SETTINGS = tuple((threshold, cleanup) for threshold in (80, BINARY_THRESHOLD, 110)
+                          for cleanup in (None, "despeckle"))
+CALIBRATION_FILE = os.path.join(PROJECT_ROOT, 'utils', 'ocr_calibration.json')
+
+TEMPLATE_DIR = os.path.join(PROJECT_ROOT, 'utils', 'templates')
+# 等待 OCR 进程池识别结果的最长时间（秒），超时（工作进程卡住）时改为在当前线程识别
+OCR_TIMEOUT = 10
+# 共享 OCR 进程池使用的预编译模板包，不存在或比模板目录旧时自动从模板目录重新生成
+TEMPLATE_BUNDLE = str(storage.cache_path("templates.npy"))
+
+# 堆叠后的模板：names 与 masks、black_counts 一一对应
+TemplateTensor = namedtuple('TemplateTensor', ['names', 'masks', 'black_counts'])
+# 单个字符的识别结果：最佳字符、其相似度、按相似度降序的前 k 个 (字符, 相似度)
+CharResult = namedtuple('CharResult', ['char', 'similarity', 'candidates'])
+# 整张验证码的识别结果：识别文本、整体置信度（各字符相似度的最小值）、每个字符的 CharResult
+CaptchaResult = namedtuple('CaptchaResult', ['text', 'confidence', 'chars'])
+
 # --- 1. 预处理 ---
+@lru_cache(maxsize=None)
+def _binary_table(threshold):
+    """灰度到二值的查找表：小于阈值为黑色(0)，否则为白色(1)"""
+    return [0 if i < threshold else 1 for i in range(256)]
+
+def binarize(img, threshold=BINARY_THRESHOLD):
+    """
+    灰度化并二值化，同时把第一行和第一列置为白色（验证码边框）
+
+    参数:
+        img: 任意模式的 PIL 图像
+        threshold: 二值化阈值
+
+    返回:
+        '1' 模式的二值图像
+    """
+    img_bin = img.convert('L').point(_binary_table(threshold), '1')
+    width, height = img_bin.size
+    img_bin.paste(1, (0, 0, width, 1))
+    img_bin.paste(1, (0, 0, 1, height))
+    return img_bin
+
 def preprocess_image(image_path, threshold=128, noise_reduction_strength=2, debug=True, save_debug_images=False):
     """
     对图像进行预处理，并保存中间步骤以便调试。
@@ -23,25 +74,7 @@ def preprocess_image(image_path, threshold=128, noise_reduction_strength=2, debu
         debug: 是否输出调试信息，默认True
         save_debug_images: 是否保存中间结果，默认False
     """
-    img = Image.open(image_path)
-    
-    # 步骤 1.1: 灰度化
-    img_gray = img.convert('L')
-    
-    # 步骤 1.2: 二值化
-    table = []
-    for i in range(256):
-        if i < threshold:
-            table.append(0)  # 黑色
-        else:
-            table.append(1)  # 白色
-    img_bin = img_gray.point(table, '1')
-    width, height = img_bin.size
-    img_data = img_bin.load()
-    for x in range(width):
-        for y in range(height):
-            if x == 0 or y == 0:
-                img_data[x, y] = 1
+    img_bin = binarize(Image.open(image_path), threshold)
                 
     # 【调试】保存二值化结果
     if save_debug_images:
@@ -52,7 +85,105 @@ def preprocess_image(image_path, threshold=128, noise_reduction_strength=2, debu
     return img_bin
 
 # --- 2. 字符分割 ---
-def segment_characters(img, debug=True, save_debug_images=False):
+def find_char_boundaries(vertical_projection, min_column_pixels=2):
+    """
+    根据垂直投影寻找字符的左右边界
+
+    参数:
+        vertical_projection: 每一列的黑色像素数
+        min_column_pixels: 一列至少有多少黑色像素才算字符区域，默认2（即 val > 1）
+
+    返回:
+        list: [(起始列, 结束列), ...]，结束列为开区间
+    """
+    in_char = np.concatenate(([False], np.asarray(vertical_projection) >= min_column_pixels, [False]))
+    # 相邻列从背景进入字符区域或从字符区域回到背景的位置
+    edges = np.flatnonzero(in_char[1:] != in_char[:-1])
+    return [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2])]
+
+def char_row_bounds(black, start, end):
+    """
+    用水平投影找出列区间内字符的上下边界（去掉上下空白），裁剪由调用方完成
+
+    参数:
+        black: 整张图的布尔数组，True 为黑色
+        start, end: 字符的起始列与结束列（开区间）
+
+    返回:
+        (上边界, 下边界) 行号，下边界为闭区间；没有足够内容时返回 (0, 高度 - 1)
+    """
+    # 计算水平投影(每一行的黑色像素数量)，找第一个与最后一个有内容的行
+    rows = np.flatnonzero(black[:, start:end].sum(axis=1) > 1)
+    if not len(rows):
+        return 0, black.shape[0] - 1
+    return int(rows[0]), int(rows[-1])
+
+def _save_projection_image(vertical_projection, size):
+    """【调试】可视化垂直投影图"""
+    width, height = size
+    proj_img = Image.new('RGB', (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(proj_img)
+    for x, val in enumerate(vertical_projection):
+        draw.line([(x, height), (x, height - val)], fill=(0, 0, 0))
+    proj_img.save(os.path.join(DEBUG_FOLDER, "debug_3_vertical_projection.png"))
+
+def _segment_mask(black, start, end):
+    """按列区间裁出字符并去掉上下空白，返回布尔数组（与 segment_characters 的裁剪方式一致）"""
+    top_boundary, bottom_boundary = char_row_bounds(black, start, end)
+    if bottom_boundary > top_boundary:
+        return black[top_boundary:bottom_boundary + 1, start:end]
+    return black[:, start:end]
+
+def recover_segments(black, boundaries, expected_count, bank, offset_range=3):
+    """
+    分割数量不符时修复分割结果：拆开粘连的字符，合并或丢弃过窄的碎片
+
+    每一步枚举所有可行的拆分（在模板字形宽度范围内的每个位置）或合并/丢弃方案，
+    用模板匹配给每个候选分割打分，选择各字符最佳相似度平均值最高的方案，
+    直到数量符合或没有可行方案为止。
+
+    参数:
+        black: 整张图的布尔数组，True 为黑色
+        boundaries: 初始分割边界 [(起始列, 结束列), ...]
+        expected_count: 期望的字符数量
+        bank: 用于打分的模板库
+        offset_range: 模板匹配的偏移范围
+
+    返回:
+        list: 修复后的分割边界
+    """
+    glyph_widths = bank.bboxes[:, 2].astype(int) - bank.bboxes[:, 0].astype(int)
+    min_width = max(1, int(glyph_widths.min(initial=1)))
+    max_width = int(glyph_widths.max(initial=1)) + offset_range
+    scores = {}
+
+    def score(segment):
+        if segment not in scores:
+            results = score_templates(_segment_mask(black, *segment), bank, offset_range)
+            scores[segment] = max((similarity for _, similarity, _ in results), default=0.0)
+        return scores[segment]
+
+    segments = list(boundaries)
+    while len(segments) != expected_count:
+        options = []
+        if len(segments) < expected_count:
+            # 拆分：两侧都至少有最窄字形的宽度
+            for i, (start, end) in enumerate(segments):
+                for x in range(start + min_width, end - min_width + 1):
+                    options.append(segments[:i] + [(start, x), (x, end)] + segments[i + 1:])
+        else:
+            # 合并相邻且合并后不超过最宽字形的碎片，或者丢弃一段噪点
+            for i in range(len(segments) - 1):
+                if segments[i + 1][1] - segments[i][0] <= max_width:
+                    options.append(segments[:i] + [(segments[i][0], segments[i + 1][1])] + segments[i + 2:])
+            for i in range(len(segments)):
+                options.append(segments[:i] + segments[i + 1:])
+        if not options:
+            break
+        segments = max(options, key=lambda option: sum(score(s) for s in option) / len(option))
+    return segments
+
+def segment_characters(img, debug=True, save_debug_images=False, expected_count=None, bank=None):
     """
     分割字符，并可视化垂直投影，保存每个切割出的字符。
     
@@ -60,80 +191,39 @@ def segment_characters(img, debug=True, save_debug_images=False):
         img: 预处理后的图像
         debug: 是否输出调试信息，默认True
         save_debug_images: 是否保存中间结果，默认False
+        expected_count: 期望的字符数量，给出时数量不符会尝试修复分割（见 recover_segments）
+        bank: 修复分割时用于打分的模板库，默认使用共享模板库
     """
     width, height = img.size
-    pixels = img.load()
+    black = image_to_mask(img)
     
     # 步骤 2.1: 计算垂直投影
-    vertical_projection = [0] * width
-    for x in range(width):
-        for y in range(height):
-            if pixels[x, y] == 0:
-                vertical_projection[x] += 1
-                
-    # 【调试】可视化垂直投影图
-    proj_img = Image.new('RGB', (width, height), (255, 255, 255))
-    draw = ImageDraw.Draw(proj_img)
-    for x, val in enumerate(vertical_projection):
-        draw.line([(x, height), (x, height - val)], fill=(0, 0, 0))
+    vertical_projection = black.sum(axis=0)
     if save_debug_images:
-        proj_img.save(os.path.join(DEBUG_FOLDER, "debug_3_vertical_projection.png"))
+        _save_projection_image(vertical_projection.tolist(), (width, height))
     if debug:
         print(f" 垂直投影完成" + (" → debug_3_vertical_projection.png" if save_debug_images else ""))
 
-    # 步骤 2.2: 寻找边界并切割
-    in_char = False
-    char_boundaries = []
-    start_x = 0
-    for x, val in enumerate(vertical_projection):
-        # 从背景进入字符区域：检测到黑色像素(val > 1)
-        if val > 1 and not in_char:
-            in_char = True
-            start_x = x  # 记录字符起始位置
-        # 从字符区域回到背景：检测到空白列(val <= 1)
-        elif val <= 1 and in_char:
-            in_char = False
-            end_x = x
-            char_boundaries.append((start_x, end_x))  # 保存字符边界
-    # 处理边界情况：如果图像末尾还在字符内
-    if in_char:
-        char_boundaries.append((start_x, width))
+    # 步骤 2.2: 寻找边界，数量不符时修复
+    boundaries = find_char_boundaries(vertical_projection)
+    if expected_count and len(boundaries) != expected_count:
+        if bank is None:
+            bank = get_template_bank()
+        if bank:
+            recovered = recover_segments(black, boundaries, expected_count, bank)
+            if debug:
+                print(f" 分割出{len(boundaries)}个字符，与期望的{expected_count}个不符，修复后为{len(recovered)}个")
+            boundaries = recovered
 
+    # 步骤 2.3: 切割
     char_images = []
-    for i, (start, end) in enumerate(char_boundaries):
-        box = (start, 0, end, height)
-        char_img = img.crop(box)
-        
-        # 使用水平投影消除上下位置差异
-        char_width, char_height = char_img.size
-        char_pixels = char_img.load()
-        
-        # 计算水平投影(每一行的黑色像素数量)
-        horizontal_projection = [0] * char_height
-        for y in range(char_height):
-            for x in range(char_width):
-                if char_pixels[x, y] == 0:  # 黑色像素
-                    horizontal_projection[y] += 1
-        
-        # 找到字符的上下边界
-        top_boundary = 0
-        bottom_boundary = char_height - 1
+    for i, (start, end) in enumerate(boundaries):
+        char_img = img.crop((start, 0, end, height))
         
-        # 从上往下找第一个有内容的行
-        for y in range(char_height):
-            if horizontal_projection[y] > 1:
-                top_boundary = y
-                break
-        
-        # 从下往上找最后一个有内容的行
-        for y in range(char_height - 1, -1, -1):
-            if horizontal_projection[y] > 1:
-                bottom_boundary = y
-                break
-        
-        # 裁剪掉上下空白区域
+        # 使用水平投影消除上下位置差异，裁剪掉上下空白区域
+        top_boundary, bottom_boundary = char_row_bounds(black, start, end)
         if bottom_boundary > top_boundary:
-            char_img = char_img.crop((0, top_boundary, char_width, bottom_boundary + 1))
+            char_img = char_img.crop((0, top_boundary, end - start, bottom_boundary + 1))
         
         char_images.append(char_img)
         # 【调试】保存每个切割出的字符（保持二值模式）
@@ -145,7 +235,7 @@ def segment_characters(img, debug=True, save_debug_images=False):
     return char_images
 
 # --- 3. 字符识别 (增加详细log) ---
-def load_templates(template_dir=os.path.join(PROJECT_ROOT, 'utils', 'templates')):
+def load_templates(template_dir=TEMPLATE_DIR):
     """加载模板字符库"""
     # 初始化空字典，用于存储模板图像
     templates = {}
@@ -166,119 +256,314 @@ def load_templates(template_dir=os.path.join(PROJECT_ROOT, 'utils', 'templates')
     # 返回包含所有模板的字典
     return templates
 
-def recognize_character(char_img, templates, offset_range=3, debug=True):
+def image_to_mask(img):
+    """把图像转换为布尔数组（行优先，形状为 高×宽），True 表示黑色像素"""
+    return np.asarray(img) == 0
+
+def stack_templates(templates):
     """
-    识别单个字符图像，通过滑动窗口与模板库中的字符进行像素级比较
-    
+    把模板字典堆叠成一个三维张量，供向量化匹配使用
+
     参数:
-        char_img: 待识别的字符图像(PIL Image对象)
         templates: 模板字符库字典，键为字符名，值为模板图像
+
+    返回:
+        TemplateTensor: names 为字符名列表，masks 为 (模板数, 最大高, 最大宽) 的布尔张量
+        （尺寸不足的模板在右下方补白），black_counts 为每个模板的黑色像素数
+    """
+    names = list(templates.keys())
+    masks = [image_to_mask(img) for img in templates.values()]
+    max_height = max((m.shape[0] for m in masks), default=0)
+    max_width = max((m.shape[1] for m in masks), default=0)
+    stacked = np.zeros((len(masks), max_height, max_width), dtype=bool)
+    for i, mask in enumerate(masks):
+        stacked[i, :mask.shape[0], :mask.shape[1]] = mask
+    return TemplateTensor(names, stacked, stacked.sum(axis=(1, 2)))
+
+def _template_dir_signature(template_dir):
+    """模板目录的指纹：每个 PNG 的文件名、修改时间和大小"""
+    signature = []
+    for filename in sorted(os.listdir(template_dir)):
+        if filename.endswith('.png'):
+            stat = os.stat(os.path.join(template_dir, filename))
+            signature.append((filename, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def _template_dir_mtime(template_dir, signature):
+    """模板目录最后一次变化的时间（ns）：目录本身（增删文件）与各 PNG 修改时间的最大值"""
+    return max([os.stat(template_dir).st_mtime_ns] + [mtime for _, mtime, _ in signature])
+
+class TemplateBank:
+    """
+    预编译的模板库：模板只加载、二值化一次，并缓存每个模板的位图、尺寸、黑色像素数和外接框。
+
+    可以从模板目录构建，也可以保存为单个 .npy 预编译包（位图按位打包），
+    加载预编译包不需要 PIL 解码 PNG。模板按字符名排序，相似度并列时取字符名靠前的模板。
+    """
+
+    def __init__(self, names, masks, sizes, black_counts, bboxes, template_dir=None, signature=None):
+        self.names = list(names)
+        self.masks = masks                # (模板数, 最大高, 最大宽) 布尔张量，True 为黑色
+        self.sizes = sizes                # 每个模板的 (宽, 高)
+        self.black_counts = black_counts  # 每个模板的黑色像素数
+        self.bboxes = bboxes              # 每个模板黑色像素的外接框 (左, 上, 右, 下)，右下为开区间
+        self.template_dir = template_dir
+        self.signature = signature
+        self.tensor = TemplateTensor(self.names, masks, black_counts)
+        self._templates = None
+
+    @classmethod
+    def from_directory(cls, template_dir=TEMPLATE_DIR):
+        """从模板目录加载，目录不存在时返回 None"""
+        if not os.path.exists(template_dir):
+            return None
+        signature = _template_dir_signature(template_dir)
+        templates = load_templates(template_dir)
+        # 按字符名排序，保证不同机器、预编译包之间模板顺序一致
+        templates = {name: templates[name] for name in sorted(templates)}
+        tensor = stack_templates(templates)
+        sizes = np.array([img.size for img in templates.values()], dtype=np.uint16).reshape(-1, 2)
+        bboxes = np.array([_mask_bbox(mask) for mask in tensor.masks], dtype=np.uint16).reshape(-1, 4)
+        return cls(tensor.names, tensor.masks, sizes, tensor.black_counts, bboxes,
+                   template_dir=template_dir, signature=signature)
+
+    @classmethod
+    def from_bundle(cls, bundle_path, template_dir=TEMPLATE_DIR):
+        """
+        优先加载预编译包；预编译包不存在、无法读取或比模板目录旧时，从模板目录加载并重新生成预编译包
+
+        返回:
+            TemplateBank，预编译包与模板目录都不可用时返回 None
+        """
+        signature = _template_dir_signature(template_dir) if os.path.exists(template_dir) else None
+        if os.path.exists(bundle_path) and (
+                signature is None or os.stat(bundle_path).st_mtime_ns >= _template_dir_mtime(template_dir, signature)):
+            try:
+                bank = cls.load(bundle_path)
+                if signature is not None:
+                    bank.template_dir, bank.signature = template_dir, signature
+                return bank
+            except (OSError, ValueError) as e:
+                print(f"预编译模板包无法读取（{e}），从模板目录重新生成")
+        bank = cls.from_directory(template_dir)
+        if bank is not None:
+            try:
+                bank.save(bundle_path)
+            except OSError as e:
+                print(f"保存预编译模板包失败: {e}")
+        return bank
+
+    @classmethod
+    def load(cls, path):
+        """加载 save 生成的预编译包（只有几 KB，直接整个读入后解包）"""
+        records = np.load(path)
+        max_height = int(records['height'].max(initial=0))
+        max_width = int(records['width'].max(initial=0))
+        bits = np.unpackbits(records['bits'], axis=1, count=max_height * max_width)
+        masks = bits.astype(bool).reshape(len(records), max_height, max_width)
+        sizes = np.stack([records['width'], records['height']], axis=1)
+        return cls([str(name) for name in records['name']], masks, sizes,
+                   np.array(records['black']), np.array(records['bbox']))
+
+    def save(self, path):
+        """保存为单个 .npy 预编译包（结构化数组，每个模板一条记录），先写临时文件再原子替换"""
+        packed = np.packbits(self.masks.reshape(len(self.names), -1), axis=1)
+        dtype = [('name', 'U16'), ('width', '<u2'), ('height', '<u2'), ('black', '<u4'),
+                 ('bbox', '<u2', (4,)), ('bits', 'u1', (packed.shape[1],))]
+        records = np.zeros(len(self.names), dtype=dtype)
+        records['name'] = self.names
+        records['width'] = self.sizes[:, 0]
+        records['height'] = self.sizes[:, 1]
+        records['black'] = self.black_counts
+        records['bbox'] = self.bboxes
+        records['bits'] = packed
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, records)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def is_stale(self):
+        """模板目录自加载后是否发生过变化（单独加载的预编译包永不过期）"""
+        if self.template_dir is None:
+            return False
+        if not os.path.exists(self.template_dir):
+            return True
+        return _template_dir_signature(self.template_dir) != self.signature
+
+    @property
+    def templates(self):
+        """兼容旧接口的模板字典，值为二值 PIL 图像"""
+        if self._templates is None:
+            self._templates = {
+                name: Image.fromarray(~self.masks[i, :height, :width])
+                for i, (name, (width, height)) in enumerate(zip(self.names, self.sizes.tolist()))
+            }
+        return self._templates
+
+    def __len__(self):
+        return len(self.names)
+
+def _mask_bbox(mask):
+    """布尔位图中黑色像素的外接框 (左, 上, 右, 下)，没有黑色像素时为全 0"""
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if not len(rows):
+        return (0, 0, 0, 0)
+    return (cols[0], rows[0], cols[-1] + 1, rows[-1] + 1)
+
+_template_banks = {}
+_template_banks_lock = threading.Lock()
+
+def get_template_bank(template_dir=TEMPLATE_DIR, bundle_path=None, reload=False):
+    """
+    获取进程内共享的模板库；加载后识别验证码不再访问文件系统
+
+    参数:
+        template_dir: 模板目录
+        bundle_path: 预编译包路径，给出时优先加载预编译包（见 TemplateBank.from_bundle）
+        reload: 为 True 时检查模板目录是否变化，变化时重新加载
+
+    返回:
+        TemplateBank，模板目录不存在时返回 None
+    """
+    key = (template_dir, bundle_path)
+    with _template_banks_lock:
+        bank = _template_banks.get(key)
+        if bank is not None:
+            if not (reload and bank.is_stale()):
+                return bank
+            print("检测到模板目录变化，重新加载模板库")
+        bank = TemplateBank.from_bundle(bundle_path, template_dir) if bundle_path else TemplateBank.from_directory(template_dir)
+        if bank is not None:
+            _template_banks[key] = bank
+        return bank
+
+def _as_template_tensor(templates):
+    """把模板字典、TemplateBank 或 TemplateTensor 统一为 TemplateTensor"""
+    if isinstance(templates, TemplateTensor):
+        return templates
+    if isinstance(templates, TemplateBank):
+        return templates.tensor
+    return stack_templates(templates)
+
+def score_templates(char_img, templates, offset_range=3):
+    """
+    计算待识别字符与每个模板在所有偏移下的最佳相似度
+
+    把字符四周补白后取出全部 (2r+1)² 个滑动窗口，与堆叠后的模板张量做一次张量积，
+    一次性得到所有模板、所有偏移的黑色重合像素数；相似度与逐像素比较的结果完全一致。
+
+    参数:
+        char_img: 待识别的字符图像(PIL Image对象或布尔数组)
+        templates: 模板字典、TemplateBank 或 stack_templates 的返回值
         offset_range: 允许的上下左右偏移范围，默认为3像素
+
+    返回:
+        list: 按模板顺序排列的 (字符名, 最佳相似度, 最佳偏移(dx, dy))
+    """
+    templates = _as_template_tensor(templates)
+    if not templates.names:
+        return []
+
+    char_mask = char_img if isinstance(char_img, np.ndarray) else image_to_mask(char_img)
+    char_height, char_width = char_mask.shape
+    count, template_height, template_width = templates.masks.shape
+    span = 2 * offset_range + 1
+
+    # 字符四周补 offset_range 像素；超出任何偏移下模板覆盖范围的部分不影响结果，直接截掉
+    padded = np.zeros((template_height + 2 * offset_range, template_width + 2 * offset_range), dtype=np.float32)
+    clipped = char_mask[:template_height + offset_range, :template_width + offset_range]
+    padded[offset_range:offset_range + clipped.shape[0], offset_range:offset_range + clipped.shape[1]] = clipped
+    # windows[dx, dy] 即模板偏移 (dx - r, dy - r) 时覆盖到的字符区域；
+    # 按先 dx 后 dy 的顺序展开，与逐像素实现的遍历顺序一致，保证并列时取到相同偏移
+    row_stride, column_stride = padded.strides
+    windows = np.ndarray((span, span, template_height, template_width), dtype=padded.dtype, buffer=padded,
+                         strides=(column_stride, row_stride, row_stride, column_stride))
+    windows = windows.reshape(span * span, -1)
+    overlap = templates.masks.reshape(count, -1).astype(np.float32) @ windows.T
+
+    # 模板与字符的黑色像素数固定时相似度随重合数严格递增，取重合数最大的偏移即可
+    best_index = overlap.argmax(axis=1)
+    best_overlap = overlap[np.arange(count), best_index]
+
+    # 与逐像素实现使用相同的浮点运算，结果逐位一致
+    char_black_count = int(char_mask.sum())
+    results = []
+    for name, index, overlap_black_count, template_black_count in zip(
+            templates.names, best_index.tolist(), best_overlap.tolist(), templates.black_counts.tolist()):
+        template_ratio = overlap_black_count / template_black_count if template_black_count > 0 else 0.0
+        char_ratio = overlap_black_count / char_black_count if char_black_count > 0 else 0.0
+        if template_ratio + char_ratio > 0:
+            similarity = 2 * template_ratio * char_ratio / (template_ratio + char_ratio)
+            best_offset = (index // span - offset_range, index % span - offset_range)
+        else:
+            similarity = 0.0
+            best_offset = (0, 0)
+        results.append((name, similarity, best_offset))
+    return results
+
+def recognize_character_detailed(char_img, templates, offset_range=3, top_k=3, debug=True):
+    """
+    识别单个字符图像，并给出相似度最高的若干候选字符
+
+    参数:
+        char_img: 待识别的字符图像(PIL Image对象)
+        templates: 模板字符库字典、TemplateBank 或 stack_templates 预先堆叠好的模板张量
+        offset_range: 允许的上下左右偏移范围，默认为3像素
+        top_k: 保留的候选字符数量
         debug: 是否输出调试信息，默认True
-    
+
     返回:
-        best_match: 最匹配的字符名称(字符串)
+        CharResult: char 为最匹配的字符（相似度全为 0 时为 '?'），similarity 为其相似度，
+        candidates 为按相似度降序排列的前 top_k 个 (字符, 相似度)
     """
-    # 获取待识别字符的尺寸和像素数据
-    char_width, char_height = char_img.size
-    char_pixels = char_img.load()
+    match_results = score_templates(char_img, templates, offset_range)
     
-    # 初始化最大相似度为0，用于记录最佳匹配的相似度
+    # 相似度全为 0 时返回 '?'，并列时取模板顺序中靠前的字符
     max_similarity = 0.0
-    # 初始化最佳匹配字符为'?'，表示未识别或无匹配结果
     best_match = '?'
-    
-    # 存储所有模板的匹配结果，用于调试输出
-    match_results = []
-    
-    # 遍历模板库中的每个字符模板
-    for char_name, template_img in templates.items():
-        # 获取模板图像的尺寸和像素数据
-        template_width, template_height = template_img.size
-        template_pixels = template_img.load()
-        
-        # 对当前模板尝试不同的偏移位置
-        best_offset_similarity = 0.0
-        best_offset = (0, 0)
-        
-        # 计算模板的黑色像素总数
-        template_black_count = 0
-        for x in range(template_width):
-            for y in range(template_height):
-                if template_pixels[x, y] == 0:  # 黑色像素
-                    template_black_count += 1
-        
-        # 计算待识别字符的黑色像素总数
-        char_black_count = 0
-        for x in range(char_width):
-            for y in range(char_height):
-                if char_pixels[x, y] == 0:  # 黑色像素
-                    char_black_count += 1
-        
-        # 遍历所有可能的偏移量
-        for offset_x in range(-offset_range, offset_range + 1):
-            for offset_y in range(-offset_range, offset_range + 1):
-                # 计算黑色部分重合的像素数量
-                overlap_black_count = 0
-                
-                # 遍历模板的每个像素
-                for template_x in range(template_width):
-                    for template_y in range(template_height):
-                        # 如果模板这个位置是黑色像素
-                        if template_pixels[template_x, template_y] == 0:
-                            # 计算对应在待识别字符上的位置
-                            char_x = template_x + offset_x
-                            char_y = template_y + offset_y
-                            
-                            # 检查是否在待识别字符的范围内
-                            if 0 <= char_x < char_width and 0 <= char_y < char_height:
-                                # 如果待识别字符这个位置也是黑色，则重合
-                                if char_pixels[char_x, char_y] == 0:
-                                    overlap_black_count += 1
-                
-                # 计算相似度：黑色重合像素占模板黑色像素的比例
-                if template_black_count > 0:
-                    template_ratio = overlap_black_count / template_black_count
-                else:
-                    template_ratio = 0.0
-                
-                # 计算相似度：黑色重合像素占待识别字符黑色像素的比例
-                if char_black_count > 0:
-                    char_ratio = overlap_black_count / char_black_count
-                else:
-                    char_ratio = 0.0
-                
-                # 使用调和平均数作为相似度（比算术平均更严格）
-                if template_ratio + char_ratio > 0:
-                    similarity = 2 * template_ratio * char_ratio / (template_ratio + char_ratio)
-                else:
-                    similarity = 0.0
-                
-                # 更新该模板的最佳偏移
-                if similarity > best_offset_similarity:
-                    best_offset_similarity = similarity
-                    best_offset = (offset_x, offset_y)
-        
-        # 记录匹配结果
-        match_results.append((char_name, best_offset_similarity, best_offset))
-        
-        # 如果当前模板的相似度大于全局最大相似度，则更新最佳匹配
-        if best_offset_similarity > max_similarity:
-            max_similarity = best_offset_similarity
+    for char_name, similarity, _ in match_results:
+        if similarity > max_similarity:
+            max_similarity = similarity
             best_match = char_name
     
-    # 【调试】输出紧凑的匹配结果
+    # 按相似度降序排序（稳定排序，并列时保持模板顺序）
+    sorted_results = sorted(match_results, key=lambda x: x[1], reverse=True)
+    candidates = [(name, sim) for name, sim, _ in sorted_results[:max(top_k, 1)]]
+    
+    # 【调试】输出紧凑的匹配结果，只显示前3个
     if debug:
-        # 按相似度降序排序，只显示前3个
-        sorted_results = sorted(match_results, key=lambda x: x[1], reverse=True)[:3]
-        results_str = " | ".join([f"{name}:{sim:.3f}" for name, sim, _ in sorted_results])
+        results_str = " | ".join([f"{name}:{sim:.3f}" for name, sim, _ in sorted_results[:3]])
         print(f"  [{results_str}] → '{best_match}'")
     
-    # 返回识别结果
-    return best_match
+    return CharResult(best_match, max_similarity, candidates)
+
+def recognize_character(char_img, templates, offset_range=3, debug=True):
+    """
+    识别单个字符图像，通过滑动窗口与模板库中的字符进行像素级比较
+    
+    参数:
+        char_img: 待识别的字符图像(PIL Image对象)
+        templates: 模板字符库字典、TemplateBank 或 stack_templates 预先堆叠好的模板张量
+        offset_range: 允许的上下左右偏移范围，默认为3像素
+        debug: 是否输出调试信息，默认True
+    
+    返回:
+        best_match: 最匹配的字符名称(字符串)
+    """
+    return recognize_character_detailed(char_img, templates, offset_range, top_k=1, debug=debug).char
 
 # --- 4. 对外接口 ---
-def classify(image_bytes, debug=True, save_debug_images=False):
+def classify(image_bytes, debug=True, save_debug_images=False, bank=None):
     """
     识别验证码图片（从字节流输入）
     
@@ -286,44 +571,46 @@ def classify(image_bytes, debug=True, save_debug_images=False):
         image_bytes: 图片字节流（可以是从网络请求获取的内容）
         debug: 是否输出调试信息，默认True
         save_debug_images: 是否保存中间结果，默认False
+        bank: 使用的模板库，默认使用进程内共享的模板库
     
     返回:
         识别出的验证码字符串
     """
+    result = classify_detailed(image_bytes, debug=debug, save_debug_images=save_debug_images, bank=bank)
+    return result.text if result else None
+
+def classify_detailed(image_bytes, debug=True, save_debug_images=False, bank=None, top_k=3,
+                      threshold=BINARY_THRESHOLD):
+    """
+    识别验证码图片，并给出每个字符的候选与整体置信度
+
+    参数:
+        image_bytes: 图片字节流（可以是从网络请求获取的内容）
+        debug: 是否输出调试信息，默认True
+        save_debug_images: 是否保存中间结果，默认False
+        bank: 使用的模板库，默认使用进程内共享的模板库
+        top_k: 每个字符保留的候选数量
+        threshold: 二值化阈值
+
+    返回:
+        CaptchaResult，模板库不可用时返回 None
+    """
     import io
     
     if debug:
         print("="*50)
         print("开始识别验证码")
     
-    # 0. 加载模板
-    templates = load_templates()
-    if not templates:
+    # 0. 获取模板库（进程内只加载一次）
+    if bank is None:
+        bank = get_template_bank()
+    if not bank:
         if debug:
             print("❌ 错误：模板文件夹为空或不存在")
         return None
 
-    # 1. 预处理
-    BINARY_THRESHOLD = 94
-    # 1. 从字节流加载图像
-    img = Image.open(io.BytesIO(image_bytes))
-    # 步骤 1.1: 灰度化
-    img_gray = img.convert('L')
-
-    # 步骤 1.2: 二值化
-    table = []
-    for i in range(256):
-        if i < BINARY_THRESHOLD:
-            table.append(0)  # 黑色
-        else:
-            table.append(1)  # 白色
-    img_bin = img_gray.point(table, '1')
-    width, height = img_bin.size
-    img_data = img_bin.load()
-    for x in range(width):
-        for y in range(height):
-            if x == 0 or y == 0:
-                img_data[x, y] = 1
+    # 1. 预处理：从字节流加载图像，灰度化并二值化
+    img_bin = binarize(Image.open(io.BytesIO(image_bytes)), threshold)
                 
     # 【调试】保存二值化结果
     if save_debug_images:
@@ -331,24 +618,312 @@ def classify(image_bytes, debug=True, save_debug_images=False):
     if debug:
         print(f" 二值化完成" + (" → debug_2_binarized_bytes.png" if save_debug_images else ""))
     
+    result = decode_binarized(img_bin, bank, top_k=top_k, debug=debug, save_debug_images=save_debug_images)
+    
+    if debug:
+        print(f" 识别完成：{result.text}（置信度 {result.confidence:.3f}）")
+        print("="*50)
+        
+    return result
+
+def decode_binarized(img_bin, bank, top_k=3, debug=False, save_debug_images=False):
+    """
+    对二值化后的验证码分割并识别字符
+
+    参数:
+        img_bin: 二值图像
+        bank: 使用的模板库
+        top_k: 每个字符保留的候选数量
+        debug: 是否输出调试信息
+        save_debug_images: 是否保存中间结果
+
+    返回:
+        CaptchaResult
+    """
     # 2. 分割字符
-    char_images = segment_characters(img_bin, debug=debug, save_debug_images=save_debug_images)
+    char_images = segment_characters(img_bin, debug=debug, save_debug_images=save_debug_images,
+                                     expected_count=CAPTCHA_LENGTH, bank=bank)
     
     # 3. 识别字符
     if debug:
         print(f" 开始识别{len(char_images)}个字符：")
-    result = ""
+    chars = []
     for i, char_img in enumerate(char_images):
         if debug:
             print(f"  字符{i+1}:", end=" ")
-        recognized_char = recognize_character(char_img, templates, debug=debug)
-        result += recognized_char
-    
+        chars.append(recognize_character_detailed(char_img, bank, top_k=top_k, debug=debug))
+    return _captcha_result(chars)
+
+def _captcha_result(chars):
+    return CaptchaResult(
+        "".join(char.char for char in chars),
+        # 整体置信度取决于最不确定的字符
+        min((char.similarity for char in chars), default=0.0),
+        chars,
+    )
+
+# --- 4.1 多阈值集成识别 ---
+def despeckle(img_bin):
+    """去掉八邻域内没有其他黑色像素的孤立噪点"""
+    black = image_to_mask(img_bin)
+    padded = np.pad(black, 1)
+    height, width = black.shape
+    neighbors = np.zeros(black.shape, dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy != 1 or dx != 1:
+                neighbors += padded[dy:dy + height, dx:dx + width]
+    return Image.fromarray(~(black & (neighbors > 0)))
+
+# 集成识别可选的二值化后清理步骤，None 表示不清理
+CLEANUPS = {
+    None: lambda img_bin: img_bin,
+    "despeckle": despeckle,
+}
+
+_ensemble_config = None
+
+def get_ensemble_config():
+    """
+    集成识别使用的 (阈值, 清理方式) 组合与投票方式
+
+    优先读取校准文件（只读一次），否则使用 ENSEMBLE_SETTINGS 和置信度投票
+    """
+    global _ensemble_config
+    if _ensemble_config is None:
+        config = (ENSEMBLE_SETTINGS, "confidence")
+        if os.path.exists(CALIBRATION_FILE):
+            try:
+                with open(CALIBRATION_FILE, 'r', encoding='utf-8') as f:
+                    calibration = json.load(f)
+                settings = tuple((int(threshold), cleanup) for threshold, cleanup in calibration["settings"])
+                config = (settings, calibration.get("vote", "confidence"))
+            except Exception as e:
+                print(f"读取阈值校准文件失败: {e}，使用默认阈值")
+        _ensemble_config = config
+    return _ensemble_config
+
+def vote_hypotheses(hypotheses, vote="confidence", top_k=3):
+    """
+    从多个识别结果中选出最终结果
+
+    参数:
+        hypotheses: CaptchaResult 列表
+        vote: "confidence" 选择整体置信度最高的结果；
+              "char" 在字符数正确的结果间逐位投票，按候选相似度累加
+        top_k: 逐位投票时每个字符保留的候选数量
+
+    返回:
+        CaptchaResult，hypotheses 为空时返回 None
+    """
+    if not hypotheses:
+        return None
+    # 字符数正确的结果优先
+    complete = [h for h in hypotheses if len(h.text) == CAPTCHA_LENGTH] or hypotheses
+    if vote != "char" or len(complete[0].chars) != CAPTCHA_LENGTH:
+        return max(complete, key=lambda h: h.confidence)
+    chars = []
+    for position in range(CAPTCHA_LENGTH):
+        totals = {}
+        for hypothesis in complete:
+            for char, similarity in hypothesis.chars[position].candidates:
+                totals[char] = totals.get(char, 0.0) + similarity
+        ranked = sorted(((char, total / len(complete)) for char, total in totals.items()),
+                        key=lambda x: x[1], reverse=True)
+        chars.append(CharResult(ranked[0][0], ranked[0][1], ranked[:max(top_k, 1)]))
+    return _captcha_result(chars)
+
+def classify_hypotheses(image_bytes, settings, bank, top_k=3):
+    """按每个 (阈值, 清理方式) 组合分别识别，返回与 settings 一一对应的 CaptchaResult 列表"""
+    import io
+
+    img_gray = Image.open(io.BytesIO(image_bytes)).convert('L')
+    binarized = {}
+    hypotheses = []
+    for threshold, cleanup in settings:
+        if threshold not in binarized:
+            binarized[threshold] = binarize(img_gray, threshold)
+        hypotheses.append(decode_binarized(CLEANUPS[cleanup](binarized[threshold]), bank, top_k=top_k))
+    return hypotheses
+
+def classify_ensemble(image_bytes, settings=None, vote=None, bank=None, top_k=3, debug=False):
+    """
+    用多个二值化阈值及清理方式分别识别同一张验证码，再投票选出最终结果
+
+    多花十几毫秒 CPU，换来更少的验证码重新获取与登录请求。
+
+    参数:
+        image_bytes: 图片字节流
+        settings: (二值化阈值, 清理方式) 列表，清理方式取值为 CLEANUPS 的键
+        vote: 投票方式，见 vote_hypotheses
+              settings 与 vote 默认使用 get_ensemble_config()
+        bank: 使用的模板库，默认使用进程内共享的模板库
+        top_k: 每个字符保留的候选数量
+        debug: 是否输出每个假设的识别结果
+
+    返回:
+        CaptchaResult，模板库不可用时返回 None
+    """
+    if bank is None:
+        bank = get_template_bank()
+    if not bank:
+        return None
+    default_settings, default_vote = get_ensemble_config()
+    settings = default_settings if settings is None else settings
+    vote = default_vote if vote is None else vote
+
+    hypotheses = classify_hypotheses(image_bytes, settings, bank, top_k)
     if debug:
-        print(f" 识别完成：{result}")
-        print("="*50)
-        
+        for (threshold, cleanup), hypothesis in zip(settings, hypotheses):
+            print(f" 阈值 {threshold} 清理 {cleanup}: {hypothesis.text}（置信度 {hypothesis.confidence:.3f}）")
+    result = vote_hypotheses(hypotheses, vote, top_k)
+    if debug:
+        print(f" 集成识别结果：{result.text}（置信度 {result.confidence:.3f}）")
     return result
+
+def classify_batch(images, pool=None, debug=False, detailed=False, ensemble=False):
+    """
+    批量识别验证码，在 OCR 进程池中并行执行
+
+    参数:
+        images: 图片字节流列表
+        pool: 使用的 OcrPool，默认使用进程内共享的进程池
+        debug: 是否在工作进程中输出调试信息，默认False
+        detailed: 为 True 时返回 CaptchaResult 而不是字符串
+        ensemble: 为 True 时使用 classify_ensemble（结果为 CaptchaResult）
+
+    返回:
+        与输入顺序一致的识别结果列表
+    """
+    if pool is None:
+        pool = get_ocr_pool()
+    return pool.map(images, debug=debug, detailed=detailed, ensemble=ensemble)
+
+# --- 5. 多进程识别 ---
+# 工作进程使用的模板库参数，由 _init_ocr_worker 设置
+_worker_bank_args = (TEMPLATE_DIR, None)
+
+def _init_ocr_worker(template_dir, bundle_path):
+    """工作进程初始化：预先加载模板库，之后的识别不再触碰文件系统"""
+    global _worker_bank_args
+    _worker_bank_args = (template_dir, bundle_path)
+    get_template_bank(template_dir, bundle_path)
+
+def _classify_in_worker(image_bytes, debug=False, detailed=False, ensemble=False):
+    return _classify_inline(image_bytes, debug, detailed, ensemble, get_template_bank(*_worker_bank_args))
+
+def _classify_inline(image_bytes, debug=False, detailed=False, ensemble=False, bank=None):
+    if ensemble:
+        return classify_ensemble(image_bytes, bank=bank, debug=debug)
+    if detailed:
+        return classify_detailed(image_bytes, debug=debug, bank=bank)
+    return classify(image_bytes, debug=debug, bank=bank)
+
+def _ping_worker():
+    return os.getpid()
+
+class OcrPool:
+    """
+    长期存活的 OCR 进程池
+
+    识别是纯 CPU 计算，放到独立进程中执行不会占用调用线程的 GIL，
+    登录线程在等待识别结果时其他抢课线程可以照常收发网络请求。
+    """
+
+    def __init__(self, max_workers=None, template_dir=TEMPLATE_DIR, bundle_path=None):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.template_dir = template_dir
+        self.bundle_path = bundle_path
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_init_ocr_worker,
+                    initargs=(self.template_dir, self.bundle_path),
+                )
+            return self._executor
+
+    def warm_up(self):
+        """提前启动所有工作进程并加载模板库"""
+        executor = self._get_executor()
+        for future in [executor.submit(_ping_worker) for _ in range(self.max_workers)]:
+            future.result()
+
+    def submit(self, image_bytes, debug=False, detailed=False, ensemble=False):
+        """提交一张验证码，返回 Future"""
+        return self._get_executor().submit(_classify_in_worker, image_bytes, debug, detailed, ensemble)
+
+    def classify(self, image_bytes, debug=False, detailed=False, ensemble=False, timeout=OCR_TIMEOUT):
+        """识别一张验证码；进程池不可用或 timeout 秒内没有结果时退回当前线程识别"""
+        try:
+            return self.submit(image_bytes, debug, detailed, ensemble).result(timeout)
+        except (BrokenProcessPool, TimeoutError) as e:
+            self._recover(e)
+            return self._classify_here(image_bytes, debug, detailed, ensemble)
+
+    def map(self, images, debug=False, detailed=False, ensemble=False, timeout=OCR_TIMEOUT):
+        """批量识别，返回与输入顺序一致的结果列表；提交失败或整批 timeout 秒内没有结果的图片在当前线程识别"""
+        futures = []
+        recovered = False
+        try:
+            for image_bytes in images:
+                futures.append(self.submit(image_bytes, debug, detailed, ensemble))
+        except BrokenProcessPool as e:
+            self._recover(e)
+            recovered = True
+        deadline = time.monotonic() + timeout
+        results = []
+        for i, image_bytes in enumerate(images):
+            if i < len(futures) and not recovered:
+                try:
+                    results.append(futures[i].result(max(0.0, deadline - time.monotonic())))
+                    continue
+                except (BrokenProcessPool, TimeoutError, CancelledError) as e:
+                    # 重建进程池会取消其余的 Future，它们也在当前线程识别
+                    self._recover(e)
+                    recovered = True
+            results.append(self._classify_here(image_bytes, debug, detailed, ensemble))
+        return results
+
+    def _recover(self, error):
+        """进程池异常或超时：丢弃当前进程池（之后的识别使用新建的工作进程）"""
+        if isinstance(error, TimeoutError):
+            print("OCR 进程池识别超时，改为在当前线程识别并重建进程池")
+        else:
+            print("OCR 进程池异常，改为在当前线程识别并重建进程池")
+        self._reset()
+
+    def _classify_here(self, image_bytes, debug=False, detailed=False, ensemble=False):
+        """在当前线程识别，使用与工作进程相同的模板库（本池的 template_dir / bundle_path）"""
+        bank = get_template_bank(self.template_dir, self.bundle_path)
+        return _classify_inline(image_bytes, debug, detailed, ensemble, bank)
+
+    def _reset(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+def get_ocr_pool(max_workers=None):
+    """获取进程内共享的 OCR 进程池（首次调用时创建）"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = OcrPool(max_workers=max_workers, bundle_path=TEMPLATE_BUNDLE)
+        return _ocr_pool
  
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -0,0 +1,200 @@
+# utils/outcome.py
+"""
+选课结果分类与重试策略。
+
+select_course 只返回 (success, message)，抢课循环原本对所有未选上的课程无限重试，
+包括时间冲突、学分超限、已选过、不允许选等永远不会成功的情况。这里把提示信息归为几类结果，
+每类对应一种重试策略：
+    DONE     已选上（包括此前已选过），不再提交
+    DROP     永远不会成功，放弃该课程
+    RETRY    下一轮照常重试（人数已满等待退课、会话失效等待重新登录）
+    BACKOFF  指数退避后重试（服务器繁忙、限流、超时或无法识别的响应）
+"""
+import threading
+import time
+from collections import namedtuple
+
+import httpx
+import requests
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import jwc
+
+SUCCESS = "success"
+FULL = "full"
+CONFLICT = "conflict"
+NOT_ELIGIBLE = "not_eligible"
+ALREADY_SELECTED = "already_selected"
+NOT_STARTED = "not_started"
+SESSION_LOST = "session_lost"
+THROTTLED = "throttled"
+UNKNOWN = "unknown"
+
+DONE = "done"
+DROP = "drop"
+RETRY = "retry"
+BACKOFF = "backoff"
+
+RETRY_POLICY = {
+    SUCCESS: DONE,
+    ALREADY_SELECTED: DONE,
+    FULL: RETRY,
+    NOT_STARTED: RETRY,
+    SESSION_LOST: RETRY,
+    CONFLICT: DROP,
+    NOT_ELIGIBLE: DROP,
+    THROTTLED: BACKOFF,
+    UNKNOWN: BACKOFF,
+}
+
+OUTCOME_LABELS = {
+    SUCCESS: "选课成功",
+    FULL: "人数已满",
+    CONFLICT: "时间冲突",
+    NOT_ELIGIBLE: "不可选",
+    ALREADY_SELECTED: "已选过",
+    NOT_STARTED: "未开放",
+    SESSION_LOST: "会话失效",
+    THROTTLED: "服务器繁忙",
+    UNKNOWN: "未知",
+}
+
+# 按顺序匹配服务器提示信息中的关键字，先匹配到的为准（如“已选满”应归为人数已满、“已选学分超过上限”应归为不可选，而不是已选过）。
+# 不可选会永久放弃课程，只认完整的说法；本地请求异常不经过这里，由 classify_error 按异常类型归类
+MESSAGE_RULES = (
+    (FULL, ("已满", "选满", "满员", "余量不足", "无余量", "没有余量", "名额已")),
+    (CONFLICT, ("冲突",)),
+    (NOT_ELIGIBLE, ("学分超过", "超过学分", "超出学分", "学分上限", "学分已达", "不允许", "不能选", "无权", "不对你",
+                    "未对你", "非本专业", "限选", "不符合", "不可选", "选课已结束", "选课时间已结束")),
+    (ALREADY_SELECTED, ("已选过", "已经选过", "已选该课程", "已选择该课程", "已经选择了该课程", "重复选课", "不能重复选")),
+    (NOT_STARTED, ("未开始", "尚未开", "未开放", "不在选课时间", "还未到")),
+    (THROTTLED, ("频繁", "稍后", "繁忙", "过快", "超时")),
+)
+
+# 按服务器繁忙处理的本地异常（超时、连接失败）与 HTTP 状态码
+CONGESTION_ERRORS = (TimeoutError, requests.Timeout, requests.ConnectionError, httpx.TransportError)
+THROTTLED_STATUS = (429, 500, 502, 503, 504)
+
+# 会话失效的提示（只认这些完整说法，含“登录”二字的其他提示不算）
+SESSION_LOST_KEYWORDS = (jwc.SESSION_EXPIRED_MESSAGE, "请先登录", "请重新登录", "未登录", "登录超时", "登录已过期", "登录已失效")
+
+# 退避的初始与最大间隔（秒）
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+SelectOutcome = namedtuple('SelectOutcome', ['outcome', 'policy', 'label'])
+
+
+def classify(success, message):
+    """
+    把 select_course 的返回值归类
+
+    参数:
+        success: 是否选课成功
+        message: 服务器提示信息或本地错误信息
+
+    返回:
+        SelectOutcome: (结果类别, 重试策略, 中文说明)
+    """
+    if success:
+        outcome = SUCCESS
+    elif any(keyword in (message or "") for keyword in SESSION_LOST_KEYWORDS):
+        outcome = SESSION_LOST
+    else:
+        outcome = UNKNOWN
+        for category, keywords in MESSAGE_RULES:
+            if any(keyword in (message or "") for keyword in keywords):
+                outcome = category
+                break
+    return SelectOutcome(outcome, RETRY_POLICY[outcome], OUTCOME_LABELS[outcome])
+
+
+def classify_error(error):
+    """
+    把选课请求在本地抛出的异常按类型归类（不看异常文字）
+
+    参数:
+        error: select_course(raise_errors=True) 抛出的异常
+
+    返回:
+        SelectOutcome: 超时、连接失败与 HTTP 429/5xx 为服务器繁忙，其余为未知
+    """
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    outcome = THROTTLED if isinstance(error, CONGESTION_ERRORS) or status in THROTTLED_STATUS else UNKNOWN
+    return SelectOutcome(outcome, RETRY_POLICY[outcome], OUTCOME_LABELS[outcome])
+
+
+def error_message(error):
+    """选课请求异常的提示信息（写入选课结果日志）"""
+    return f"选课请求失败: {error}"
+
+
+class RetryTracker:
+    """
+    按 (课程, 系统) 记录退避状态，并统计各类结果的次数
+
+    参数:
+        base_delay: 第一次退避的间隔（秒），之后每次翻倍
+        max_delay: 最大退避间隔（秒）
+    """
+
+    def __init__(self, base_delay=BACKOFF_BASE, max_delay=BACKOFF_MAX):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        # key -> (连续退避次数, 下次允许提交的时间)
+        self._backoff = {}
+        self.counts = {outcome: 0 for outcome in RETRY_POLICY}
+        self.backoff_time = 0.0
+
+    def record(self, key, result):
+        """记录一次结果；BACKOFF 时推迟该 key 的下次提交，其他结果清除退避状态"""
+        with self._lock:
+            self.counts[result.outcome] += 1
+            if result.policy == BACKOFF:
+                failures = self._backoff.get(key, (0, 0))[0] + 1
+                delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+                self._backoff[key] = (failures, time.monotonic() + delay)
+                self.backoff_time += delay
+            else:
+                self._backoff.pop(key, None)
+
+    def delay(self, key):
+        """该 key 距离退避结束还有多少秒，不在退避期时为 0"""
+        with self._lock:
+            state = self._backoff.get(key)
+        return max(0.0, state[1] - time.monotonic()) if state else 0.0
+
+    def summary(self):
+        """各类结果次数（只含出现过的）与累计退避时间（秒）"""
+        with self._lock:
+            counts = {OUTCOME_LABELS[o]: n for o, n in self.counts.items() if n}
+            return counts, self.backoff_time
+
+
+def is_definitive(result):
+    """是否为服务器对这门课的明确答复（选上、人数已满、不可选、未开放等），而不是繁忙、超时或会话失效"""
+    return result.policy != BACKOFF and result.outcome != SESSION_LOST
+
+
+def is_pending(course):
+    """课程是否还需要提交（未选上且没有被放弃）"""
+    return not course["selected"] and not course.get("dropped")
+
+
+def apply(course, result, message):
+    """
+    按重试策略更新课程状态
+
+    返回:
+        bool: 课程状态是否改变（需要保存配置并刷新列表）
+    """
+    if result.policy == DONE and not course["selected"]:
+        course["selected"] = True
+        return True
+    if result.policy == DROP and not course.get("dropped"):
+        course["dropped"] = f"{result.label}: {message}"
+        return True
+    return False
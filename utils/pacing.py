@@ -0,0 +1,127 @@
+# utils/pacing.py
+"""
+抢课并发数与重试间隔的自适应控制（每个系统一个控制器）。
+
+并发开得太低浪费吞吐，开得太高服务器大量超时、所有请求一起变慢。控制器按时间窗口统计
+该系统的响应延迟、错误率（服务器繁忙 / 超时 / 无法识别）和吞吐，用 AIMD 调整：
+    - 错误率超过阈值，或延迟中位数超过基线的 LATENCY_TOLERANCE 倍：并发数乘以 DECREASE_FACTOR，间隔乘以 INTERVAL_BACKOFF；
+    - 否则：并发数加一个步长，间隔逐步缩回下限。
+基线延迟取各窗口延迟中位数的最小值（缓慢上浮，服务器整体变慢后能跟上）。
+并发数与间隔始终在用户设置的范围内。
+"""
+import statistics
+import threading
+import time
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+
+# 统计窗口（秒）与每个窗口至少需要的样本数
+WINDOW = 1.0
+MIN_SAMPLES = 3
+# 窗口内错误率超过该值视为拥塞
+ERROR_THRESHOLD = 0.1
+# 延迟中位数超过基线的倍数视为拥塞
+LATENCY_TOLERANCE = 2.0
+DECREASE_FACTOR = 0.7
+INTERVAL_BACKOFF = 1.5
+INTERVAL_RECOVERY = 0.8
+# 自适应时间隔的上限（秒）
+MAX_INTERVAL = 10.0
+# 被视为拥塞信号的结果
+CONGESTION_OUTCOMES = (outcome.THROTTLED, outcome.UNKNOWN)
+
+
+class PacingController:
+    """
+    单个系统的并发与间隔控制器，线程与协程中都可以使用（不阻塞）
+
+    参数:
+        max_limit: 并发数上限（用户设置的最大并发数量）
+        min_interval: 间隔下限（用户设置的重试间隔，秒）
+        min_limit: 并发数下限
+        max_interval: 间隔上限（秒）
+        adaptive: 为 False 时并发数与间隔固定为 max_limit 与 min_interval，只做统计
+    """
+
+    def __init__(self, max_limit, min_interval, min_limit=1, max_interval=MAX_INTERVAL, adaptive=True):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.adaptive = adaptive
+        # 从上限的一半开始，未拥塞时每个窗口增加 step
+        self.limit = float(max(self.min_limit, self.max_limit // 2) if adaptive else self.max_limit)
+        self.step = max(1.0, self.max_limit / 20)
+        self.interval = min_interval
+        self.in_flight = 0
+        self.baseline = None
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._latencies = []
+        self._errors = 0
+        self._last = {"throughput": 0.0, "p50_ms": 0.0, "error_rate": 0.0}
+        self.increases = 0
+        self.decreases = 0
+
+    def try_acquire(self):
+        """占用一个并发名额；已达到当前并发数时返回 False（由调度器放入等待队列）"""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def discard(self):
+        """释放名额但不记录（请求没有真正发出）"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def release(self, latency, result):
+        """
+        释放名额并记录一次请求
+
+        参数:
+            latency: 请求耗时（秒）
+            result: outcome.SelectOutcome
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self._latencies.append(latency)
+            if result.outcome in CONGESTION_OUTCOMES:
+                self._errors += 1
+            now = time.monotonic()
+            if now - self._window_start >= WINDOW and len(self._latencies) >= MIN_SAMPLES:
+                self._adjust(now)
+
+    def _adjust(self, now):
+        """窗口结束时更新统计并调整并发数与间隔（调用方持有 self._lock）"""
+        p50 = statistics.median(self._latencies)
+        error_rate = self._errors / len(self._latencies)
+        self._last = {"throughput": len(self._latencies) / (now - self._window_start), "p50_ms": p50 * 1000,
+                      "error_rate": error_rate}
+        if self.baseline is None or p50 < self.baseline:
+            self.baseline = p50
+        else:
+            self.baseline += (p50 - self.baseline) * 0.05
+        self._window_start = now
+        self._latencies = []
+        self._errors = 0
+        if not self.adaptive:
+            return
+        if error_rate > ERROR_THRESHOLD or p50 > self.baseline * LATENCY_TOLERANCE:
+            self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+            self.interval = min(self.max_interval, max(self.interval, 0.1) * INTERVAL_BACKOFF)
+            self.decreases += 1
+        else:
+            self.limit = min(self.max_limit, self.limit + self.step)
+            self.interval = max(self.min_interval, self.interval * INTERVAL_RECOVERY)
+            self.increases += 1
+
+    def snapshot(self):
+        """当前并发数、间隔与上一个窗口的吞吐（请求/秒）、延迟中位数（毫秒）和错误率"""
+        with self._lock:
+            return dict(self._last, limit=int(self.limit), max_limit=self.max_limit, in_flight=self.in_flight,
+                        interval=self.interval)
@@ -0,0 +1,172 @@
+# utils/probe.py
+"""
+教务系统协议探测及其持久化缓存。
+
+部分教务入口会把 HTTPS 重定向到 HTTP，需要请求一次 /service/login.html 才知道该用哪种协议。
+开放选课时服务器很慢，这一次探测就可能耗尽 5 秒超时，所以探测结果按主机缓存到
+cache/protocol_probe.json：
+    - 缓存未过期：直接使用；
+    - 缓存已过期：先用旧结果，同时在后台线程重新探测；
+    - 没有缓存：阻塞探测，同一主机的并发调用只会发出一次请求。
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import storage
+
+PROBE_CACHE_FILE = storage.cache_path("protocol_probe.json")
+# 探测结果的有效期（秒），过期后在后台重新探测
+PROBE_TTL = 6 * 3600
+PROBE_TIMEOUT = 5
+
+
+def probe_base_url(base, timeout=PROBE_TIMEOUT):
+    """
+    请求登录页，根据最终 URL 判断应使用 HTTP 还是 HTTPS
+
+    参数:
+        base: 主机（可带路径），如 jwc.swjtu.edu.cn 或 jiaowu.swjtu.edu.cn/TMS
+        timeout: 请求超时（秒）
+
+    返回:
+        tuple: (base_url, 是否探测成功)；探测失败时返回默认的 HTTPS 地址
+    """
+    base_url = f"https://{base}"
+    try:
+        print(f"开始测试请求连通性和协议: " + f"{base_url}/service/login.html")
+        response = requests.get(f"{base_url}/service/login.html", timeout=timeout, allow_redirects=True, verify=True)
+
+        # 输出重定向信息
+        if response.history:
+            print(f"\n重定向路径 ({len(response.history)} 次):")
+            for i, resp in enumerate(response.history, 1):
+                status = resp.status_code
+                from_url = resp.url
+                to_url = resp.headers.get('location', resp.url)
+                print(f"  {i}. [{status}] {from_url}")
+                print(f"     重定向到: {to_url}")
+
+        print(f"最终URL: {response.url}")
+
+        parsed = urlparse(response.url)
+        if parsed.scheme == "http":
+            base_url = f"http://{base}"
+            print("检测到教务使用 HTTP，已切换为 HTTP 访问。")
+        return base_url, True
+
+    except Exception as e:
+        print(f"协议检测失败: {e}，使用默认 HTTPS")
+        return base_url, False
+
+
+class ProbeCache:
+    """按主机缓存协议探测结果，磁盘持久化，过期后在后台刷新"""
+
+    def __init__(self, path=PROBE_CACHE_FILE, ttl=PROBE_TTL, timeout=PROBE_TIMEOUT):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = None
+        # 正在探测的主机 -> threading.Event，用于合并同一主机的并发探测
+        self._inflight = {}
+
+    def _load(self):
+        """首次使用时从磁盘读取缓存（调用方持有 self._lock）"""
+        if self._entries is None:
+            entries = storage.read_json(self.path, {})
+            self._entries = entries if isinstance(entries, dict) else {}
+        return self._entries
+
+    def get(self, base):
+        """返回缓存的条目 {"base_url", "probed_at"}，没有时返回 None"""
+        with self._lock:
+            return self._load().get(base)
+
+    def resolve(self, base):
+        """
+        返回主机应使用的 base_url
+
+        有缓存时立即返回（过期则触发后台刷新）；没有缓存时阻塞探测。
+        """
+        entry = self.get(base)
+        if entry is not None:
+            if time.time() - entry.get("probed_at", 0) > self.ttl:
+                self.refresh_async(base)
+            return entry["base_url"]
+        return self.refresh(base)
+
+    def refresh(self, base):
+        """立即探测并更新缓存，同一主机已有探测在进行时等待其结果"""
+        with self._lock:
+            event = self._inflight.get(base)
+            owner = event is None
+            if owner:
+                event = self._inflight[base] = threading.Event()
+        if not owner:
+            event.wait()
+            entry = self.get(base)
+            return entry["base_url"] if entry else f"https://{base}"
+
+        try:
+            base_url, ok = probe_base_url(base, timeout=self.timeout)
+            # 探测失败时不覆盖已有的结果，也不把默认值写入缓存，下次仍会重新探测
+            if ok:
+                self._store(base, base_url)
+            else:
+                entry = self.get(base)
+                if entry:
+                    base_url = entry["base_url"]
+            return base_url
+        finally:
+            with self._lock:
+                del self._inflight[base]
+            event.set()
+
+    def refresh_async(self, base):
+        """在后台线程中探测，已有探测在进行时不重复发起"""
+        with self._lock:
+            if base in self._inflight:
+                return
+        threading.Thread(target=self.refresh, args=(base,), daemon=True).start()
+
+    def prefetch(self, bases):
+        """为多个主机预先解析协议（后台进行），已缓存且未过期的主机不会发出请求"""
+        for base in bases:
+            entry = self.get(base)
+            if entry is None or time.time() - entry.get("probed_at", 0) > self.ttl:
+                self.refresh_async(base)
+
+    def pin(self, base, base_url):
+        """手动指定主机的 base_url（例如本地测试服务器），跳过探测"""
+        self._store(base, base_url)
+
+    def _store(self, base, base_url):
+        with self._lock:
+            entries = self._load()
+            entries[base] = {"base_url": base_url, "probed_at": time.time()}
+            snapshot = dict(entries)
+        with storage.file_lock(self.path):
+            try:
+                storage.write_json(self.path, snapshot)
+            except OSError as e:
+                print(f"协议探测缓存写入失败: {e}")
+
+
+_probe_cache = None
+_probe_cache_lock = threading.Lock()
+
+
+def get_probe_cache():
+    """返回进程内共享的 ProbeCache"""
+    global _probe_cache
+    with _probe_cache_lock:
+        if _probe_cache is None:
+            _probe_cache = ProbeCache()
+        return _probe_cache
@@ -0,0 +1,368 @@
+# utils/scheduler.py
+"""
+线程池抢课调度器（AsyncGrabEngine 的线程版本）。
+
+原来的抢课循环每隔 interval 秒就把所有未选上的课程再提交一遍，不管上一轮是否已经返回；
+服务器慢的时候线程池的队列里堆满同一门课的旧请求，内存上涨，新请求排在旧请求后面。
+这里改为按 (课程, 系统) 调度：
+    - 每个 (课程, 系统) 同时最多 per_pair 个未完成的请求；
+    - 一个请求返回后，等待该系统当前的间隔（或退避时间）再发出下一个，而不是按固定的轮次；
+    - 系统的并发名额（PacingController）用完时，(课程, 系统) 在该系统的等待队列里排队，有请求返回时再发出。
+因此排队的请求数不会超过 课程数 × 系统数 × per_pair。
+
+一门课在某个系统上选上（或被放弃）后，同一门课在其他系统上排队和正在进行的请求立即取消；
+stop() 取消线程池中所有排队的请求，并中止正在进行的请求（utils/connection.CancelScope），
+不必等每个请求最多 60 秒的超时。
+
+传入 hedge（utils/hedge.HedgePolicy）时改为对冲模式：每门课每次只向一个系统（权重最高或延迟最低的）发出主请求，
+主请求超过该系统延迟的 p90 仍未返回时向另一个系统再发一个对冲请求，先返回明确答复的请求胜出，另一个立即中止；
+胜出的请求返回后再按间隔安排这门课的下一次。
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import outcome
+from utils.connection import CancelScope
+from utils.hedge import Race
+
+# 每个 (课程, 系统) 同时未完成的请求数
+PER_PAIR = 1
+# 系统正在后台重新登录时，多久后再检查（秒）
+RELOGIN_RECHECK = 0.5
+
+
+class GrabScheduler:
+    """
+    按 (课程, 系统) 调度选课请求
+
+    参数:
+        backends: [(名称, Enroller), ...]
+        pacing: {名称: PacingController}，各系统的并发数与间隔
+        retry_tracker: outcome.RetryTracker
+        max_workers: 线程数
+        per_pair: 每个 (课程, 系统) 同时未完成的请求数
+        router: 路由（如 utils/backends.BackendRegistry）：router.budget(名称, max_workers) 为该系统可同时占用的线程数，
+            router.weight(名称) 为请求权重（同一 (课程, 系统) 两次请求的间隔除以权重），
+            router.record(名称, 耗时, 结果) 记录每个请求。None 表示各系统相同
+        hedge: utils/hedge.HedgePolicy，传入时使用对冲模式；None 表示每门课同时向所有系统提交
+    """
+
+    def __init__(self, backends, pacing, retry_tracker, max_workers, per_pair=PER_PAIR, router=None, hedge=None):
+        self.backends = backends
+        self.pacing = pacing
+        self.retry_tracker = retry_tracker
+        self.max_workers = max_workers
+        self.per_pair = per_pair
+        self.router = router
+        self.hedge = hedge
+        # cancelled_queued: 已排队、因课程已选上或停止而没有发出的请求；aborted: 发出后被中止的请求
+        self.stats = {"submitted": 0, "completed": 0, "succeeded": 0, "max_queued": 0,
+                      "cancelled_queued": 0, "aborted": 0}
+        self._cond = threading.Condition()
+        # (可以提交的时间, 序号, 课程, 系统名) 的最小堆
+        self._timers = []
+        self._seq = itertools.count()
+        # 对冲模式: (发出对冲请求的时间, 序号, hedge.Race) 的最小堆
+        self._hedge_timers = []
+        # 系统名 -> 等待并发名额的 (课程, 系统名)
+        self._waiting = {name: deque() for name, _ in backends}
+        # 已提交给线程池但还没开始执行的请求数
+        self._queued = 0
+        self._attempts = {}
+        # 已提交线程池尚未开始的请求: future -> (课程, 系统名)
+        self._futures = {}
+        # 正在进行的请求: CancelScope -> (课程, 系统名)
+        self._running = {}
+        # 对冲模式下抽样测量节省时间、不随课程中止的主请求
+        self._probes = set()
+        self._stopped = threading.Event()
+
+    def queue_depth(self):
+        """
+        当前排队情况
+
+        返回:
+            dict: {"queued": 已提交线程池尚未开始的请求数, "waiting": {系统名: 等待并发名额的课程数}}
+        """
+        with self._cond:
+            return {"queued": self._queued, "waiting": {name: len(queue) for name, queue in self._waiting.items()}}
+
+    def stop(self):
+        """停止调度（可以在任意线程中调用）：不再提交新请求，取消线程池中排队的请求，中止正在进行的请求"""
+        self._stopped.set()
+        with self._cond:
+            self._timers.clear()
+            self._hedge_timers.clear()
+            for queue in self._waiting.values():
+                queue.clear()
+            self._cancel_queued(lambda course, name: True)
+            scopes = list(self._running)
+            self._cond.notify_all()
+        for scope in scopes:
+            scope.cancel()
+
+    def _cancel_queued(self, match):
+        """取消线程池中尚未开始、且 match(课程, 系统名) 为真的请求（调用方持有 self._cond）"""
+        cancelled = 0
+        for future, (course, name) in list(self._futures.items()):
+            if match(course, name) and future.cancel():
+                self._futures.pop(future, None)
+                self._queued -= 1
+                self.pacing[name].discard()
+                self._wake(name, time.monotonic())
+                cancelled += 1
+        self.stats["cancelled_queued"] += cancelled
+        return cancelled
+
+    def _cancel_course(self, course):
+        """课程已选上或被放弃：取消它在各系统上排队和正在进行的请求"""
+        with self._cond:
+            self._cancel_queued(lambda other, name: other is course)
+            scopes = [scope for scope, (other, _) in self._running.items()
+                      if other is course and scope not in self._probes]
+        for scope in scopes:
+            scope.cancel()
+
+    def _wake(self, name, now):
+        """系统有名额空出：等待队列中的课程重新参与调度（调用方持有 self._cond）"""
+        waiting = self._waiting[name]
+        while waiting:
+            self._schedule(now, waiting.popleft(), name)
+
+    def _schedule(self, at, course, name):
+        """（调用方持有 self._cond）"""
+        heapq.heappush(self._timers, (at, next(self._seq), course, name))
+
+    def _available(self, name):
+        enroller = self._enrollers[name]
+        return enroller.is_logged_in and not enroller.relogging
+
+    def _pick_backend(self, exclude=None):
+        """对冲模式下主请求（或对冲请求）发往的系统：路由权重最高、没有路由时延迟中位数最低的可用系统；没有时返回 None"""
+        return self.hedge.pick_backend([name for name, _ in self.backends if name != exclude and self._available(name)],
+                                       self.router)
+
+    def run(self, courses, should_continue=lambda: True, on_submit=None, on_result=None, start_at=None):
+        """
+        运行直到所有课程选上或放弃，或 should_continue() 返回 False；返回前等待已发出的请求结束
+
+        参数:
+            courses: 课程字典列表，选上后原地置 selected=True，放弃时原地写入 dropped
+            on_submit: on_submit(attempt, name, course)，请求开始执行时调用
+            on_result: on_result(attempt, name, course, success, message, result, changed)，每个请求完成时调用
+            start_at: {系统名: time.monotonic() 时刻}，该系统的首轮请求在此时刻发出（定时开抢），默认立即发出
+
+        返回:
+            dict: 提交数、完成数、成功数、线程池中最多排队的请求数，以及取消的排队请求数与中止的请求数
+        """
+        self._enrollers = dict(self.backends)
+        self._should_continue = should_continue
+        self._on_submit = on_submit
+        self._on_result = on_result
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        start_at = start_at or {}
+        names = [name for name, _ in self.backends]
+        with self._cond:
+            pending = [course for course in courses if outcome.is_pending(course)]
+            for index, course in enumerate(pending):
+                # 对冲模式下首轮主请求轮流分给各系统，之后按权重或延迟选择
+                for name in (names[index % len(names)],) if self.hedge is not None else names:
+                    for _ in range(self.per_pair):
+                        self._schedule(start_at.get(name, 0.0), course, name)
+
+        try:
+            while not self._stopped.is_set() and should_continue() and any(outcome.is_pending(c) for c in courses):
+                with self._cond:
+                    now = time.monotonic()
+                    while self._timers and self._timers[0][0] <= now:
+                        _, _, course, name = heapq.heappop(self._timers)
+                        self._dispatch(executor, course, name, self._enrollers[name], now)
+                    while self._hedge_timers and self._hedge_timers[0][0] <= now:
+                        self._fire_hedge(executor, heapq.heappop(self._hedge_timers)[2])
+                    due = [timers[0][0] for timers in (self._timers, self._hedge_timers) if timers]
+                    timeout = min(min(due) - now, 0.5) if due else 0.5
+                    self._cond.wait(max(timeout, 0.0))
+        finally:
+            with self._cond:
+                self._timers.clear()
+                self._hedge_timers.clear()
+                for queue in self._waiting.values():
+                    queue.clear()
+                probes = list(self._probes)
+            # 抽样的主请求只用来测量，不等它返回
+            for scope in probes:
+                scope.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+        return dict(self.stats)
+
+    def _dispatch(self, executor, course, name, enroller, now):
+        """把到期的 (课程, 系统) 交给线程池，或放入等待队列（调用方持有 self._cond）"""
+        if not outcome.is_pending(course):
+            return
+        if not enroller.is_logged_in or enroller.relogging:
+            other = self._pick_backend() if self.hedge is not None else None
+            if other is None:
+                # 正在后台重新登录的系统稍后再检查，课程照常提交到其他系统
+                self._schedule(now + RELOGIN_RECHECK, course, name)
+                return
+            # 对冲模式下每门课只有一个主请求，改发到其他可用的系统
+            name = other
+        if not self._try_acquire(name):
+            self._waiting[name].append(course)
+            return
+        self._submit(executor, course, name)
+
+    def _try_acquire(self, name):
+        """在路由分给该系统的线程数与控制器的并发数之内占用一个名额（调用方持有 self._cond）"""
+        controller = self.pacing[name]
+        if self.router is not None and controller.in_flight >= self.router.budget(name, self.max_workers):
+            return False
+        return controller.try_acquire()
+
+    def _submit(self, executor, course, name, race=None, scope=None):
+        """提交一个已占用名额的请求（调用方持有 self._cond）"""
+        self._queued += 1
+        self.stats["max_queued"] = max(self.stats["max_queued"], self._queued)
+        self.stats["submitted"] += 1
+        future = executor.submit(self._attempt, course, name, race, scope)
+        self._futures[future] = (course, name)
+        future.add_done_callback(self._forget)
+
+    def _fire_hedge(self, executor, race):
+        """主请求到了对冲时间仍未返回：向另一个系统（没有时向同一系统）发出对冲请求（调用方持有 self._cond）"""
+        if self._stopped.is_set() or not outcome.is_pending(race.course):
+            return
+        name = race.hedge_target(self._pick_backend, self._try_acquire, lambda name: self.pacing[name].discard())
+        if name is None:
+            return
+        scope = CancelScope()
+        race.add(scope, is_hedge=True)
+        self._submit(executor, race.course, name, race, scope)
+
+    def _forget(self, future):
+        with self._cond:
+            self._futures.pop(future, None)
+
+    def _attempt(self, course, name, race=None, scope=None):
+        """在线程池中执行一次选课请求；race 不为 None 时为对冲请求（scope 为提交时登记在 race 中的 CancelScope）"""
+        controller = self.pacing[name]
+        key = (course["real_teach_id"], name)
+        scope = scope or CancelScope()
+        with self._cond:
+            self._queued -= 1
+            if (self._stopped.is_set() or not self._should_continue() or not outcome.is_pending(course)
+                    or (race is not None and race.resolved)):
+                self.stats["cancelled_queued"] += 1
+                skip = True
+            else:
+                self._running[scope] = (course, name)
+                self._attempts[key] = number = self._attempts.get(key, 0) + 1
+                skip = False
+                if self.hedge is not None and race is None:
+                    race = Race(self.hedge, course, name)
+                    race.add(scope)
+                    heapq.heappush(self._hedge_timers, (time.monotonic() + self.hedge.delay(name), next(self._seq), race))
+                    self._cond.notify()
+        if skip:
+            controller.discard()
+            self._complete(course, name, None, self._race_step(race, scope, None), None)
+            return
+        if self._on_submit is not None:
+            self._on_submit(number, name, course)
+        start = time.perf_counter()
+        error = None
+        try:
+            with scope:
+                success, message = self._enrollers[name].select_course(course["real_teach_id"], course["need_book"],
+                                                                       raise_errors=True)
+        except Exception as e:
+            # 本地请求异常按异常类型归类，不匹配提示信息
+            success, message, error = False, outcome.error_message(e), e
+        with self._cond:
+            self._running.pop(scope, None)
+            if scope.cancelled:
+                self.stats["aborted"] += 1
+        if scope.cancelled:
+            # 被中止的请求不计入统计，也不影响节奏控制
+            controller.discard()
+            self._complete(course, name, None, self._race_step(race, scope, None), None)
+            return
+        result = outcome.classify(success, message) if error is None else outcome.classify_error(error)
+        latency = time.perf_counter() - start
+        controller.release(latency, result)
+        if self.router is not None:
+            self.router.record(name, latency, result)
+        if self.hedge is not None:
+            self.hedge.record(name, latency)
+        step = self._race_step(race, scope, result)
+        if step is not None and not step.report:
+            # 对冲已经决定之后才返回的请求（包括抽样的主请求）只用于测量
+            self._complete(course, name, controller, step, result)
+            return
+        self.retry_tracker.record(key, result)
+        try:
+            changed = outcome.apply(course, result, message)
+            if changed:
+                self._cancel_course(course)
+            with self._cond:
+                self.stats["completed"] += 1
+                self.stats["succeeded"] += bool(success)
+            if self._on_result is not None:
+                self._on_result(number, name, course, success, message, result, changed)
+        finally:
+            self._complete(course, name, controller, step, result)
+
+    def _race_step(self, race, scope, result):
+        """对冲模式下记录一个请求结束（见 hedge.Race.finish）；不是对冲模式时返回 None"""
+        if race is None:
+            return None
+        with self._cond:
+            self._probes.discard(scope)
+            step = race.finish(scope, result)
+            if step.probe is not None:
+                self._probes.add(step.probe)
+        return step
+
+    def _complete(self, course, name, controller, step, result):
+        """
+        一个请求结束（result 为 None 表示被跳过或被中止）
+
+        不是对冲模式时（step 为 None）直接安排下一次；对冲模式下中止输掉的请求，
+        只有决定这次对冲的请求安排这门课的下一次，其余请求结束时只释放名额。
+        """
+        if step is not None:
+            for loser in step.losers:
+                loser.cancel()
+            if not step.decides:
+                controller = None
+        self._finish(course, name, controller if result is not None else None)
+
+    def _next_delay(self, course, name, controller):
+        """同一 (课程, 系统) 下一次请求前的等待时间：按权重放大的间隔与退避时间取较大者"""
+        weight = self.router.weight(name) if self.router is not None else 1.0
+        if weight <= 0:
+            return RELOGIN_RECHECK
+        return max(controller.interval / weight, self.retry_tracker.delay((course["real_teach_id"], name)))
+
+    def _finish(self, course, name, controller):
+        """
+        一个请求结束：按间隔与退避时间安排该 (课程, 系统) 的下一次，并唤醒等待并发名额的课程；
+        对冲模式下下一次发往 _pick_backend 选出的系统
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._wake(name, now)
+            if controller is not None and outcome.is_pending(course):
+                if self.hedge is not None:
+                    name = self._pick_backend() or name
+                    controller = self.pacing[name]
+                self._schedule(now + self._next_delay(course, name, controller), course, name)
+            self._cond.notify()
@@ -0,0 +1,103 @@
+# utils/session_store.py
+"""
+登录会话的持久化存储。
+
+登录成功后把 Cookie 按 账号+主机 保存到 cache/sessions/ 下（目录 0700、文件 0600），
+程序重启或崩溃后先加载 Cookie 并用一次轻量请求验证，仍然有效就直接开始抢课，
+省掉获取验证码、OCR 和登录请求。
+"""
+import hashlib
+import os
+import threading
+import time
+
+from requests.cookies import create_cookie
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import storage
+
+SESSION_DIR = storage.cache_path("sessions")
+# 超过该时间（秒）的会话不再尝试恢复，服务器端早已过期
+SESSION_MAX_AGE = 12 * 3600
+
+
+class SessionStore:
+    """
+    按 账号+主机 保存 Cookie
+
+    参数:
+        directory: 会话文件目录
+        max_age: 会话最长保留时间（秒）
+    """
+
+    def __init__(self, directory=SESSION_DIR, max_age=SESSION_MAX_AGE):
+        self.directory = Path(directory)
+        self.max_age = max_age
+
+    def _path(self, username, base):
+        # 文件名不直接包含学号
+        digest = hashlib.sha256(f"{username}@{base}".encode("utf-8")).hexdigest()[:32]
+        return self.directory / f"{digest}.json"
+
+    def load(self, username, base):
+        """
+        读取保存的 Cookie
+
+        返回:
+            list: Cookie 字典列表；没有保存、已过期或属于其他账号时返回 None
+        """
+        data = storage.read_json(self._path(username, base))
+        if not isinstance(data, dict) or data.get("username") != username or data.get("base") != base:
+            return None
+        if time.time() - data.get("saved_at", 0) > self.max_age:
+            return None
+        return data.get("cookies")
+
+    def save(self, username, base, cookie_jar):
+        """保存一个 CookieJar 中的全部 Cookie，文件权限为 0600"""
+        cookies = [{
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path,
+            "expires": cookie.expires,
+            "secure": cookie.secure,
+        } for cookie in cookie_jar]
+        self.directory.mkdir(parents=True, exist_ok=True)
+        try:
+            os.chmod(self.directory, 0o700)
+        except OSError:
+            pass
+        path = self._path(username, base)
+        with storage.file_lock(path):
+            storage.write_json(path, {"username": username, "base": base, "saved_at": time.time(), "cookies": cookies},
+                               mode=0o600)
+
+    def delete(self, username, base):
+        try:
+            os.unlink(self._path(username, base))
+        except OSError:
+            pass
+
+    @staticmethod
+    def apply(cookies, cookie_jar):
+        """把 load() 返回的 Cookie 写入 CookieJar"""
+        for cookie in cookies:
+            cookie_jar.set_cookie(create_cookie(cookie["name"], cookie["value"], domain=cookie["domain"],
+                                                path=cookie["path"], expires=cookie["expires"],
+                                                secure=cookie["secure"]))
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """返回进程内共享的 SessionStore"""
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore()
+        return _session_store
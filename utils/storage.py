@@ -0,0 +1,74 @@
+# utils/storage.py
+"""
+本地缓存文件的读写。
+
+所有缓存都放在项目根目录的 cache/ 下（已加入 .gitignore），写入时先写临时文件再原子替换，
+多个线程或进程同时写同一个文件也不会留下半截的 JSON。
+"""
+import json
+import os
+import tempfile
+import threading
+
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).resolve().parent.parent / "cache"
+
+# 同一进程内对同一文件的 读-改-写 需要串行
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def cache_path(name):
+    """返回 cache/ 下的文件路径"""
+    return CACHE_DIR / name
+
+
+def file_lock(path):
+    """返回保护某个文件的进程内锁"""
+    with _file_locks_guard:
+        return _file_locks.setdefault(str(path), threading.Lock())
+
+
+def read_json(path, default=None):
+    """
+    读取 JSON 文件
+
+    参数:
+        path: 文件路径
+        default: 文件不存在或内容损坏时的返回值
+
+    返回:
+        解析出的对象或 default
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path, data, mode=None):
+    """
+    原子地写入 JSON 文件
+
+    参数:
+        path: 文件路径，所在目录不存在时自动创建
+        data: 要写入的对象
+        mode: 文件权限（如 0o600），为 None 时使用默认权限
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
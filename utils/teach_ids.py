@@ -0,0 +1,157 @@
+# utils/teach_ids.py
+"""
+选课编号 → 真实课程ID 的批量解析及其持久化缓存。
+
+真实ID 在一个学期内不会变化，解析结果按 学期+主机 缓存到 cache/teach_ids.json，
+导入课程清单时只查询缓存中没有的编号，并且并发查询，30 门课约等于一次查询的耗时。
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils import storage
+
+TEACH_ID_CACHE_FILE = storage.cache_path("teach_ids.json")
+# 缓存条目的有效期（秒），学期推断不准时也不会一直使用旧数据
+TEACH_ID_TTL = 30 * 24 * 3600
+# 批量查询的最大并发数
+MAX_CONCURRENCY = 32
+# 选课编号的格式：一个字母加四位数字，如 B3333
+TEACH_ID_FORMAT = re.compile(r'[A-Za-z]\d{4}')
+# 输入中分隔多个选课编号的字符
+TEACH_ID_SEPARATOR = re.compile(r'[\s,，;；、]+')
+
+
+def current_term(today=None):
+    """
+    推断当前选课针对的学期，如 2026-2027-1
+
+    5~10 月选的是秋季学期（第 1 学期），11 月~次年 4 月选的是春季学期（第 2 学期）。
+    推断不准时可在 config.json 中用 "term" 指定。
+    """
+    today = today or date.today()
+    if today.month >= 11:
+        return f"{today.year}-{today.year + 1}-2"
+    if today.month <= 4:
+        return f"{today.year - 1}-{today.year}-2"
+    return f"{today.year}-{today.year + 1}-1"
+
+
+def split_teach_ids(text):
+    """把用逗号、空格或换行分隔的多个选课编号拆开，去重并保持顺序"""
+    return list(dict.fromkeys(item for item in TEACH_ID_SEPARATOR.split(text.strip()) if item))
+
+
+def cache_key(term, base):
+    """缓存与课程目录共用的键：学期@主机"""
+    return f"{term}@{base}"
+
+
+class TeachIdCache:
+    """按 学期+主机 缓存 选课编号 → 真实ID，磁盘持久化"""
+
+    def __init__(self, path=TEACH_ID_CACHE_FILE, ttl=TEACH_ID_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load(self):
+        """首次使用时从磁盘读取缓存（调用方持有 self._lock）"""
+        if self._entries is None:
+            entries = storage.read_json(self.path, {})
+            self._entries = entries if isinstance(entries, dict) else {}
+        return self._entries
+
+    def get(self, term, base, teach_id):
+        """返回缓存的真实ID，没有或已过期时返回 None"""
+        with self._lock:
+            entry = self._load().get(cache_key(term, base), {}).get(teach_id)
+        if entry is None or time.time() - entry.get("resolved_at", 0) > self.ttl:
+            return None
+        return entry["real_teach_id"]
+
+    def put_many(self, term, base, resolved):
+        """
+        写入多条解析结果并保存到磁盘
+
+        参数:
+            resolved: {选课编号: 真实ID}
+        """
+        if not resolved:
+            return
+        now = time.time()
+        with self._lock:
+            bucket = self._load().setdefault(cache_key(term, base), {})
+            for teach_id, real_teach_id in resolved.items():
+                bucket[teach_id] = {"real_teach_id": real_teach_id, "resolved_at": now}
+            snapshot = {key: dict(value) for key, value in self._entries.items()}
+        with storage.file_lock(self.path):
+            try:
+                storage.write_json(self.path, snapshot)
+            except OSError as e:
+                print(f"选课编号缓存写入失败: {e}")
+
+
+_teach_id_cache = None
+_teach_id_cache_lock = threading.Lock()
+
+
+def get_teach_id_cache():
+    """返回进程内共享的 TeachIdCache"""
+    global _teach_id_cache
+    with _teach_id_cache_lock:
+        if _teach_id_cache is None:
+            _teach_id_cache = TeachIdCache()
+        return _teach_id_cache
+
+
+def resolve_teach_ids(enroller, teach_ids, term=None, cache=None, catalog=None, max_concurrency=MAX_CONCURRENCY,
+                      grow_pool=True):
+    """
+    批量解析选课编号：依次查缓存、本地课程目录，都没有的才并发查询服务器
+
+    参数:
+        enroller: 已登录的 Enroller
+        teach_ids: 选课编号列表
+        term: 学期，默认按日期推断
+        cache: TeachIdCache，默认使用进程内共享的缓存
+        catalog: utils.catalog.CourseCatalog，为 None 时不查本地目录
+        max_concurrency: 最大并发查询数
+        grow_pool: 连接池小于并发数时是否扩大（会关闭已有连接，抢课进行中应传 False）
+
+    返回:
+        dict: {选课编号: (success, real_teach_id, error_message)}，顺序与输入一致
+    """
+    term = term or current_term()
+    cache = cache or get_teach_id_cache()
+    teach_ids = list(dict.fromkeys(teach_ids))
+    results = {}
+    misses = []
+    key = cache_key(term, enroller.base)
+    for teach_id in teach_ids:
+        real_teach_id = cache.get(term, enroller.base, teach_id)
+        if real_teach_id is None and catalog is not None:
+            course = catalog.lookup(key, teach_id)
+            real_teach_id = course["real_teach_id"] if course else None
+        if real_teach_id is not None:
+            results[teach_id] = (True, real_teach_id, None)
+        else:
+            misses.append(teach_id)
+
+    if misses:
+        concurrency = min(max_concurrency, len(misses))
+        if grow_pool and enroller.connections.pool_size < concurrency:
+            enroller.connections.resize(concurrency)
+        concurrency = min(concurrency, enroller.connections.pool_size)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for teach_id, result in zip(misses, executor.map(enroller.search_course_by_teach_id, misses)):
+                results[teach_id] = result
+        cache.put_many(term, enroller.base, {teach_id: results[teach_id][1] for teach_id in misses if results[teach_id][0]})
+
+    return {teach_id: results[teach_id] for teach_id in teach_ids}